@@ -1,30 +1,40 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+import asyncio
+import logging
+from fastapi import APIRouter, Depends, HTTPException, Query, status
 from fastapi.security import OAuth2PasswordBearer, OAuth2PasswordRequestForm
-from sqlalchemy.orm import Session
+from sqlalchemy import event, inspect
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session, object_session
+from redis.exceptions import RedisError
 from pydantic import BaseModel
-from passlib.context import CryptContext
 from datetime import datetime, timedelta
 from jose import JWTError, jwt
-from .database import get_db
-from .models import User
-from .schemas import Token, UserCreate
-from .crud import get_user_by_email, create_user
-from .config import settings
+from starlette.exceptions import WebSocketException
+from ..database import get_db, AsyncSessionLocal
+from ..models import User
+from ..schemas import Token, UserCreate, User as UserSchema
+from ..crud import get_user_by_email, create_user
+from ..config import settings
+from ..utils.cache import TTLCache
+from ..utils.redis_client import get_redis
+from ..utils.metrics import query_budget
+from ..utils.hashing import verify_password, get_password_hash
+from ..websockets import manager
 
-router = APIRouter()
+logger = logging.getLogger(__name__)
 
-SECRET_KEY = settings.SECRET_KEY
-ALGORITHM = "HS256"
-ACCESS_TOKEN_EXPIRE_MINUTES = 30
+router = APIRouter()
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="token")
 
-def verify_password(plain_password, hashed_password):
-    return pwd_context.verify(plain_password, hashed_password)
-
-def get_password_hash(password):
-    return pwd_context.hash(password)
+# Resolved principals keyed by token subject (email), so authenticated requests skip the users table.
+principal_cache = TTLCache(maxsize=settings.AUTH_CACHE_MAX_SIZE, ttl=settings.AUTH_CACHE_TTL_SECONDS)
+PRINCIPAL_KEY_PREFIX = "principal:"
+PRINCIPAL_INVALIDATED = "principal_invalidated"
+# Bumped on every eviction; a load that started before one does not cache the row it read.
+principal_epoch = 0
+# Shared-tier evictions still running; holding them keeps the tasks from being garbage collected.
+pending_evictions: set = set()
 
 def create_access_token(data: dict, expires_delta: timedelta | None = None):
     to_encode = data.copy()
@@ -33,50 +43,141 @@ def create_access_token(data: dict, expires_delta: timedelta | None = None):
     else:
         expire = datetime.utcnow() + timedelta(minutes=15)
     to_encode.update({"exp": expire})
-    encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
+    encoded_jwt = jwt.encode(to_encode, settings.SECRET_KEY, algorithm=settings.JWT_ALGORITHM)
     return encoded_jwt
 
-async def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)):
+async def get_current_user(token: str = Depends(oauth2_scheme), db: AsyncSession = Depends(get_db)):
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
         headers={"WWW-Authenticate": "Bearer"},
     )
     try:
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+        payload = jwt.decode(token, settings.SECRET_KEY, algorithms=[settings.JWT_ALGORITHM])
         email: str = payload.get("sub")
         if email is None:
             raise credentials_exception
     except JWTError:
         raise credentials_exception
-    user = get_user_by_email(db, email=email)
-    if user is None:
+    user = await load_principal(db, email=email)
+    if user is None or not user.is_active:
         raise credentials_exception
     return user
 
-@router.post("/token", response_model=Token)
-async def login_for_access_token(form_data: OAuth2PasswordRequestForm = Depends(), db: Session = Depends(get_db)):
-    user = get_user_by_email(db, email=form_data.username)
-    if not user or not verify_password(form_data.password, user.hashed_password):
+# WebSockets cannot use the bearer header dependency, so the token comes in the query string. The
+# session is closed right away rather than pinning a pooled connection for the socket's lifetime.
+async def get_websocket_user(token: str = Query(...)):
+    async with AsyncSessionLocal() as db:
+        try:
+            return await get_current_user(token=token, db=db)
+        except HTTPException:
+            raise WebSocketException(code=status.WS_1008_POLICY_VIOLATION)
+
+async def load_principal(db: AsyncSession, email: str):
+    principal = principal_cache.get(email)
+    if principal is not None:
+        return principal
+    epoch = principal_epoch
+    if settings.AUTH_CACHE_REDIS:
+        try:
+            cached = await get_redis().get(PRINCIPAL_KEY_PREFIX + email)
+        except RedisError:
+            logger.warning("Principal cache lookup failed", exc_info=True)
+            cached = None
+        if cached is not None:
+            principal = UserSchema.parse_raw(cached)
+            if epoch == principal_epoch:
+                principal_cache.set(email, principal)
+            return principal
+    user = await get_user_by_email(db, email=email)
+    if user is None:
+        return None
+    principal = UserSchema.from_orm(user)
+    if epoch != principal_epoch:
+        return principal
+    principal_cache.set(email, principal)
+    if settings.AUTH_CACHE_REDIS:
+        try:
+            await get_redis().set(PRINCIPAL_KEY_PREFIX + email, principal.json(), ex=settings.AUTH_CACHE_TTL_SECONDS)
+        except RedisError:
+            logger.warning("Principal cache store failed", exc_info=True)
+    return principal
+
+def evict_local_principal(email: str):
+    global principal_epoch
+    principal_epoch += 1
+    principal_cache.delete(email)
+
+def on_principal_event(user_id: int, message: dict):
+    if message.get("event") == PRINCIPAL_INVALIDATED:
+        evict_local_principal(message["email"])
+
+# Evictions published by any process (this one included) reach every process's cache through the broker.
+manager.add_listener(on_principal_event)
+
+async def evict_shared_principal(email: str, user_id: int | None):
+    if settings.AUTH_CACHE_REDIS:
+        try:
+            await get_redis().delete(PRINCIPAL_KEY_PREFIX + email)
+        except RedisError:
+            logger.warning("Principal cache eviction failed", exc_info=True)
+    try:
+        await manager.notify(user_id, {"event": PRINCIPAL_INVALIDATED, "email": email})
+    except Exception:
+        logger.warning("Principal eviction broadcast failed; other processes expire %s by TTL", email, exc_info=True)
+
+def invalidate_principal(email: str, user_id: int | None = None):
+    # Call after the change has committed, or a concurrent load can cache the old row again.
+    evict_local_principal(email)
+    try:
+        loop = asyncio.get_running_loop()
+    except RuntimeError:
+        logger.warning("No running event loop; principal cache entries for %s on other processes expire by TTL", email)
+        return
+    task = loop.create_task(evict_shared_principal(email, user_id))
+    pending_evictions.add(task)
+    task.add_done_callback(pending_evictions.discard)
+
+PENDING_PRINCIPALS = "pending_principal_evictions"
+
+@event.listens_for(User, "after_update")
+def collect_updated_principal(mapper, connection, target):
+    # Covers ORM updates (deactivation, password or email changes); bulk Core updates must call invalidate_principal.
+    # This runs during flush, so the eviction waits for the commit and is dropped on rollback.
+    emails = {target.email, *inspect(target).attrs.email.history.deleted}
+    object_session(target).info.setdefault(PENDING_PRINCIPALS, set()).update((email, target.id) for email in emails)
+
+@event.listens_for(Session, "after_commit")
+def invalidate_committed_principals(session):
+    for email, user_id in session.info.pop(PENDING_PRINCIPALS, ()):
+        invalidate_principal(email, user_id)
+
+@event.listens_for(Session, "after_rollback")
+def discard_rolled_back_principals(session):
+    session.info.pop(PENDING_PRINCIPALS, None)
+
+@router.post("/token", response_model=Token, dependencies=[query_budget(2)])
+async def login_for_access_token(form_data: OAuth2PasswordRequestForm = Depends(), db: AsyncSession = Depends(get_db)):
+    user = await get_user_by_email(db, email=form_data.username)
+    if not user or not await verify_password(form_data.password, user.hashed_password):
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Incorrect username or password",
             headers={"WWW-Authenticate": "Bearer"},
         )
-    access_token_expires = timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
+    access_token_expires = timedelta(minutes=settings.ACCESS_TOKEN_EXPIRE_MINUTES)
     access_token = create_access_token(
         data={"sub": user.email}, expires_delta=access_token_expires
     )
     return {"access_token": access_token, "token_type": "bearer"}
 
-@router.post("/register", response_model=UserCreate)
-async def register_user(user: UserCreate, db: Session = Depends(get_db)):
-    db_user = get_user_by_email(db, email=user.email)
+@router.post("/register", response_model=UserSchema, dependencies=[query_budget(4)])
+async def register_user(user: UserCreate, db: AsyncSession = Depends(get_db)):
+    db_user = await get_user_by_email(db, email=user.email)
     if db_user:
         raise HTTPException(status_code=400, detail="Email already registered")
-    user.hashed_password = get_password_hash(user.password)
-    return create_user(db=db, user=user)
+    return await create_user(db=db, user=user, hashed_password=await get_password_hash(user.password))
 
-@router.get("/users/me", response_model=UserCreate)
+@router.get("/users/me", response_model=UserSchema, dependencies=[query_budget(1)])
 async def read_users_me(current_user: User = Depends(get_current_user)):
     return current_user
\ No newline at end of file
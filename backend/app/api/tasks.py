@@ -1,63 +1,330 @@
-from fastapi import APIRouter, HTTPException, Depends, status, WebSocket
-from sqlalchemy.orm import Session
-from typing import List
-from pydantic import BaseModel
-from .database import get_db
-from .models import Task
-from .schemas import TaskCreate, TaskUpdate, TaskResponse
-from .crud import create_task, get_task, get_tasks, update_task, delete_task
-from .auth import get_current_user
-from .websockets import manager
+import csv
+import io
+import logging
+from datetime import datetime
+from fastapi import APIRouter, HTTPException, Depends, Header, Query, Request, Response, status, WebSocket
+from fastapi.responses import StreamingResponse
+from starlette.websockets import WebSocketDisconnect
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import List, Optional
+from pydantic import BaseModel, ValidationError
+from ..database import get_db, AsyncSessionLocal
+from ..config import settings
+from ..models import Task
+from ..schemas import TaskCreate, TaskUpdate, TaskResponse, TaskBatchCreate, TaskBatchUpdate, TaskBatchDelete, TaskFilter, TaskStatsResponse, MAX_BATCH_SIZE
+from ..crud import (
+    create_task, get_task, get_tasks, get_tasks_after, update_task, delete_task, encode_cursor, decode_cursor,
+    create_tasks, update_tasks, delete_tasks, get_task_changes, pop_change_seq, get_task_version, StaleTaskError,
+    stream_task_rows, EXPORT_COLUMNS, bulk_insert_tasks, mark_bulk_change, search_tasks,
+    get_task_stats, task_row_snapshot,
+)
+from .auth import get_current_user, get_websocket_user
+from ..websockets import manager, Connection
+from ..utils.etag import make_etag, task_etag, etag_matches
+from ..utils.cache import ReadThroughCache
+from ..utils.task_import import IMPORT_PARSERS
+from ..utils.serialization import FastJSONResponse, dumps
+from ..utils.metrics import query_budget
+from ..replicas import get_read_db, read_from_replica, read_token, replica_router
+
+logger = logging.getLogger(__name__)
 
 router = APIRouter()
 
-@router.post("/tasks/", response_model=TaskResponse, status_code=status.HTTP_201_CREATED)
-async def create_new_task(task: TaskCreate, db: Session = Depends(get_db), current_user: int = Depends(get_current_user)):
+task_list_cache = ReadThroughCache(
+    "tasklist",
+    maxsize=settings.TASK_CACHE_MAX_SIZE,
+    ttl=settings.TASK_CACHE_TTL_SECONDS,
+    use_redis=settings.TASK_CACHE_REDIS,
+)
+# Writes on other replicas reach this one through the broker; drop our local copies for that user.
+manager.add_listener(lambda user_id, message: task_list_cache.invalidate_local(user_id))
+
+async def publish(user_id: int, message: dict):
+    # Runs after the write has committed: a broker outage must not turn a saved change into an error
+    # the client would retry. The change is still in the change log that reconnecting clients replay.
+    try:
+        await manager.broadcast(user_id, message)
+    except Exception:
+        logger.warning("Could not publish %s for user %s", message.get("event"), user_id, exc_info=True)
+
+@router.post("/tasks/", response_model=TaskResponse, status_code=status.HTTP_201_CREATED, dependencies=[query_budget(15)])
+async def create_new_task(task: TaskCreate, db: AsyncSession = Depends(get_db), current_user: int = Depends(get_current_user)):
+    try:
+        new_task = await create_task(db=db, task=task, user_id=current_user.id)
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    await task_list_cache.invalidate(current_user.id)
+    await publish(current_user.id, {"event": "task_created", "task": TaskResponse.from_orm(new_task), "seq": pop_change_seq(db)})
+    return new_task
+
+def task_filters(
+    completed: Optional[bool] = None,
+    created_after: Optional[datetime] = None,
+    created_before: Optional[datetime] = None,
+    updated_after: Optional[datetime] = None,
+    updated_before: Optional[datetime] = None,
+    sort: str = Query("id", regex="^-?(id|created_at|updated_at)$"),
+) -> TaskFilter:
+    return TaskFilter(
+        completed=completed,
+        created_after=created_after,
+        created_before=created_before,
+        updated_after=updated_after,
+        updated_before=updated_before,
+        sort=sort,
+    )
+
+@router.get("/tasks/", response_model=List[TaskResponse], dependencies=[query_budget(3)])
+async def read_tasks(
+    response: Response,
+    cursor: Optional[str] = None,
+    skip: Optional[int] = Query(None, ge=0, description="Deprecated offset paging; use cursor instead"),
+    limit: int = Query(10, ge=1, le=100),
+    filters: TaskFilter = Depends(task_filters),
+    if_none_match: Optional[str] = Header(None),
+    db: AsyncSession = Depends(get_read_db),
+    current_user: int = Depends(get_current_user),
+):
+    offset_mode = skip is not None and cursor is None
+    try:
+        after = decode_cursor(cursor, filters.sort) if cursor else None
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+    # The user's change sequence moves on every task write, so the ETag needs no task rows and a
+    # conditional GET is answered before the page is loaded.
+    version = await get_task_version(db, user_id=current_user.id)
+    etag = make_etag("tasks", current_user.id, version, cursor, skip, limit, filters.cache_key())
+    if etag_matches(if_none_match, etag):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers={"ETag": etag})
+
+    async def load_page():
+        if offset_mode:
+            tasks = await get_tasks(db=db, user_id=current_user.id, skip=skip, limit=limit, filters=filters, rows=True)
+        else:
+            tasks = await get_tasks_after(db=db, user_id=current_user.id, after=after, limit=limit, filters=filters, rows=True)
+        next_cursor = encode_cursor(tasks[-1], filters.sort) if not offset_mode and len(tasks) == limit else None
+        return {"tasks": [task_row_snapshot(task) for task in tasks], "next_cursor": next_cursor}
+
+    try:
+        if read_token.get() is not None:
+            # Reading its own writes: the client gets the primary, never a page someone else cached.
+            page = await load_page()
+        else:
+            # Keyed by version too, so a page cached before a write on another replica is never served under
+            # the new ETag. Pages read from a replica may lag the primary and are served but not cached.
+            page = await task_list_cache.get_or_load(
+                current_user.id, f"v={version}&cursor={cursor}&skip={skip}&limit={limit}&{filters.cache_key()}", load_page,
+                store=not read_from_replica(db),
+            )
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    response.headers["ETag"] = etag
+    if page["next_cursor"]:
+        response.headers["X-Next-Cursor"] = page["next_cursor"]
+    if settings.FAST_JSON_RESPONSES:
+        return FastJSONResponse(page["tasks"], headers=dict(response.headers))
+    return page["tasks"]
+
+async def export_ndjson(user_id: int, session_factory):
+    async with session_factory() as db:
+        async for rows in stream_task_rows(db, user_id=user_id):
+            yield b"".join(dumps(dict(row._mapping)) + b"\n" for row in rows)
+
+async def export_csv(user_id: int, session_factory):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(EXPORT_COLUMNS)
+    yield buffer.getvalue()
+    async with session_factory() as db:
+        async for rows in stream_task_rows(db, user_id=user_id):
+            buffer.seek(0)
+            buffer.truncate()
+            # csv would write str(datetime), with a space; match the NDJSON export's ISO 8601.
+            writer.writerows([value.isoformat() if isinstance(value, datetime) else value for value in row] for row in rows)
+            yield buffer.getvalue()
+
+EXPORT_FORMATS = {
+    "ndjson": (export_ndjson, "application/x-ndjson"),
+    "csv": (export_csv, "text/csv"),
+}
+
+# Static routes (stats, search, export, import, batch) must be registered before /tasks/{task_id} so they are not parsed as an id.
+@router.get("/tasks/stats", response_model=TaskStatsResponse, dependencies=[query_budget(5)])
+async def read_task_stats(db: AsyncSession = Depends(get_db), current_user: int = Depends(get_current_user)):
+    return await get_task_stats(db, user_id=current_user.id)
+
+@router.get("/tasks/search", response_model=List[TaskResponse], dependencies=[query_budget(2)])
+async def search_user_tasks(
+    q: str = Query(..., min_length=1, max_length=200),
+    skip: int = Query(0, ge=0),
+    limit: int = Query(10, ge=1, le=100),
+    db: AsyncSession = Depends(get_read_db),
+    current_user: int = Depends(get_current_user),
+):
+    if not q.strip():
+        return []
+    try:
+        if settings.FAST_JSON_RESPONSES:
+            rows = await search_tasks(db=db, user_id=current_user.id, q=q, skip=skip, limit=limit, rows=True)
+            return FastJSONResponse([task_row_snapshot(row) for row in rows])
+        return await search_tasks(db=db, user_id=current_user.id, q=q, skip=skip, limit=limit)
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@router.get("/tasks/export", dependencies=[query_budget(2)])
+async def export_tasks(format: str = Query("ndjson", regex="^(ndjson|csv)$"), current_user: int = Depends(get_current_user)):
+    # The generator opens its own session so the export does not depend on the request's dependency lifetime;
+    # the replica (or primary) is picked now, while the request's read-your-writes token is in context.
+    generate, media_type = EXPORT_FORMATS[format]
+    return StreamingResponse(
+        generate(current_user.id, replica_router.choose(read_token.get())),
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="tasks.{format}"'},
+    )
+
+@router.post("/tasks/import", dependencies=[query_budget(None)])
+async def import_tasks(request: Request, format: str = Query("ndjson", regex="^(ndjson|csv)$"), db: AsyncSession = Depends(get_db), current_user: int = Depends(get_current_user)):
+    # The body is parsed as it arrives and flushed in IMPORT_CHUNK_SIZE inserts (COPY on Postgres),
+    # each in its own transaction; progress is pushed to the user's WebSocket channel per chunk.
+    processed = inserted = failed = 0
+    errors = []
+    rows = []
+
+    async def flush():
+        nonlocal inserted
+        await bulk_insert_tasks(db, rows)
+        await mark_bulk_change(db, current_user.id)
+        await db.commit()
+        inserted += len(rows)
+        rows.clear()
+        await task_list_cache.invalidate(current_user.id)
+        await publish(current_user.id, {"event": "import_progress", "processed": processed, "inserted": inserted, "failed": failed})
+
+    async for line_no, record in IMPORT_PARSERS[format](request.stream()):
+        processed += 1
+        try:
+            if isinstance(record, ValueError):
+                raise record
+            task = TaskCreate(**record)
+        except (ValidationError, ValueError) as e:
+            failed += 1
+            if len(errors) < settings.IMPORT_MAX_REPORTED_ERRORS:
+                errors.append({"line": line_no, "errors": e.errors() if isinstance(e, ValidationError) else [{"msg": str(e)}]})
+            continue
+        now = datetime.utcnow()
+        rows.append(dict(task.dict(), user_id=current_user.id, created_at=now, updated_at=now))
+        if len(rows) >= settings.IMPORT_CHUNK_SIZE:
+            await flush()
+    if rows:
+        await flush()
+    if inserted:
+        await publish(current_user.id, {"event": "resync", "seq": pop_change_seq(db)})
+    return {"processed": processed, "inserted": inserted, "failed": failed, "errors": errors, "errors_truncated": failed > len(errors)}
+
+@router.post("/tasks/batch", response_model=List[TaskResponse], status_code=status.HTTP_201_CREATED, dependencies=[query_budget(12)])
+async def create_task_batch(batch: TaskBatchCreate, db: AsyncSession = Depends(get_db), current_user: int = Depends(get_current_user)):
     try:
-        new_task = create_task(db=db, task=task, user_id=current_user.id)
-        await manager.broadcast({"event": "task_created", "task": new_task})
-        return new_task
+        created = await create_tasks(db=db, tasks=batch.tasks, user_id=current_user.id)
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
+    payload = [TaskResponse.from_orm(task) for task in created]
+    await task_list_cache.invalidate(current_user.id)
+    await publish(current_user.id, {"event": "tasks_created", "tasks": payload, "seq": pop_change_seq(db)})
+    return payload
 
-@router.get("/tasks/", response_model=List[TaskResponse])
-async def read_tasks(skip: int = 0, limit: int = 10, db: Session = Depends(get_db), current_user: int = Depends(get_current_user)):
+# Each distinct change set in a batch is its own UPDATE, plus a count when it sets completed.
+@router.patch("/tasks/batch", response_model=List[TaskResponse], dependencies=[query_budget(2 * MAX_BATCH_SIZE + 12)])
+async def update_task_batch(batch: TaskBatchUpdate, db: AsyncSession = Depends(get_db), current_user: int = Depends(get_current_user)):
     try:
-        tasks = get_tasks(db=db, user_id=current_user.id, skip=skip, limit=limit)
-        return tasks
+        updated = await update_tasks(db=db, tasks=batch.tasks, user_id=current_user.id)
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
+    payload = [TaskResponse.from_orm(task) for task in updated]
+    if payload:
+        await task_list_cache.invalidate(current_user.id)
+        await publish(current_user.id, {"event": "tasks_updated", "tasks": payload, "seq": pop_change_seq(db)})
+    return payload
 
-@router.get("/tasks/{task_id}", response_model=TaskResponse)
-async def read_task(task_id: int, db: Session = Depends(get_db), current_user: int = Depends(get_current_user)):
-    task = get_task(db=db, task_id=task_id, user_id=current_user.id)
+@router.delete("/tasks/batch", dependencies=[query_budget(8)])
+async def delete_task_batch(batch: TaskBatchDelete, db: AsyncSession = Depends(get_db), current_user: int = Depends(get_current_user)):
+    try:
+        deleted_ids = await delete_tasks(db=db, task_ids=batch.ids, user_id=current_user.id)
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if deleted_ids:
+        await task_list_cache.invalidate(current_user.id)
+        await publish(current_user.id, {"event": "tasks_deleted", "task_ids": deleted_ids, "seq": pop_change_seq(db)})
+    return {"deleted": deleted_ids}
+
+@router.get("/tasks/{task_id}", response_model=TaskResponse, dependencies=[query_budget(2)])
+async def read_task(task_id: int, response: Response, if_none_match: Optional[str] = Header(None), db: AsyncSession = Depends(get_read_db), current_user: int = Depends(get_current_user)):
+    task = await get_task(db=db, task_id=task_id, user_id=current_user.id)
     if task is None:
         raise HTTPException(status_code=404, detail="Task not found")
+    etag = task_etag(task)
+    if etag_matches(if_none_match, etag):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers={"ETag": etag})
+    response.headers["ETag"] = etag
     return task
 
-@router.put("/tasks/{task_id}", response_model=TaskResponse)
-async def update_existing_task(task_id: int, task: TaskUpdate, db: Session = Depends(get_db), current_user: int = Depends(get_current_user)):
+@router.put("/tasks/{task_id}", response_model=TaskResponse, dependencies=[query_budget(10)])
+async def update_existing_task(task_id: int, task: TaskUpdate, response: Response, if_match: Optional[str] = Header(None), db: AsyncSession = Depends(get_db), current_user: int = Depends(get_current_user)):
+    precondition = None
+    if if_match is not None:
+        precondition = lambda current: etag_matches(if_match, task_etag(current), weak=False)
     try:
-        updated_task = update_task(db=db, task_id=task_id, task=task, user_id=current_user.id)
-        await manager.broadcast({"event": "task_updated", "task": updated_task})
-        return updated_task
+        updated_task = await update_task(db=db, task_id=task_id, task=task, user_id=current_user.id, precondition=precondition)
+    except StaleTaskError as e:
+        raise HTTPException(status_code=status.HTTP_412_PRECONDITION_FAILED, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
+    if updated_task is None:
+        raise HTTPException(status_code=404, detail="Task not found")
+    await task_list_cache.invalidate(current_user.id)
+    await publish(current_user.id, {"event": "task_updated", "task": TaskResponse.from_orm(updated_task), "seq": pop_change_seq(db)})
+    response.headers["ETag"] = task_etag(updated_task)
+    return updated_task
 
-@router.delete("/tasks/{task_id}", status_code=status.HTTP_204_NO_CONTENT)
-async def delete_existing_task(task_id: int, db: Session = Depends(get_db), current_user: int = Depends(get_current_user)):
+@router.delete("/tasks/{task_id}", status_code=status.HTTP_204_NO_CONTENT, dependencies=[query_budget(10)])
+async def delete_existing_task(task_id: int, db: AsyncSession = Depends(get_db), current_user: int = Depends(get_current_user)):
     try:
-        delete_task(db=db, task_id=task_id, user_id=current_user.id)
-        await manager.broadcast({"event": "task_deleted", "task_id": task_id})
+        deleted_task = await delete_task(db=db, task_id=task_id, user_id=current_user.id)
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
+    if deleted_task is None:
+        raise HTTPException(status_code=404, detail="Task not found")
+    await task_list_cache.invalidate(current_user.id)
+    await publish(current_user.id, {"event": "task_deleted", "task_id": task_id, "seq": pop_change_seq(db)})
+
+async def send_missed_changes(connection: Connection, since: int):
+    async with AsyncSessionLocal() as db:
+        cursor, changes = await get_task_changes(db, user_id=connection.user_id, since=since, limit=settings.TASK_CHANGE_REPLAY_LIMIT)
+    last_seq = cursor.last_seq if cursor else 0
+    compacted_seq = cursor.compacted_seq if cursor else 0
+    if since < compacted_seq or len(changes) > settings.TASK_CHANGE_REPLAY_LIMIT:
+        message = {"event": "resync", "seq": last_seq}
+    else:
+        message = {
+            "event": "changes",
+            "seq": changes[-1].seq if changes else since,
+            "changes": [{"seq": c.seq, "op": c.op, "task_id": c.task_id, "task": c.task} for c in changes],
+        }
+    await manager.send_personal_message(message, connection)
 
 @router.websocket("/ws/tasks")
-async def websocket_endpoint(websocket: WebSocket, current_user: int = Depends(get_current_user)):
-    await manager.connect(websocket)
+async def websocket_endpoint(websocket: WebSocket, since: Optional[int] = None, current_user: int = Depends(get_websocket_user)):
+    # Register before replaying so no change falls between the replay and live delivery;
+    # clients apply events by seq and ignore any they have already seen.
+    connection = await manager.connect(websocket, current_user.id)
     try:
+        if since is not None:
+            await send_missed_changes(connection, since)
         while True:
             data = await websocket.receive_text()
-            await manager.send_personal_message(f"You wrote: {data}", websocket)
+            await manager.send_personal_message(f"You wrote: {data}", connection)
     except WebSocketDisconnect:
-        manager.disconnect(websocket)
\ No newline at end of file
+        pass
+    finally:
+        manager.disconnect(connection)
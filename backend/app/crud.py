@@ -0,0 +1,501 @@
+import base64
+import json
+from datetime import datetime, timedelta
+from typing import Callable, List, Optional, Tuple
+from sqlalchemy import select, insert, update, delete, func, literal, literal_column, table, column, tuple_, bindparam
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+from .models import User, Task, TaskChange, TaskChangeCursor, TaskStats, Notification
+from .models.task import REMINDER_PENDING
+from .schemas import UserCreate, TaskCreate, TaskUpdate, TaskBatchUpdateItem, TaskResponse, TaskFilter
+
+async def get_user_by_email(db: AsyncSession, email: str):
+    result = await db.execute(select(User).where(User.email == email))
+    return result.scalars().first()
+
+async def create_user(db: AsyncSession, user: UserCreate, hashed_password: str):
+    db_user = User(email=user.email, hashed_password=hashed_password)
+    db.add(db_user)
+    await db.commit()
+    await db.refresh(db_user)
+    return db_user
+
+def build_task_list_query(user_id: int, filters: TaskFilter, after: Optional[Tuple] = None):
+    query = select(Task).where(Task.user_id == user_id)
+    if filters.completed is not None:
+        query = query.where(Task.completed == filters.completed)
+    if filters.created_after is not None:
+        query = query.where(Task.created_at >= filters.created_after)
+    if filters.created_before is not None:
+        query = query.where(Task.created_at < filters.created_before)
+    if filters.updated_after is not None:
+        query = query.where(Task.updated_at >= filters.updated_after)
+    if filters.updated_before is not None:
+        query = query.where(Task.updated_at < filters.updated_before)
+    descending = filters.sort.startswith("-")
+    sort_column = getattr(Task, filters.sort.lstrip("-"))
+    if sort_column is Task.id:
+        if after is not None:
+            query = query.where(Task.id < after[1] if descending else Task.id > after[1])
+        return query.order_by(Task.id.desc() if descending else Task.id)
+    if after is not None:
+        position = tuple_(sort_column, Task.id)
+        query = query.where(position < after if descending else position > after)
+    if descending:
+        return query.order_by(sort_column.desc(), Task.id.desc())
+    return query.order_by(sort_column, Task.id)
+
+# TaskResponse's fields in declaration order, for list reads that skip ORM objects and pydantic.
+TASK_RESPONSE_FIELDS = tuple(TaskResponse.__fields__)
+
+def task_row_snapshot(row) -> dict:
+    # Same output as task_snapshot, built straight from a TASK_RESPONSE_FIELDS row; only for rows read from the DB.
+    return {name: value.isoformat() if isinstance(value, datetime) else value for name, value in zip(TASK_RESPONSE_FIELDS, row)}
+
+async def fetch_task_list(db: AsyncSession, query, rows: bool):
+    if rows:
+        result = await db.execute(query.with_only_columns(*(getattr(Task, name) for name in TASK_RESPONSE_FIELDS)))
+        return result.all()
+    result = await db.execute(query)
+    return result.scalars().all()
+
+async def get_tasks(db: AsyncSession, user_id: int, skip: int = 0, limit: int = 10, filters: Optional[TaskFilter] = None, rows: bool = False):
+    query = build_task_list_query(user_id, filters or TaskFilter())
+    return await fetch_task_list(db, query.offset(skip).limit(limit), rows)
+
+async def get_tasks_after(db: AsyncSession, user_id: int, after: Optional[Tuple] = None, limit: int = 10, filters: Optional[TaskFilter] = None, rows: bool = False):
+    query = build_task_list_query(user_id, filters or TaskFilter(), after=after)
+    return await fetch_task_list(db, query.limit(limit), rows)
+
+def encode_cursor(task, sort: str = "id") -> str:
+    column = sort.lstrip("-")
+    position = [task.id] if column == "id" else [getattr(task, column).isoformat(), task.id]
+    return base64.urlsafe_b64encode(json.dumps(position).encode()).decode().rstrip("=")
+
+def decode_cursor(cursor: str, sort: str = "id") -> Tuple:
+    padded = cursor + "=" * (-len(cursor) % 4)
+    position = json.loads(base64.urlsafe_b64decode(padded.encode()).decode())
+    # Cursors issued before sorting was supported are a bare id.
+    if isinstance(position, int):
+        position = [position]
+    if not isinstance(position, list):
+        raise ValueError("Invalid cursor")
+    if sort.lstrip("-") == "id":
+        if len(position) != 1 or not isinstance(position[0], int):
+            raise ValueError("Invalid cursor")
+        return None, position[0]
+    if len(position) != 2 or not isinstance(position[0], str) or not isinstance(position[1], int):
+        raise ValueError("Invalid cursor")
+    return datetime.fromisoformat(position[0]), position[1]
+
+class StaleTaskError(Exception):
+    pass
+
+EXPORT_COLUMNS = ("id", "title", "description", "completed", "due_at", "created_at", "updated_at")
+
+async def stream_task_rows(db: AsyncSession, user_id: int, batch_size: int = 500):
+    # Server-side cursor: rows arrive in batches of batch_size, never as one materialised list.
+    query = (
+        select(*(getattr(Task, column) for column in EXPORT_COLUMNS))
+        .where(Task.user_id == user_id)
+        .order_by(Task.id)
+        .execution_options(yield_per=batch_size)
+    )
+    result = await db.stream(query)
+    async for rows in result.partitions(batch_size):
+        yield rows
+
+tasks_fts = table("tasks_fts", column("rowid"))
+
+def fts5_query(q: str) -> str:
+    # Quote every term so user input cannot be read as FTS5 query syntax.
+    return " ".join('"' + term.replace('"', '""') + '"' for term in q.split())
+
+def build_search_query(user_id: int, q: str, dialect: str):
+    if dialect == "postgresql":
+        ts_query = func.websearch_to_tsquery("english", q)
+        search_vector = literal_column("tasks.search_vector")
+        return (
+            select(Task)
+            .where(Task.user_id == user_id, search_vector.op("@@")(ts_query))
+            .order_by(func.ts_rank_cd(search_vector, ts_query).desc(), Task.id.desc())
+        )
+    return (
+        select(Task)
+        .join(tasks_fts, tasks_fts.c.rowid == Task.id)
+        .where(Task.user_id == user_id, literal_column("tasks_fts").op("MATCH")(fts5_query(q)))
+        .order_by(func.bm25(literal_column("tasks_fts")), Task.id.desc())
+    )
+
+async def search_tasks(db: AsyncSession, user_id: int, q: str, skip: int = 0, limit: int = 10, rows: bool = False):
+    connection = await db.connection()
+    query = build_search_query(user_id, q, connection.dialect.name)
+    return await fetch_task_list(db, query.offset(skip).limit(limit), rows)
+
+async def get_task(db: AsyncSession, task_id: int, user_id: int, for_update: bool = False):
+    query = select(Task).where(Task.id == task_id, Task.user_id == user_id)
+    if for_update:
+        query = query.with_for_update()
+    result = await db.execute(query)
+    return result.scalars().first()
+
+async def get_task_version(db: AsyncSession, user_id: int) -> int:
+    result = await db.execute(select(TaskChangeCursor.last_seq).where(TaskChangeCursor.user_id == user_id))
+    return result.scalar() or 0
+
+async def create_task(db: AsyncSession, task: TaskCreate, user_id: int):
+    db_task = Task(**task.dict(), user_id=user_id)
+    db.add(db_task)
+    await db.flush()
+    await adjust_task_stats(db, user_id, total=1, completed=int(bool(db_task.completed)))
+    await record_task_changes(db, user_id, [("created", db_task.id, task_snapshot(db_task))])
+    await db.commit()
+    await db.refresh(db_task)
+    return db_task
+
+async def update_task(db: AsyncSession, task_id: int, task: TaskUpdate, user_id: int, precondition: Optional[Callable[[Task], bool]] = None):
+    # The row is locked while the precondition is checked, so a concurrent writer cannot slip in between.
+    db_task = await get_task(db, task_id=task_id, user_id=user_id, for_update=precondition is not None)
+    if db_task is None:
+        return None
+    if precondition is not None and not precondition(db_task):
+        raise StaleTaskError("Task was modified by another request")
+    was_completed = bool(db_task.completed)
+    changes = task.dict(exclude_unset=True)
+    if "due_at" in changes and changes["due_at"] != db_task.due_at:
+        changes["reminded_at"] = None
+    for field, value in changes.items():
+        setattr(db_task, field, value)
+    await db.flush()
+    if bool(db_task.completed) != was_completed:
+        await adjust_task_stats(db, user_id, completed=1 if db_task.completed else -1)
+    await record_task_changes(db, user_id, [("updated", db_task.id, task_snapshot(db_task))])
+    await db.commit()
+    await db.refresh(db_task)
+    return db_task
+
+async def delete_task(db: AsyncSession, task_id: int, user_id: int):
+    db_task = await get_task(db, task_id=task_id, user_id=user_id)
+    if db_task is None:
+        return None
+    await db.delete(db_task)
+    await db.flush()
+    await adjust_task_stats(db, user_id, total=-1, completed=-int(bool(db_task.completed)))
+    await record_task_changes(db, user_id, [("deleted", task_id, None)])
+    await db.commit()
+    return db_task
+
+async def supports_returning(db: AsyncSession) -> bool:
+    # SQLAlchemy 1.4 only emits UPDATE/DELETE/multi-row INSERT ... RETURNING on Postgres;
+    # other dialects (SQLite in local runs and tests) take a follow-up SELECT instead.
+    connection = await db.connection()
+    return connection.dialect.full_returning
+
+async def create_tasks(db: AsyncSession, tasks: List[TaskCreate], user_id: int):
+    now = datetime.utcnow()
+    rows = [dict(task.dict(), user_id=user_id, created_at=now, updated_at=now) for task in tasks]
+    if await supports_returning(db):
+        result = await db.execute(insert(Task).values(rows).returning(*Task.__table__.c))
+        created = result.all()
+    elif (await db.connection()).dialect.name == "sqlite":
+        # One executemany instead of an INSERT per row. The insert takes SQLite's database-wide write
+        # lock until commit, so the newest len(rows) ids for this user are exactly the rows just added.
+        await db.execute(insert(Task), rows)
+        result = await db.execute(
+            select(*Task.__table__.c).where(Task.user_id == user_id).order_by(Task.id.desc()).limit(len(rows))
+        )
+        created = result.all()[::-1]
+    else:
+        created = [Task(**row) for row in rows]
+        db.add_all(created)
+        await db.flush()
+    await adjust_task_stats(db, user_id, total=len(rows), completed=sum(1 for row in rows if row["completed"]))
+    await record_task_changes(db, user_id, [("created", row.id, task_snapshot(row)) for row in created])
+    await db.commit()
+    return created
+
+async def update_tasks(db: AsyncSession, tasks: List[TaskBatchUpdateItem], user_id: int):
+    # Tasks that receive the same changes (e.g. "complete all") share one UPDATE ... WHERE id IN (...).
+    # Items repeating an id are merged in order, as if each had been sent as its own PATCH.
+    latest = {}
+    for task in tasks:
+        latest.setdefault(task.id, {}).update(task.dict(exclude_unset=True, exclude={"id"}))
+    groups = {}
+    for task_id, values in latest.items():
+        if values:
+            groups.setdefault(tuple(sorted(values.items())), []).append(task_id)
+    now = datetime.utcnow()
+    returning = await supports_returning(db)
+    updated = {}
+    completed_delta = 0
+    for values, ids in groups.items():
+        changes = dict(values)
+        if changes.get("completed") is not None:
+            flipped = await db.execute(
+                select(func.count()).select_from(Task)
+                .where(Task.user_id == user_id, Task.id.in_(ids), Task.completed != changes["completed"])
+            )
+            completed_delta += flipped.scalar() * (1 if changes["completed"] else -1)
+        statement = (
+            update(Task)
+            .where(Task.user_id == user_id, Task.id.in_(ids))
+            .values(**changes, **({"reminded_at": None} if "due_at" in changes else {}), updated_at=now)
+            .execution_options(synchronize_session=False)
+        )
+        if returning:
+            result = await db.execute(statement.returning(*Task.__table__.c))
+            updated.update((row.id, row) for row in result.all())
+        else:
+            await db.execute(statement)
+    if not returning and groups:
+        result = await db.execute(
+            select(*Task.__table__.c).where(Task.user_id == user_id, Task.id.in_([task_id for ids in groups.values() for task_id in ids]))
+        )
+        updated.update((row.id, row) for row in result.all())
+    if completed_delta:
+        await adjust_task_stats(db, user_id, completed=completed_delta)
+    rows = [updated[task_id] for task_id in latest if task_id in updated]
+    if rows:
+        await record_task_changes(db, user_id, [("updated", row.id, task_snapshot(row)) for row in rows])
+    await db.commit()
+    return rows
+
+async def delete_tasks(db: AsyncSession, task_ids: List[int], user_id: int):
+    statement = (
+        delete(Task)
+        .where(Task.user_id == user_id, Task.id.in_(task_ids))
+        .execution_options(synchronize_session=False)
+    )
+    if await supports_returning(db):
+        result = await db.execute(statement.returning(Task.id, Task.completed))
+        rows = result.all()
+    else:
+        result = await db.execute(select(Task.id, Task.completed).where(Task.user_id == user_id, Task.id.in_(task_ids)))
+        rows = result.all()
+        await db.execute(statement)
+    deleted = [row.id for row in rows]
+    if deleted:
+        await adjust_task_stats(db, user_id, total=-len(rows), completed=-sum(1 for row in rows if row.completed))
+        await record_task_changes(db, user_id, [("deleted", task_id, None) for task_id in deleted])
+    await db.commit()
+    return deleted
+
+IMPORT_COLUMNS = ("title", "description", "completed", "due_at", "user_id", "created_at", "updated_at")
+
+async def bulk_insert_tasks(db: AsyncSession, rows: List[dict]):
+    connection = await db.connection()
+    if connection.dialect.name == "postgresql":
+        # The asyncpg adapter sends BEGIN with the first statement executed through it, and COPY goes to
+        # the driver directly. Without a statement first, COPY would autocommit outside the chunk's
+        # transaction and survive its rollback.
+        await db.execute(select(literal(1)))
+        raw_connection = await connection.get_raw_connection()
+        await raw_connection.driver_connection.copy_records_to_table(
+            Task.__tablename__,
+            columns=IMPORT_COLUMNS,
+            records=[tuple(row[column] for column in IMPORT_COLUMNS) for row in rows],
+        )
+    else:
+        await db.execute(insert(Task), rows)
+    await adjust_task_stats(db, rows[0]["user_id"], total=len(rows), completed=sum(1 for row in rows if row["completed"]))
+
+async def mark_bulk_change(db: AsyncSession, user_id: int):
+    # Bulk writes skip the per-row change log. Advancing compacted_seq past them tells
+    # reconnecting clients that a delta is impossible and they must resync.
+    seq = await allocate_change_seqs(db, user_id, 1)
+    await db.execute(update(TaskChangeCursor).where(TaskChangeCursor.user_id == user_id).values(compacted_seq=seq))
+    db.info["change_seq"] = seq
+
+def task_snapshot(task) -> dict:
+    return json.loads(TaskResponse.from_orm(task).json())
+
+async def allocate_change_seqs(db: AsyncSession, user_id: int, count: int) -> int:
+    # The cursor row update takes a row lock, so concurrent writers for one user commit in sequence order.
+    statement = (
+        update(TaskChangeCursor)
+        .where(TaskChangeCursor.user_id == user_id)
+        .values(last_seq=TaskChangeCursor.last_seq + count)
+    )
+    if await supports_returning(db):
+        last_seq = (await db.execute(statement.returning(TaskChangeCursor.last_seq))).scalar()
+    elif (await db.execute(statement)).rowcount:
+        last_seq = (await db.execute(select(TaskChangeCursor.last_seq).where(TaskChangeCursor.user_id == user_id))).scalar()
+    else:
+        last_seq = None
+    if last_seq is None:
+        try:
+            async with db.begin_nested():
+                await db.execute(insert(TaskChangeCursor).values(user_id=user_id, last_seq=count, compacted_seq=0))
+        except IntegrityError:
+            return await allocate_change_seqs(db, user_id, count)
+        last_seq = count
+    return last_seq - count + 1
+
+async def record_task_changes(db: AsyncSession, user_id: int, changes: List[Tuple[str, int, Optional[dict]]]):
+    first_seq = await allocate_change_seqs(db, user_id, len(changes))
+    now = datetime.utcnow()
+    await db.execute(insert(TaskChange), [
+        {"user_id": user_id, "seq": first_seq + offset, "op": op, "task_id": task_id, "task": task, "created_at": now}
+        for offset, (op, task_id, task) in enumerate(changes)
+    ])
+    db.info["change_seq"] = first_seq + len(changes) - 1
+
+def pop_change_seq(db: AsyncSession) -> Optional[int]:
+    return db.info.pop("change_seq", None)
+
+async def get_task_changes(db: AsyncSession, user_id: int, since: int, limit: int):
+    cursor = await db.get(TaskChangeCursor, user_id)
+    result = await db.execute(
+        select(TaskChange)
+        .where(TaskChange.user_id == user_id, TaskChange.seq > since)
+        .order_by(TaskChange.seq)
+        .limit(limit + 1)
+    )
+    return cursor, result.scalars().all()
+
+async def compact_task_changes(db: AsyncSession, retention: timedelta) -> int:
+    cutoff = datetime.utcnow() - retention
+    horizons = (
+        select(TaskChange.user_id, func.max(TaskChange.seq).label("seq"))
+        .where(TaskChange.created_at < cutoff)
+        .group_by(TaskChange.user_id)
+    )
+    compacted = 0
+    for user_id, seq in (await db.execute(horizons)).all():
+        await db.execute(
+            update(TaskChangeCursor)
+            .where(TaskChangeCursor.user_id == user_id, TaskChangeCursor.compacted_seq < seq)
+            .values(compacted_seq=seq)
+        )
+        result = await db.execute(delete(TaskChange).where(TaskChange.user_id == user_id, TaskChange.seq <= seq))
+        compacted += result.rowcount
+    await db.commit()
+    return compacted
+
+async def adjust_task_stats(db: AsyncSession, user_id: int, total: int = 0, completed: int = 0):
+    result = await db.execute(
+        update(TaskStats)
+        .where(TaskStats.user_id == user_id)
+        .values(total=TaskStats.total + total, completed=TaskStats.completed + completed)
+    )
+    if result.rowcount:
+        return
+    # No counters yet (a new user, or one whose tasks predate them): count from the table, which
+    # already includes this transaction's flushed write, instead of applying the delta.
+    try:
+        async with db.begin_nested():
+            await insert_task_stats(db, user_id)
+    except IntegrityError:
+        await adjust_task_stats(db, user_id, total=total, completed=completed)
+
+async def count_task_stats(db: AsyncSession, user_id: int):
+    result = await db.execute(
+        select(func.count(), func.count().filter(Task.completed.is_(True))).where(Task.user_id == user_id)
+    )
+    return result.one()
+
+async def insert_task_stats(db: AsyncSession, user_id: int) -> TaskStats:
+    total, completed = await count_task_stats(db, user_id)
+    stats = TaskStats(user_id=user_id, total=total, completed=completed)
+    db.add(stats)
+    await db.flush()
+    return stats
+
+async def get_task_stats(db: AsyncSession, user_id: int) -> TaskStats:
+    stats = await db.get(TaskStats, user_id)
+    if stats is not None:
+        return stats
+    try:
+        async with db.begin_nested():
+            stats = await insert_task_stats(db, user_id)
+    except IntegrityError:
+        return await db.get(TaskStats, user_id, populate_existing=True)
+    await db.commit()
+    return stats
+
+async def reconcile_task_stats(db: AsyncSession) -> int:
+    # Recomputes each user's counters in its own transaction; returns how many users were corrected.
+    # Locking the counters row first means a concurrent writer either committed before the count or
+    # applies its delta after the corrected value.
+    task_owners = await db.execute(select(Task.user_id).distinct())
+    stats_owners = await db.execute(select(TaskStats.user_id))
+    user_ids = set(task_owners.scalars()) | set(stats_owners.scalars())
+    await db.commit()
+    corrected = 0
+    for user_id in sorted(user_ids):
+        result = await db.execute(select(TaskStats).where(TaskStats.user_id == user_id).with_for_update())
+        stats = result.scalars().first()
+        if stats is None:
+            try:
+                async with db.begin_nested():
+                    await insert_task_stats(db, user_id)
+                corrected += 1
+            except IntegrityError:
+                pass
+        else:
+            total, completed = await count_task_stats(db, user_id)
+            if (stats.total, stats.completed) != (total, completed):
+                stats.total, stats.completed = total, completed
+                corrected += 1
+        await db.commit()
+    return corrected
+
+async def create_notifications(db: AsyncSession, notifications: List[dict]) -> List[Notification]:
+    created = [Notification(**notification) for notification in notifications]
+    db.add_all(created)
+    await db.commit()
+    return created
+
+async def save_notification_statuses(db: AsyncSession, statuses: List[dict]):
+    # One executemany UPDATE per flush instead of a round trip per delivered notification.
+    if not statuses:
+        return
+    notifications = Notification.__table__
+    await db.execute(
+        update(notifications).where(notifications.c.id == bindparam("notification_id")).values(
+            status=bindparam("new_status"), attempts=bindparam("new_attempts"),
+            error=bindparam("new_error"), sent_at=bindparam("new_sent_at"),
+        ),
+        [
+            {"notification_id": row["id"], "new_status": row["status"], "new_attempts": row["attempts"],
+             "new_error": row["error"], "new_sent_at": row["sent_at"]}
+            for row in statuses
+        ],
+    )
+    await db.commit()
+
+async def stream_pending_reminders(db: AsyncSession, start: datetime, end: datetime, user_id: Optional[int] = None, batch_size: int = 1000):
+    # Reads through the partial due_at index; the predicate must repeat REMINDER_PENDING for it to apply.
+    query = (
+        select(Task.id, Task.user_id, Task.title, Task.due_at)
+        .where(REMINDER_PENDING, Task.due_at >= start, Task.due_at < end)
+        .order_by(Task.due_at)
+        .execution_options(yield_per=batch_size)
+    )
+    if user_id is not None:
+        query = query.where(Task.user_id == user_id)
+    result = await db.stream(query)
+    async for rows in result.partitions(batch_size):
+        yield rows
+
+async def claim_reminders(db: AsyncSession, task_ids: List[int], now: datetime):
+    # Marks due reminders as sent and returns the rows this call claimed. Every replica schedules the
+    # same window, so the reminded_at IS NULL check decides which one sends; due_at <= now skips tasks
+    # whose due date moved later since they were scheduled. updated_at is left alone: this is not a user edit.
+    statement = (
+        update(Task)
+        .where(Task.id.in_(task_ids), REMINDER_PENDING, Task.due_at <= now)
+        .values(reminded_at=now, updated_at=Task.updated_at)
+        .execution_options(synchronize_session=False)
+    )
+    if await supports_returning(db):
+        result = await db.execute(statement.returning(Task.id, Task.user_id, Task.title, Task.due_at))
+        claimed = result.all()
+    else:
+        await db.execute(statement)
+        result = await db.execute(
+            select(Task.id, Task.user_id, Task.title, Task.due_at).where(Task.id.in_(task_ids), Task.reminded_at == now)
+        )
+        claimed = result.all()
+    await db.commit()
+    return claimed
@@ -0,0 +1,128 @@
+import os
+from sqlalchemy import create_engine, event, inspect
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+from sqlalchemy.orm import declarative_base, sessionmaker
+from .config import settings
+from .utils.metrics import InstrumentedAsyncPool, instrument_engine
+
+ASYNC_DRIVERS = {
+    "postgresql": "postgresql+asyncpg",
+    "postgres": "postgresql+asyncpg",
+    "sqlite": "sqlite+aiosqlite",
+}
+
+def to_async_url(url: str) -> str:
+    scheme, sep, rest = url.partition("://")
+    return ASYNC_DRIVERS.get(scheme, scheme) + sep + rest
+
+def engine_options(url: str) -> dict:
+    if url.startswith("sqlite"):
+        return {}
+    return {
+        "poolclass": InstrumentedAsyncPool,
+        "pool_size": settings.DB_POOL_SIZE,
+        "max_overflow": settings.DB_MAX_OVERFLOW,
+        "pool_pre_ping": True,
+    }
+
+def keep_connect_lock_async(engine) -> None:
+    # engine is a sync Engine (for an AsyncEngine, pass .sync_engine). SQLAlchemy 1.4 serializes a
+    # pool's first connections with an asyncio-aware lock, but the pool dispose() builds in its place
+    # gets a thread lock. Two coroutines opening the first connections after a dispose (a worker after
+    # post_fork, an app started again in tests) would then deadlock the event loop.
+    @event.listens_for(engine, "engine_disposed")
+    def restore_connect_lock(engine):
+        engine.pool.dispatch.connect._set_asyncio()
+
+async_engine = create_async_engine(
+    settings.ASYNC_DATABASE_URL or to_async_url(settings.DATABASE_URL),
+    **engine_options(settings.DATABASE_URL),
+)
+keep_connect_lock_async(async_engine.sync_engine)
+instrument_engine(async_engine.sync_engine, "primary")
+AsyncSessionLocal = sessionmaker(async_engine, class_=AsyncSession, autoflush=False, expire_on_commit=False)
+
+Base = declarative_base()
+
+async def get_db():
+    async with AsyncSessionLocal() as db:
+        yield db
+
+# The sync engine is only used for migrations and offline scripts; request handlers use the async
+# engine. It is created on first access so API workers never build it (or import its driver).
+sync_engine = None
+SyncSessionLocal = None
+
+def get_sync_engine():
+    global sync_engine, SyncSessionLocal
+    if sync_engine is None:
+        sync_engine = create_engine(settings.DATABASE_URL, future=True)
+        SyncSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=sync_engine)
+    return sync_engine
+
+def __getattr__(name: str):
+    # Keeps `from app.database import engine, SessionLocal` working without building them at import.
+    if name == "engine":
+        return get_sync_engine()
+    if name == "SessionLocal":
+        get_sync_engine()
+        return SyncSessionLocal
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+MIGRATIONS_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "migrations")
+# The schema the app created with create_all before migrations existed.
+BASELINE_REVISION = "0001"
+
+def alembic_config(url: str | None = None):
+    from alembic.config import Config
+    config = Config()
+    config.set_main_option("script_location", MIGRATIONS_DIR)
+    config.set_main_option("sqlalchemy.url", url or settings.DATABASE_URL)
+    return config
+
+class SchemaMismatchError(Exception):
+    pass
+
+def schema_differences(connection) -> list:
+    # Only meaningful while the models still describe the baseline revision; once later migrations
+    # exist, the legacy check must compare against the baseline schema instead.
+    from alembic.autogenerate import compare_metadata
+    from alembic.migration import MigrationContext
+    from .models.task import is_search_object
+
+    def include_object(obj, name, type_, reflected, compare_to):
+        return not (reflected and compare_to is None and is_search_object(name))
+
+    context = MigrationContext.configure(connection, opts={"include_object": include_object})
+    return [describe_difference(diff) for diff in compare_metadata(context, Base.metadata)]
+
+def describe_difference(diff) -> str:
+    # ("add_column", schema, "tasks", Column(...)) -> "add_column tasks.due_at"; modify_* diffs come as a list.
+    if isinstance(diff, list):
+        op, _, table, column = diff[0][:4]
+        return f"{op} {table}.{column}"
+    op, *args = diff
+    names = [arg if isinstance(arg, str) else getattr(arg, "name", None) for arg in args]
+    return " ".join([op, ".".join(name for name in names if name)]).strip()
+
+def upgrade_database(url: str | None = None) -> None:
+    # Schema changes are an explicit deploy step (python -m app.jobs migrate), not something every
+    # worker does on import.
+    from alembic import command
+    config = alembic_config(url)
+    target = create_engine(url or settings.DATABASE_URL, future=True)
+    try:
+        with target.connect() as connection:
+            tables = set(inspect(connection).get_table_names())
+            # Stamping skips the baseline migration, so only a database that really has that schema may be stamped.
+            differences = schema_differences(connection) if "tasks" in tables and "alembic_version" not in tables else []
+    finally:
+        target.dispose()
+    if differences:
+        raise SchemaMismatchError(
+            f"Database has tables but no alembic_version, and its schema does not match revision {BASELINE_REVISION}; "
+            f"refusing to stamp it. Differences: {', '.join(differences)}"
+        )
+    if "tasks" in tables and "alembic_version" not in tables:
+        command.stamp(config, BASELINE_REVISION)
+    command.upgrade(config, "head")
@@ -0,0 +1,76 @@
+import argparse
+import asyncio
+import logging
+from datetime import timedelta
+from .config import settings
+from .database import AsyncSessionLocal, async_engine, upgrade_database
+from .crud import compact_task_changes, reconcile_task_stats
+from .utils.notifications import notification_worker
+from .utils.reminders import reminder_scheduler
+from .websockets import manager
+from .utils.redis_client import close_redis
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Maintenance jobs, run from a scheduler with e.g. `python -m app.jobs compact-changes`.
+
+async def migrate():
+    # Run once per deploy, before the new API pods start; the app itself never changes the schema.
+    await asyncio.to_thread(upgrade_database)
+    logger.info("Database schema is up to date")
+
+async def compact_changes():
+    async with AsyncSessionLocal() as db:
+        removed = await compact_task_changes(db, retention=timedelta(hours=settings.TASK_CHANGE_RETENTION_HOURS))
+    logger.info("Compacted %d task changes", removed)
+
+async def reconcile_stats():
+    async with AsyncSessionLocal() as db:
+        corrected = await reconcile_task_stats(db)
+    logger.info("Corrected task counters for %d users", corrected)
+
+async def notification_worker_job():
+    # Long-running: drains the notification queue until interrupted. Set NOTIFICATION_WORKER_IN_API=false
+    # on the API pods when running this separately.
+    await notification_worker.start()
+    try:
+        await asyncio.Event().wait()
+    finally:
+        await notification_worker.stop()
+        await close_redis()
+
+async def reminder_scheduler_job():
+    # Long-running: fires due-date reminders until interrupted. The broker subscription keeps the
+    # schedule in step with task writes made on the API pods (set REMINDER_SCHEDULER_IN_API=false there).
+    await manager.start()
+    await reminder_scheduler.start()
+    try:
+        await asyncio.Event().wait()
+    finally:
+        await reminder_scheduler.stop()
+        await manager.stop()
+        await close_redis()
+
+JOBS = {
+    "migrate": migrate,
+    "compact-changes": compact_changes,
+    "reconcile-stats": reconcile_stats,
+    "notification-worker": notification_worker_job,
+    "reminder-scheduler": reminder_scheduler_job,
+}
+
+async def run(job: str):
+    try:
+        await JOBS[job]()
+    finally:
+        await async_engine.dispose()
+
+def main():
+    parser = argparse.ArgumentParser(description="Run a backend maintenance job")
+    parser.add_argument("job", choices=sorted(JOBS))
+    args = parser.parse_args()
+    asyncio.run(run(args.job))
+
+if __name__ == "__main__":
+    main()
@@ -1,15 +1,19 @@
-from fastapi import FastAPI, HTTPException, WebSocket, Depends
+from fastapi import FastAPI, Request, Response, WebSocket
+from fastapi.responses import JSONResponse
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.security import OAuth2PasswordBearer, OAuth2PasswordRequestForm
-from sqlalchemy.orm import Session
 from starlette.websockets import WebSocketDisconnect
-from pydantic import BaseModel
-from typing import List
-from .database import SessionLocal, engine, Base
-from .models import User, Task
-from .schemas import UserCreate, TaskCreate, TaskUpdate
-from .crud import get_user_by_username, create_user, get_tasks, create_task, update_task, delete_task
-from .auth import authenticate_user, create_access_token, get_current_user
+from .database import async_engine
+from .api import auth, tasks
+from .config import settings
+from .utils.redis_client import close_redis
+from .utils.hashing import HashPoolSaturated, hash_pool
+from .utils.notifications import notification_worker
+from .utils.reminders import reminder_scheduler
+from .replicas import ConsistencyMiddleware, CONSISTENCY_HEADER, replica_router
+from .utils.load_shedding import LoadSheddingMiddleware, load_shedder, loop_lag_monitor
+from .utils.rate_limit import RateLimitMiddleware
+from .utils.metrics import MetricsMiddleware, METRICS_CONTENT_TYPE, register_snapshot, render_metrics
+from .websockets import manager
 import logging
 
 logging.basicConfig(level=logging.INFO)
@@ -17,59 +21,43 @@ logger = logging.getLogger(__name__)
 
 app = FastAPI()
 
+# Middleware added later wraps what was added before it.
+if replica_router.replicas:
+    app.add_middleware(ConsistencyMiddleware)
+# Overload and rate-limit rejections come before any other work, but inside CORS so browsers can read them.
+if settings.RATE_LIMIT_ENABLED:
+    app.add_middleware(RateLimitMiddleware)
+if settings.LOAD_SHED_ENABLED:
+    app.add_middleware(LoadSheddingMiddleware)
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["*"],
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor", "ETag", "Retry-After", CONSISTENCY_HEADER],
 )
+# Outermost, so latency includes every other middleware.
+app.add_middleware(MetricsMiddleware)
 
-oauth2_scheme = OAuth2PasswordBearer(tokenUrl="token")
+register_snapshot("websocket", lambda: {"connections": sum(len(c) for c in manager.connections.values())}, "Open WebSocket connections on this process")
+register_snapshot("hash_pool", hash_pool.snapshot, "Password hashing pool", counters=("rejected", "completed", "latency_seconds_total"))
+register_snapshot("task_list_cache", tasks.task_list_cache.snapshot, "Task list read-through cache", counters=("hits", "misses", "coalesced"))
+register_snapshot("notification_worker", notification_worker.stats, "Notification worker", counters=("sent", "failed", "retried", "dead_lettered", "flushes"))
+register_snapshot("reminder_scheduler", reminder_scheduler.snapshot, "Reminder scheduler", counters=("fired", "claimed"))
+register_snapshot("replicas", replica_router.snapshot, "Read replica routing", counters=("primary_reads", "replica_reads"))
+register_snapshot("load", load_shedder.snapshot, "Load shedding signals")
 
-Base.metadata.create_all(bind=engine)
+app.include_router(auth.router)
+app.include_router(tasks.router)
 
-class Token(BaseModel):
-    access_token: str
-    token_type: str
+@app.exception_handler(HashPoolSaturated)
+async def hash_pool_saturated_handler(request: Request, exc: HashPoolSaturated):
+    return JSONResponse(status_code=503, content={"detail": "Authentication is temporarily overloaded"}, headers={"Retry-After": "1"})
 
-@app.post("/token", response_model=Token)
-async def login_for_access_token(form_data: OAuth2PasswordRequestForm = Depends(), db: Session = Depends(SessionLocal)):
-    user = authenticate_user(db, form_data.username, form_data.password)
-    if not user:
-        raise HTTPException(status_code=400, detail="Incorrect username or password")
-    access_token = create_access_token(data={"sub": user.username})
-    return {"access_token": access_token, "token_type": "bearer"}
-
-@app.post("/users/", response_model=UserCreate)
-async def create_new_user(user: UserCreate, db: Session = Depends(SessionLocal)):
-    db_user = get_user_by_username(db, username=user.username)
-    if db_user:
-        raise HTTPException(status_code=400, detail="Username already registered")
-    return create_user(db=db, user=user)
-
-@app.get("/tasks/", response_model=List[TaskCreate])
-async def read_tasks(skip: int = 0, limit: int = 10, db: Session = Depends(SessionLocal), current_user: User = Depends(get_current_user)):
-    tasks = get_tasks(db, skip=skip, limit=limit)
-    return tasks
-
-@app.post("/tasks/", response_model=TaskCreate)
-async def create_new_task(task: TaskCreate, db: Session = Depends(SessionLocal), current_user: User = Depends(get_current_user)):
-    return create_task(db=db, task=task)
-
-@app.put("/tasks/{task_id}", response_model=TaskUpdate)
-async def update_existing_task(task_id: int, task: TaskUpdate, db: Session = Depends(SessionLocal), current_user: User = Depends(get_current_user)):
-    db_task = update_task(db=db, task_id=task_id, task=task)
-    if db_task is None:
-        raise HTTPException(status_code=404, detail="Task not found")
-    return db_task
-
-@app.delete("/tasks/{task_id}")
-async def delete_existing_task(task_id: int, db: Session = Depends(SessionLocal), current_user: User = Depends(get_current_user)):
-    db_task = delete_task(db=db, task_id=task_id)
-    if db_task is None:
-        raise HTTPException(status_code=404, detail="Task not found")
-    return {"detail": "Task deleted successfully"}
+@app.get("/metrics", include_in_schema=False)
+async def metrics():
+    return Response(render_metrics(), media_type=METRICS_CONTENT_TYPE)
 
 @app.websocket("/ws")
 async def websocket_endpoint(websocket: WebSocket):
@@ -83,15 +71,25 @@ async def websocket_endpoint(websocket: WebSocket):
 
 @app.on_event("startup")
 async def startup_event():
+    await loop_lag_monitor.start()
+    await manager.start()
+    await replica_router.start()
+    if settings.NOTIFICATION_WORKER_IN_API:
+        await notification_worker.start()
+    if settings.REMINDER_SCHEDULER_IN_API:
+        await reminder_scheduler.start()
     logger.info("Application startup")
 
 @app.on_event("shutdown")
 async def shutdown_event():
+    if settings.REMINDER_SCHEDULER_IN_API:
+        await reminder_scheduler.stop()
+    if settings.NOTIFICATION_WORKER_IN_API:
+        await notification_worker.stop()
+    await manager.stop()
+    await replica_router.stop()
+    await loop_lag_monitor.stop()
+    await async_engine.dispose()
+    await close_redis()
+    hash_pool.shutdown()
     logger.info("Application shutdown")
-
-def get_db():
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
\ No newline at end of file
@@ -0,0 +1,5 @@
+from .user import User
+from .task import Task
+from .task_change import TaskChange, TaskChangeCursor
+from .task_stats import TaskStats
+from .notification import Notification
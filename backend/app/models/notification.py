@@ -0,0 +1,23 @@
+from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, Index
+from datetime import datetime
+from ..database import Base
+
+class Notification(Base):
+    __tablename__ = 'notifications'
+    __table_args__ = (
+        Index('ix_notifications_user_id_created_at', 'user_id', 'created_at'),
+    )
+
+    id = Column(Integer, primary_key=True)
+    user_id = Column(Integer, ForeignKey('users.id'), nullable=False)
+    type = Column(String, nullable=False)
+    message = Column(String, nullable=False)
+    # pending -> sent, or pending -> dead once the worker gives up; attempts counts failed sends.
+    status = Column(String, nullable=False, default='pending', index=True)
+    attempts = Column(Integer, nullable=False, default=0)
+    error = Column(String, nullable=True)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    sent_at = Column(DateTime, nullable=True)
+
+    def __repr__(self):
+        return f"<Notification(id={self.id}, user_id={self.user_id}, status={self.status})>"
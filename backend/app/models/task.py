@@ -1,10 +1,19 @@
-from sqlalchemy import Column, Integer, String, Boolean, DateTime, ForeignKey
+from sqlalchemy import Column, Integer, String, Boolean, DateTime, ForeignKey, Index, DDL, and_, event
 from sqlalchemy.orm import relationship
 from datetime import datetime
-from .database import Base
+from ..database import Base
 
 class Task(Base):
     __tablename__ = 'tasks'
+    # Every list filter/sort combination leads with user_id; the trailing id makes keyset paging
+    # on (sort column, id) an index range scan.
+    __table_args__ = (
+        Index('ix_tasks_user_id_id', 'user_id', 'id'),
+        Index('ix_tasks_user_id_created_at', 'user_id', 'created_at', 'id'),
+        Index('ix_tasks_user_id_updated_at', 'user_id', 'updated_at', 'id'),
+        Index('ix_tasks_user_id_completed_created_at', 'user_id', 'completed', 'created_at', 'id'),
+        Index('ix_tasks_user_id_completed_updated_at', 'user_id', 'completed', 'updated_at', 'id'),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     title = Column(String, index=True, nullable=False)
@@ -12,9 +21,51 @@ class Task(Base):
     completed = Column(Boolean, default=False)
     created_at = Column(DateTime, default=datetime.utcnow)
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    due_at = Column(DateTime, nullable=True)
+    # Set once the reminder for the current due_at has been handed to the notification worker.
+    reminded_at = Column(DateTime, nullable=True)
     user_id = Column(Integer, ForeignKey('users.id'), nullable=False)
 
     user = relationship("User", back_populates="tasks")
 
     def __repr__(self):
-        return f"<Task(title={self.title}, completed={self.completed})>"
\ No newline at end of file
+        return f"<Task(title={self.title}, completed={self.completed})>"
+
+# Only open tasks still owed a reminder are indexed, so loading the next reminder window is a short
+# range scan no matter how many finished or undated tasks the table holds.
+REMINDER_PENDING = and_(Task.reminded_at.is_(None), Task.completed.is_(False))
+Index('ix_tasks_due_at_pending', Task.due_at, postgresql_where=REMINDER_PENDING, sqlite_where=REMINDER_PENDING)
+
+# Full-text search is maintained by the database itself, so every write path (ORM, batch UPDATEs,
+# COPY imports) keeps it in sync: a generated tsvector column with a GIN index on Postgres, and an
+# external-content FTS5 table kept current by triggers on SQLite.
+SEARCH_DDL = {
+    "postgresql": [
+        """ALTER TABLE tasks ADD COLUMN search_vector tsvector GENERATED ALWAYS AS (
+            setweight(to_tsvector('english', coalesce(title, '')), 'A') ||
+            setweight(to_tsvector('english', coalesce(description, '')), 'B')
+        ) STORED""",
+        "CREATE INDEX ix_tasks_search_vector ON tasks USING GIN (search_vector)",
+    ],
+    "sqlite": [
+        "CREATE VIRTUAL TABLE tasks_fts USING fts5(title, description, content='tasks', content_rowid='id')",
+        """CREATE TRIGGER tasks_fts_ai AFTER INSERT ON tasks BEGIN
+            INSERT INTO tasks_fts(rowid, title, description) VALUES (new.id, new.title, new.description);
+        END""",
+        """CREATE TRIGGER tasks_fts_ad AFTER DELETE ON tasks BEGIN
+            INSERT INTO tasks_fts(tasks_fts, rowid, title, description) VALUES ('delete', old.id, old.title, old.description);
+        END""",
+        """CREATE TRIGGER tasks_fts_au AFTER UPDATE OF title, description ON tasks BEGIN
+            INSERT INTO tasks_fts(tasks_fts, rowid, title, description) VALUES ('delete', old.id, old.title, old.description);
+            INSERT INTO tasks_fts(rowid, title, description) VALUES (new.id, new.title, new.description);
+        END""",
+    ],
+}
+
+# Created by SEARCH_DDL rather than mapped, so schema comparisons (alembic autogenerate) leave them alone.
+def is_search_object(name: str) -> bool:
+    return name.startswith("tasks_fts") or name in ("search_vector", "ix_tasks_search_vector")
+
+for dialect, statements in SEARCH_DDL.items():
+    for statement in statements:
+        event.listen(Task.__table__, "after_create", DDL(statement).execute_if(dialect=dialect))
@@ -0,0 +1,28 @@
+from sqlalchemy import Column, Integer, BigInteger, String, DateTime, ForeignKey, JSON, UniqueConstraint
+from datetime import datetime
+from ..database import Base
+
+class TaskChange(Base):
+    __tablename__ = 'task_changes'
+    __table_args__ = (
+        UniqueConstraint('user_id', 'seq', name='uq_task_changes_user_id_seq'),
+    )
+
+    id = Column(Integer, primary_key=True)
+    user_id = Column(Integer, ForeignKey('users.id'), nullable=False)
+    seq = Column(BigInteger, nullable=False)
+    op = Column(String, nullable=False)
+    task_id = Column(Integer, nullable=False)
+    task = Column(JSON, nullable=True)
+    created_at = Column(DateTime, default=datetime.utcnow, index=True)
+
+    def __repr__(self):
+        return f"<TaskChange(user_id={self.user_id}, seq={self.seq}, op={self.op})>"
+
+# One row per user: the last sequence number handed out, and the highest one removed by compaction.
+class TaskChangeCursor(Base):
+    __tablename__ = 'task_change_cursors'
+
+    user_id = Column(Integer, ForeignKey('users.id'), primary_key=True)
+    last_seq = Column(BigInteger, nullable=False, default=0)
+    compacted_seq = Column(BigInteger, nullable=False, default=0)
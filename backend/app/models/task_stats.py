@@ -0,0 +1,14 @@
+from sqlalchemy import Column, Integer, ForeignKey
+from ..database import Base
+
+# Per-user task counters, maintained in the same transaction as every task write.
+class TaskStats(Base):
+    __tablename__ = 'task_stats'
+
+    user_id = Column(Integer, ForeignKey('users.id'), primary_key=True)
+    total = Column(Integer, nullable=False, default=0)
+    completed = Column(Integer, nullable=False, default=0)
+
+    @property
+    def open(self) -> int:
+        return self.total - self.completed
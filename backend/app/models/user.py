@@ -1,10 +1,8 @@
-from sqlalchemy import Column, Integer, String, Boolean, DateTime, ForeignKey
+from sqlalchemy import Column, Integer, String, Boolean, DateTime
 from sqlalchemy.orm import relationship
-from passlib.context import CryptContext
 from datetime import datetime
-from .database import Base
-
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+from ..database import Base
+from ..utils.hashing import verify_password, get_password_hash
 
 class User(Base):
     __tablename__ = "users"
@@ -17,10 +15,10 @@ class User(Base):
     created_at = Column(DateTime, default=datetime.utcnow)
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
 
-    tasks = relationship("Task", back_populates="owner")
+    tasks = relationship("Task", back_populates="user")
 
-    def verify_password(self, password: str) -> bool:
-        return pwd_context.verify(password, self.hashed_password)
+    async def verify_password(self, password: str) -> bool:
+        return await verify_password(password, self.hashed_password)
 
-    def set_password(self, password: str) -> None:
-        self.hashed_password = pwd_context.hash(password)
\ No newline at end of file
+    async def set_password(self, password: str) -> None:
+        self.hashed_password = await get_password_hash(password)
\ No newline at end of file
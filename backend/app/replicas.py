@@ -0,0 +1,206 @@
+import asyncio
+import itertools
+import logging
+import math
+import time
+from contextvars import ContextVar
+from http.cookies import SimpleCookie
+from typing import List, Optional, Tuple
+from sqlalchemy import event, text
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+from sqlalchemy.orm import Session, sessionmaker
+from starlette.datastructures import MutableHeaders
+from .config import settings
+from .database import AsyncSessionLocal, async_engine, engine_options, keep_connect_lock_async, to_async_url
+from .utils.metrics import instrument_engine
+
+logger = logging.getLogger(__name__)
+
+# A client that has just written carries a token for the primary's position at that write, as a
+# cookie and/or header, and its reads go to the primary until a replica has replayed past it.
+# On Postgres the token is a WAL LSN; elsewhere it is the write time, and a replica counts as
+# caught up REPLICA_MAX_LAG_SECONDS later.
+CONSISTENCY_COOKIE = "read_after"
+CONSISTENCY_HEADER = "X-Read-After"
+
+Token = Tuple[str, float]
+
+def parse_lsn(value: str) -> int:
+    high, _, low = value.partition("/")
+    return (int(high, 16) << 32) + int(low, 16)
+
+def parse_token(raw: Optional[str]) -> Optional[Token]:
+    kind, _, value = (raw or "").partition(":")
+    try:
+        if kind == "lsn":
+            return kind, parse_lsn(value)
+        if kind == "ts":
+            return kind, float(value)
+    except ValueError:
+        pass
+    return None
+
+class WriteState:
+    def __init__(self):
+        self.committed = False
+
+read_token: ContextVar[Optional[Token]] = ContextVar("read_token", default=None)
+write_state: ContextVar[Optional[WriteState]] = ContextVar("write_state", default=None)
+
+@event.listens_for(Session, "after_commit")
+def mark_committed(session):
+    state = write_state.get()
+    if state is not None:
+        state.committed = True
+
+class Replica:
+    def __init__(self, name: str, url: str):
+        self.name = name
+        self.engine = create_async_engine(to_async_url(url), **engine_options(url))
+        keep_connect_lock_async(self.engine.sync_engine)
+        instrument_engine(self.engine.sync_engine, name)
+        self.sessionmaker = sessionmaker(self.engine, class_=AsyncSession, autoflush=False, expire_on_commit=False)
+        # Unhealthy until the first check passes.
+        self.healthy = False
+        self.replay_lsn: float = 0
+        self.failures = 0
+
+class ReplicaRouter:
+    def __init__(self, replicas: List[Replica], health_interval: float, max_lag: float):
+        self.replicas = replicas
+        self.health_interval = health_interval
+        self.max_lag = max_lag
+        self.counter = itertools.count()
+        self.checker: Optional[asyncio.Task] = None
+        self.primary_reads = 0
+        self.replica_reads = 0
+
+    def caught_up(self, replica: Replica, token: Optional[Token]) -> bool:
+        if token is None:
+            return True
+        kind, position = token
+        if kind == "lsn":
+            return replica.replay_lsn >= position
+        return time.time() - position >= self.max_lag
+
+    def choose(self, token: Optional[Token] = None) -> sessionmaker:
+        # Round-robin over healthy replicas that have caught up with the client's last write.
+        candidates = [replica for replica in self.replicas if replica.healthy and self.caught_up(replica, token)]
+        if not candidates:
+            self.primary_reads += 1
+            return AsyncSessionLocal
+        self.replica_reads += 1
+        return candidates[next(self.counter) % len(candidates)].sessionmaker
+
+    async def check(self, replica: Replica) -> None:
+        try:
+            async with replica.engine.connect() as connection:
+                if connection.dialect.name == "postgresql":
+                    lsn = (await asyncio.wait_for(
+                        connection.execute(text("SELECT pg_last_wal_replay_lsn()::text")), self.health_interval,
+                    )).scalar()
+                    # NULL means the server is not in recovery, i.e. it is not behind anything.
+                    replica.replay_lsn = parse_lsn(lsn) if lsn else math.inf
+                else:
+                    await asyncio.wait_for(connection.execute(text("SELECT 1")), self.health_interval)
+        except Exception as exc:
+            replica.failures += 1
+            if replica.healthy:
+                logger.warning("Replica %s failed its health check, routing reads elsewhere: %r", replica.name, exc)
+            replica.healthy = False
+            return
+        if not replica.healthy:
+            logger.info("Replica %s is healthy", replica.name)
+        replica.healthy = True
+
+    async def check_all(self) -> None:
+        await asyncio.gather(*(self.check(replica) for replica in self.replicas))
+
+    async def run(self) -> None:
+        while True:
+            await asyncio.sleep(self.health_interval)
+            await self.check_all()
+
+    async def start(self) -> None:
+        if self.replicas:
+            await self.check_all()
+            self.checker = asyncio.create_task(self.run())
+
+    async def stop(self) -> None:
+        if self.checker is not None:
+            self.checker.cancel()
+            try:
+                await self.checker
+            except asyncio.CancelledError:
+                pass
+            self.checker = None
+        for replica in self.replicas:
+            await replica.engine.dispose()
+
+    async def write_token(self) -> str:
+        if async_engine.dialect.name == "postgresql":
+            async with async_engine.connect() as connection:
+                lsn = (await connection.execute(text("SELECT pg_current_wal_lsn()::text"))).scalar()
+            return f"lsn:{lsn}"
+        return f"ts:{time.time():.6f}"
+
+    def snapshot(self) -> dict:
+        return {
+            "configured": len(self.replicas),
+            "healthy": sum(1 for replica in self.replicas if replica.healthy),
+            "primary_reads": self.primary_reads,
+            "replica_reads": self.replica_reads,
+        }
+
+replica_router = ReplicaRouter(
+    [Replica(f"replica{i}", url.strip()) for i, url in enumerate(settings.DATABASE_REPLICA_URLS.split(",")) if url.strip()],
+    health_interval=settings.REPLICA_HEALTH_INTERVAL_SECONDS,
+    max_lag=settings.REPLICA_MAX_LAG_SECONDS,
+)
+
+async def get_read_db():
+    # For read-only GET handlers; anything that may write must keep using get_db.
+    session_factory = replica_router.choose(read_token.get())
+    async with session_factory() as db:
+        db.info["replica"] = session_factory is not AsyncSessionLocal
+        yield db
+
+def read_from_replica(db: AsyncSession) -> bool:
+    return db.info.get("replica", False)
+
+def request_token(scope: dict) -> Optional[Token]:
+    token = None
+    for name, value in scope["headers"]:
+        if name == b"x-read-after":
+            token = parse_token(value.decode("latin-1"))
+        elif name == b"cookie" and token is None:
+            morsel = SimpleCookie(value.decode("latin-1")).get(CONSISTENCY_COOKIE)
+            token = parse_token(morsel.value) if morsel else None
+    return token
+
+class ConsistencyMiddleware:
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        state = WriteState()
+        read_token.set(request_token(scope))
+        write_state.set(state)
+
+        async def send_with_token(message):
+            # The handler has committed by the time the response starts, so the primary's current
+            # position covers the write.
+            if message["type"] == "http.response.start" and state.committed:
+                token = await replica_router.write_token()
+                headers = MutableHeaders(scope=message)
+                headers.append(CONSISTENCY_HEADER, token)
+                headers.append(
+                    "set-cookie",
+                    f"{CONSISTENCY_COOKIE}={token}; Max-Age={settings.READ_YOUR_WRITES_TTL_SECONDS}; Path=/; HttpOnly; SameSite=Lax",
+                )
+            await send(message)
+
+        await self.app(scope, receive, send_with_token)
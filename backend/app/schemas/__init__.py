@@ -0,0 +1,6 @@
+from .user import UserBase, UserCreate, UserUpdate, User, UserInDB, Token
+from .task import (
+    TaskBase, TaskCreate, TaskUpdate, Task, TaskInDB, TaskResponse,
+    TaskBatchCreate, TaskBatchUpdate, TaskBatchUpdateItem, TaskBatchDelete, MAX_BATCH_SIZE,
+    TaskFilter, TASK_SORTS, TaskStatsResponse,
+)
@@ -1,11 +1,21 @@
-from pydantic import BaseModel, Field, validator
+from pydantic import BaseModel, Field, conlist, validator
 from typing import Optional
-from datetime import datetime
+from datetime import datetime, timezone
+
+MAX_BATCH_SIZE = 100
+TASK_SORTS = ("id", "-id", "created_at", "-created_at", "updated_at", "-updated_at")
+
+def to_naive_utc(value: Optional[datetime]) -> Optional[datetime]:
+    # Timestamps are stored as naive UTC; clients may send any offset.
+    if value is not None and value.tzinfo is not None:
+        return value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value
 
 class TaskBase(BaseModel):
     title: str = Field(..., min_length=1, max_length=255, description="Title of the task")
     description: Optional[str] = Field(None, max_length=1000, description="Detailed description of the task")
     completed: bool = Field(default=False, description="Completion status of the task")
+    due_at: Optional[datetime] = Field(None, description="When the task is due; a reminder is sent at this time")
 
     @validator('title')
     def title_must_not_be_empty(cls, v):
@@ -13,6 +23,8 @@ class TaskBase(BaseModel):
             raise ValueError('Title must not be empty')
         return v
 
+    _due_at_utc = validator('due_at', allow_reuse=True)(to_naive_utc)
+
 class TaskCreate(TaskBase):
     pass
 
@@ -20,6 +32,7 @@ class TaskUpdate(BaseModel):
     title: Optional[str] = Field(None, min_length=1, max_length=255, description="Title of the task")
     description: Optional[str] = Field(None, max_length=1000, description="Detailed description of the task")
     completed: Optional[bool] = Field(None, description="Completion status of the task")
+    due_at: Optional[datetime] = Field(None, description="When the task is due; null clears it")
 
     @validator('title')
     def title_must_not_be_empty(cls, v):
@@ -27,10 +40,13 @@ class TaskUpdate(BaseModel):
             raise ValueError('Title must not be empty')
         return v
 
+    _due_at_utc = validator('due_at', allow_reuse=True)(to_naive_utc)
+
 class TaskInDBBase(TaskBase):
     id: int = Field(..., description="Unique identifier for the task")
     created_at: datetime = Field(..., description="Timestamp when the task was created")
     updated_at: datetime = Field(..., description="Timestamp when the task was last updated")
+    reminded_at: Optional[datetime] = Field(None, description="When the reminder for the current due date was sent")
 
     class Config:
         orm_mode = True
@@ -39,4 +55,47 @@ class Task(TaskInDBBase):
     pass
 
 class TaskInDB(TaskInDBBase):
-    pass
\ No newline at end of file
+    pass
+
+class TaskResponse(TaskInDBBase):
+    pass
+
+
+class TaskBatchUpdateItem(TaskUpdate):
+    id: int = Field(..., description="Identifier of the task to update")
+
+class TaskBatchCreate(BaseModel):
+    tasks: conlist(TaskCreate, min_items=1, max_items=MAX_BATCH_SIZE)
+
+class TaskBatchUpdate(BaseModel):
+    tasks: conlist(TaskBatchUpdateItem, min_items=1, max_items=MAX_BATCH_SIZE)
+
+class TaskBatchDelete(BaseModel):
+    ids: conlist(int, min_items=1, max_items=MAX_BATCH_SIZE)
+
+class TaskFilter(BaseModel):
+    completed: Optional[bool] = Field(None, description="Only tasks with this completion status")
+    created_after: Optional[datetime] = Field(None, description="Created at or after this time")
+    created_before: Optional[datetime] = Field(None, description="Created before this time")
+    updated_after: Optional[datetime] = Field(None, description="Updated at or after this time")
+    updated_before: Optional[datetime] = Field(None, description="Updated before this time")
+    sort: str = Field("id", description="Sort key; prefix with - for descending")
+
+    _timestamps_utc = validator('created_after', 'created_before', 'updated_after', 'updated_before', allow_reuse=True)(to_naive_utc)
+
+    @validator('sort')
+    def sort_must_be_supported(cls, v):
+        if v not in TASK_SORTS:
+            raise ValueError(f"sort must be one of {', '.join(TASK_SORTS)}")
+        return v
+
+    def cache_key(self) -> str:
+        return "&".join(f"{name}={value}" for name, value in sorted(self.dict().items()))
+
+class TaskStatsResponse(BaseModel):
+    total: int = Field(..., description="Number of tasks")
+    completed: int = Field(..., description="Number of completed tasks")
+    open: int = Field(..., description="Number of tasks not yet completed")
+
+    class Config:
+        orm_mode = True
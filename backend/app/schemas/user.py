@@ -41,4 +41,8 @@ class User(UserInDBBase):
     pass
 
 class UserInDB(UserInDBBase):
-    hashed_password: str
\ No newline at end of file
+    hashed_password: str
+
+class Token(BaseModel):
+    access_token: str
+    token_type: str
@@ -0,0 +1,136 @@
+import glob
+import logging
+import math
+import os
+import tempfile
+from typing import Optional
+from gunicorn.app.base import BaseApplication
+from .config import settings
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Production entry point: `python -m app.serve` runs gunicorn with one uvicorn worker per core.
+#
+# Each worker is a separate process with its own event loop, so everything held in memory is per
+# worker: the task list and auth caches, WebSocket connections (manager), the in-memory broker and
+# notification queue, the reminder scheduler's heap, the in-memory rate-limit buckets (so a client
+# may get RATE_LIMIT_BURST per worker), the load shedder's loop-lag and pool-wait readings (each
+# worker sheds its own load, which is intended) and the DB connection pools (pool size applies per
+# worker). Cross-worker consistency therefore needs the Redis backends (BROKER_BACKEND=redis,
+# NOTIFICATION_BACKEND=redis, RATE_LIMIT_BACKEND=redis), exactly as it does across pods.
+#
+# Signals to the master: HUP starts fresh workers and retires the old ones gracefully, but with
+# SERVER_PRELOAD they fork from the code the master already loaded; to deploy new code without
+# downtime send USR2 (a new master re-executes and loads it), then WINCH and TERM to the old master.
+# On Kubernetes the rolling update does this job.
+
+def cgroup_cpu_limit(root: str = "/sys/fs/cgroup") -> Optional[float]:
+    # CPUs granted by the container's CFS quota, or None when unlimited or not in a cgroup.
+    try:
+        with open(os.path.join(root, "cpu.max")) as f:
+            quota, period = f.read().split()[:2]
+        if quota == "max":
+            return None
+        return int(quota) / int(period)
+    except (OSError, ValueError):
+        pass
+    try:
+        with open(os.path.join(root, "cpu", "cpu.cfs_quota_us")) as f:
+            quota = int(f.read())
+        with open(os.path.join(root, "cpu", "cpu.cfs_period_us")) as f:
+            period = int(f.read())
+    except (OSError, ValueError):
+        return None
+    return quota / period if quota > 0 else None
+
+def available_cpus(cgroup_root: str = "/sys/fs/cgroup") -> int:
+    cpus = len(os.sched_getaffinity(0)) if hasattr(os, "sched_getaffinity") else os.cpu_count() or 1
+    limit = cgroup_cpu_limit(cgroup_root)
+    if limit is not None:
+        # A 1.5 CPU quota can keep two workers busy for part of every period.
+        cpus = min(cpus, math.ceil(limit))
+    return max(cpus, 1)
+
+def worker_count() -> int:
+    # Workers are async, so one per core saturates the CPU; more would only add pools and memory.
+    return settings.SERVER_WORKERS or available_cpus()
+
+def post_fork(server, worker):
+    # Never let a worker reuse a connection inherited from the master.
+    from .database import async_engine
+    from .replicas import replica_router
+    async_engine.sync_engine.dispose(close=False)
+    for replica in replica_router.replicas:
+        replica.engine.sync_engine.dispose(close=False)
+
+def child_exit(server, worker):
+    if "PROMETHEUS_MULTIPROC_DIR" in os.environ:
+        from prometheus_client import multiprocess
+        multiprocess.mark_process_dead(worker.pid)
+
+def gunicorn_options(workers: int) -> dict:
+    return {
+        "bind": settings.SERVER_BIND,
+        "workers": workers,
+        "worker_class": "uvicorn.workers.UvicornWorker",
+        # Import the app once in the master; workers fork from it and share its pages copy-on-write.
+        "preload_app": settings.SERVER_PRELOAD,
+        "max_requests": settings.SERVER_MAX_REQUESTS,
+        "max_requests_jitter": settings.SERVER_MAX_REQUESTS_JITTER,
+        "timeout": settings.SERVER_TIMEOUT_SECONDS,
+        "graceful_timeout": settings.SERVER_GRACEFUL_TIMEOUT_SECONDS,
+        "keepalive": settings.SERVER_KEEPALIVE_SECONDS,
+        "accesslog": None,
+        # Worker heartbeats are file writes; on a container's overlay filesystem they can stall a worker.
+        "worker_tmp_dir": "/dev/shm" if os.path.isdir("/dev/shm") else None,
+        "post_fork": post_fork,
+        "child_exit": child_exit,
+    }
+
+class Server(BaseApplication):
+    def __init__(self, options: dict):
+        self.options = options
+        super().__init__()
+
+    def load_config(self):
+        for key, value in self.options.items():
+            self.cfg.set(key, value)
+
+    def load(self):
+        from .main import app
+        return app
+
+def prepare_metrics_dir(workers: int) -> None:
+    # Counters and histograms are shared between workers through files; this must be set before
+    # prometheus_client is imported, i.e. before the app is loaded.
+    if workers > 1 and "PROMETHEUS_MULTIPROC_DIR" not in os.environ:
+        os.environ["PROMETHEUS_MULTIPROC_DIR"] = tempfile.mkdtemp(prefix="prometheus-")
+    directory = os.environ.get("PROMETHEUS_MULTIPROC_DIR")
+    if not directory:
+        return
+    os.makedirs(directory, exist_ok=True)
+    # Files left by a previous master would be summed into this one's counters. After USR2 the old
+    # master's workers are still writing theirs (and still being scraped), and gunicorn marks the
+    # re-executed master with GUNICORN_FD, so only a cold start clears the directory.
+    if "GUNICORN_FD" in os.environ:
+        return
+    # The directory is operator-supplied; only prometheus_client's own files are removed.
+    for path in glob.glob(os.path.join(directory, "*.db")):
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+def main():
+    workers = worker_count()
+    if workers > 1:
+        for name in ("BROKER_BACKEND", "NOTIFICATION_BACKEND", "RATE_LIMIT_BACKEND"):
+            if getattr(settings, name) == "memory":
+                logger.warning("%s=memory with %d workers: each worker only sees its own events; use redis", name, workers)
+    prepare_metrics_dir(workers)
+    logger.info("Serving on %s with %d workers", settings.SERVER_BIND, workers)
+    Server(gunicorn_options(workers)).run()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,86 @@
+import asyncio
+import json
+import logging
+from typing import Awaitable, Callable, Optional
+from redis.exceptions import RedisError
+from ..config import settings
+from .redis_client import get_redis
+
+logger = logging.getLogger(__name__)
+
+Handler = Callable[[dict], Awaitable[None]]
+
+class Broker:
+    async def start(self, handler: Handler) -> None:
+        raise NotImplementedError
+
+    async def publish(self, message: dict) -> None:
+        raise NotImplementedError
+
+    async def stop(self) -> None:
+        pass
+
+# Single-process broker for tests and single-node runs: publishing delivers straight to the local handler.
+class InMemoryBroker(Broker):
+    def __init__(self):
+        self.handler: Optional[Handler] = None
+
+    async def start(self, handler: Handler) -> None:
+        self.handler = handler
+
+    async def publish(self, message: dict) -> None:
+        if self.handler is not None:
+            await self.handler(message)
+
+    async def stop(self) -> None:
+        self.handler = None
+
+# Every replica subscribes to one channel; a write publishes once and each replica delivers to its own sockets.
+class RedisBroker(Broker):
+    def __init__(self, channel: str, retry_delay: float = 1.0):
+        self.channel = channel
+        self.retry_delay = retry_delay
+        self.listener: Optional[asyncio.Task] = None
+
+    async def start(self, handler: Handler) -> None:
+        self.listener = asyncio.create_task(self.listen(handler))
+
+    async def listen(self, handler: Handler) -> None:
+        # Runs until stop(): whatever ends a subscription, a fresh one replaces it, or this
+        # replica would silently stop fanning events out to its sockets.
+        while True:
+            pubsub = get_redis().pubsub(ignore_subscribe_messages=True)
+            try:
+                await pubsub.subscribe(self.channel)
+                async for message in pubsub.listen():
+                    await self.dispatch(handler, message)
+            except RedisError:
+                logger.warning("Lost broker subscription, resubscribing", exc_info=True)
+            except Exception:
+                logger.exception("Broker subscription failed, resubscribing")
+            finally:
+                await pubsub.close()
+            await asyncio.sleep(self.retry_delay)
+
+    async def dispatch(self, handler: Handler, message: dict) -> None:
+        try:
+            await handler(json.loads(message["data"]))
+        except Exception:
+            logger.exception("Dropping broker message that could not be delivered")
+
+    async def publish(self, message: dict) -> None:
+        await get_redis().publish(self.channel, json.dumps(message))
+
+    async def stop(self) -> None:
+        if self.listener is not None:
+            self.listener.cancel()
+            try:
+                await self.listener
+            except asyncio.CancelledError:
+                pass
+            self.listener = None
+
+def create_broker() -> Broker:
+    if settings.BROKER_BACKEND == "redis":
+        return RedisBroker(settings.BROKER_CHANNEL)
+    return InMemoryBroker()
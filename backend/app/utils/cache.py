@@ -0,0 +1,160 @@
+import asyncio
+import itertools
+import json
+import logging
+import time
+import uuid
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Hashable, Optional
+from redis.exceptions import RedisError
+from .redis_client import get_redis
+
+logger = logging.getLogger(__name__)
+
+
+# In-process LRU cache whose entries also expire after ``ttl`` seconds.
+class TTLCache:
+    def __init__(self, maxsize: int, ttl: float):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.entries: OrderedDict = OrderedDict()
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        entry = self.entries.get(key)
+        if entry is None:
+            return None
+        value, expires_at = entry
+        if expires_at < time.monotonic():
+            del self.entries[key]
+            return None
+        self.entries.move_to_end(key)
+        return value
+
+    def set(self, key: Hashable, value: Any) -> None:
+        self.entries[key] = (value, time.monotonic() + self.ttl)
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.maxsize:
+            self.entries.popitem(last=False)
+
+    def delete(self, key: Hashable) -> None:
+        self.entries.pop(key, None)
+
+    def clear(self) -> None:
+        self.entries.clear()
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+
+# Only stores a value if the owner's generation is unchanged since the read, so a load that raced
+# with an invalidation cannot repopulate the shared tier with stale data.
+STORE_IF_CURRENT = """
+local current = redis.call('HGET', KEYS[1], '_gen') or ''
+if current ~= ARGV[1] then
+    return 0
+end
+redis.call('HSET', KEYS[1], ARGV[2], ARGV[3])
+redis.call('EXPIRE', KEYS[1], ARGV[4])
+return 1
+"""
+
+
+# Read-through cache partitioned by owner (e.g. user id), with an in-process LRU tier, an optional
+# Redis tier shared by all replicas, and single-flight coalescing of concurrent misses.
+class ReadThroughCache:
+    def __init__(self, name: str, maxsize: int, ttl: int, use_redis: bool = False):
+        self.name = name
+        self.ttl = ttl
+        self.use_redis = use_redis
+        self.local = TTLCache(maxsize=maxsize, ttl=ttl)
+        # Bounded like the entries themselves. Generations come from one counter, so an owner whose
+        # generation was evicted gets a value no earlier entry was stored under.
+        self.generations = TTLCache(maxsize=maxsize, ttl=ttl)
+        self.generation_counter = itertools.count()
+        self.inflight: Dict[tuple, asyncio.Future] = {}
+        self.store_script = None
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+
+    def redis_key(self, owner: Hashable) -> str:
+        return f"{self.name}:{owner}"
+
+    def generation(self, owner: Hashable) -> int:
+        generation = self.generations.get(owner)
+        if generation is None:
+            generation = next(self.generation_counter)
+            self.generations.set(owner, generation)
+        return generation
+
+    async def get_or_load(self, owner: Hashable, key: str, loader: Callable[[], Awaitable[Any]], store: bool = True) -> Any:
+        # With store=False a miss is loaded (and shared with concurrent identical misses) but not cached.
+        local_key = (owner, self.generation(owner), key)
+        value = self.local.get(local_key)
+        if value is not None:
+            self.hits += 1
+            return value
+        pending = self.inflight.get(local_key)
+        if pending is not None:
+            self.coalesced += 1
+            return await asyncio.shield(pending)
+        future = asyncio.get_running_loop().create_future()
+        self.inflight[local_key] = future
+        try:
+            value = await self.load(owner, key, loader, store)
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except Exception as exc:
+            future.set_exception(exc)
+            future.exception()
+            raise
+        finally:
+            self.inflight.pop(local_key, None)
+        future.set_result(value)
+        if store and self.generation(owner) == local_key[1]:
+            self.local.set(local_key, value)
+        return value
+
+    async def load(self, owner: Hashable, key: str, loader: Callable[[], Awaitable[Any]], store: bool = True) -> Any:
+        generation = ""
+        if self.use_redis:
+            try:
+                raw_generation, cached = await get_redis().hmget(self.redis_key(owner), "_gen", key)
+                if cached is not None:
+                    self.hits += 1
+                    return json.loads(cached)
+                generation = raw_generation.decode() if raw_generation else ""
+            except RedisError:
+                logger.warning("Shared cache lookup failed for %s", self.name, exc_info=True)
+        self.misses += 1
+        value = await loader()
+        if store and self.use_redis:
+            try:
+                if self.store_script is None:
+                    self.store_script = get_redis().register_script(STORE_IF_CURRENT)
+                await self.store_script(keys=[self.redis_key(owner)], args=[generation, key, json.dumps(value), self.ttl])
+            except RedisError:
+                logger.warning("Shared cache store failed for %s", self.name, exc_info=True)
+        return value
+
+    def invalidate_local(self, owner: Hashable) -> None:
+        # A new generation orphans every local entry for the owner; they age out of the LRU.
+        self.generations.set(owner, next(self.generation_counter))
+
+    async def invalidate(self, owner: Hashable) -> None:
+        self.invalidate_local(owner)
+        if not self.use_redis:
+            return
+        key = self.redis_key(owner)
+        try:
+            pipe = get_redis().pipeline(transaction=True)
+            pipe.delete(key)
+            pipe.hset(key, "_gen", uuid.uuid4().hex)
+            pipe.expire(key, self.ttl)
+            await pipe.execute()
+        except RedisError:
+            logger.warning("Shared cache invalidation failed for %s", self.name, exc_info=True)
+
+    def snapshot(self) -> dict:
+        return {"hits": self.hits, "misses": self.misses, "coalesced": self.coalesced, "size": len(self.local)}
@@ -0,0 +1,23 @@
+import hashlib
+from typing import Optional
+
+def make_etag(*parts) -> str:
+    digest = hashlib.sha1(":".join(str(part) for part in parts).encode()).hexdigest()
+    return f'"{digest[:32]}"'
+
+def task_etag(task) -> str:
+    return make_etag("task", task.id, task.updated_at.isoformat())
+
+def etag_matches(header: Optional[str], etag: str, weak: bool = True) -> bool:
+    # If-None-Match compares weakly (a W/ prefix is ignored); If-Match requires a strong match.
+    if header is None:
+        return False
+    for candidate in header.split(","):
+        candidate = candidate.strip()
+        if candidate == "*":
+            return True
+        if weak and candidate.startswith("W/"):
+            candidate = candidate[2:]
+        if candidate == etag:
+            return True
+    return False
@@ -0,0 +1,80 @@
+import asyncio
+import time
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from passlib.context import CryptContext
+from ..config import settings
+
+pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+
+class HashPoolSaturated(Exception):
+    pass
+
+# Module-level so they can be pickled into a process pool.
+def hash_password(password: str) -> str:
+    return pwd_context.hash(password)
+
+def check_password(plain_password: str, hashed_password: str) -> bool:
+    return pwd_context.verify(plain_password, hashed_password)
+
+class HashPool:
+    def __init__(self, kind: str, workers: int, queue_limit: int):
+        self.kind = kind
+        self.workers = workers
+        self.max_pending = workers + queue_limit
+        self.executor: Executor | None = None
+        self.pending = 0
+        self.rejected = 0
+        self.completed = 0
+        self.latency_total = 0.0
+        self.latency_max = 0.0
+
+    def get_executor(self) -> Executor:
+        if self.executor is None:
+            if self.kind == "process":
+                self.executor = ProcessPoolExecutor(max_workers=self.workers)
+            else:
+                self.executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="bcrypt")
+        return self.executor
+
+    async def run(self, fn, *args):
+        # Reject instead of queueing without bound: a login burst gets fast 503s rather than stalling.
+        if self.pending >= self.max_pending:
+            self.rejected += 1
+            raise HashPoolSaturated()
+        self.pending += 1
+        started = time.perf_counter()
+        try:
+            return await asyncio.get_running_loop().run_in_executor(self.get_executor(), fn, *args)
+        finally:
+            self.pending -= 1
+            elapsed = time.perf_counter() - started
+            self.completed += 1
+            self.latency_total += elapsed
+            self.latency_max = max(self.latency_max, elapsed)
+
+    @property
+    def queue_depth(self) -> int:
+        return max(self.pending - self.workers, 0)
+
+    def snapshot(self) -> dict:
+        return {
+            "in_flight": self.pending,
+            "queue_depth": self.queue_depth,
+            "rejected": self.rejected,
+            "completed": self.completed,
+            "latency_seconds_total": self.latency_total,
+            "latency_seconds_max": self.latency_max,
+        }
+
+    def shutdown(self) -> None:
+        if self.executor is not None:
+            self.executor.shutdown(wait=False, cancel_futures=True)
+            self.executor = None
+
+hash_pool = HashPool(settings.HASH_POOL_KIND, settings.HASH_POOL_WORKERS, settings.HASH_QUEUE_LIMIT)
+
+async def verify_password(plain_password: str, hashed_password: str) -> bool:
+    return await hash_pool.run(check_password, plain_password, hashed_password)
+
+async def get_password_hash(password: str) -> str:
+    return await hash_pool.run(hash_password, password)
@@ -0,0 +1,100 @@
+import asyncio
+import logging
+import time
+from typing import Optional
+from starlette.responses import JSONResponse
+from ..config import settings
+from .metrics import REQUESTS_SHED, RecentAverage, recent_pool_wait
+
+logger = logging.getLogger(__name__)
+
+EXEMPT_PATHS = {"/metrics"}
+
+# Measures event-loop lag by how late a periodic sleep wakes up. Any request handler that blocks the
+# loop, or more ready callbacks than it can run, shows up here.
+class LoopLagMonitor:
+    def __init__(self, interval: float, window: float):
+        self.interval = interval
+        self.lag = RecentAverage(window)
+        self.lag_max = 0.0
+        self.runner: Optional[asyncio.Task] = None
+
+    async def run(self) -> None:
+        while True:
+            started = time.monotonic()
+            await asyncio.sleep(self.interval)
+            lag = max(time.monotonic() - started - self.interval, 0.0)
+            self.lag.add(lag)
+            self.lag_max = max(self.lag_max, lag)
+
+    async def start(self) -> None:
+        self.runner = asyncio.create_task(self.run())
+
+    async def stop(self) -> None:
+        if self.runner is not None:
+            self.runner.cancel()
+            try:
+                await self.runner
+            except asyncio.CancelledError:
+                pass
+            self.runner = None
+
+loop_lag_monitor = LoopLagMonitor(interval=0.1, window=settings.LOAD_SHED_WINDOW_SECONDS)
+
+class LoadShedder:
+    def __init__(self, pool_wait_limit: float, loop_lag_limit: float, retry_after: int):
+        self.pool_wait_limit = pool_wait_limit
+        self.loop_lag_limit = loop_lag_limit
+        self.retry_after = retry_after
+        self.overloaded_since: Optional[float] = None
+
+    def overload_reason(self) -> Optional[str]:
+        if recent_pool_wait.value() > self.pool_wait_limit:
+            reason = "pool_wait"
+        elif loop_lag_monitor.lag.value() > self.loop_lag_limit:
+            reason = "loop_lag"
+        else:
+            if self.overloaded_since is not None:
+                logger.info("Load back under limits after %.1fs; admitting requests", time.monotonic() - self.overloaded_since)
+                self.overloaded_since = None
+            return None
+        if self.overloaded_since is None:
+            self.overloaded_since = time.monotonic()
+            logger.warning("Overloaded (%s); shedding requests", reason)
+        return reason
+
+    def snapshot(self) -> dict:
+        return {
+            "pool_wait_seconds": recent_pool_wait.value(),
+            "loop_lag_seconds": loop_lag_monitor.lag.value(),
+            "loop_lag_max_seconds": loop_lag_monitor.lag_max,
+            "overloaded": int(self.overloaded_since is not None),
+        }
+
+load_shedder = LoadShedder(
+    pool_wait_limit=settings.LOAD_SHED_POOL_WAIT_SECONDS,
+    loop_lag_limit=settings.LOAD_SHED_LOOP_LAG_SECONDS,
+    retry_after=settings.LOAD_SHED_RETRY_AFTER_SECONDS,
+)
+
+# Rejecting at the door keeps latency bounded for the requests that are admitted, instead of every
+# request queueing for a pool connection or a turn of the loop.
+class LoadSheddingMiddleware:
+    def __init__(self, app, shedder: Optional[LoadShedder] = None):
+        self.app = app
+        self.shedder = shedder or load_shedder
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["path"] in EXEMPT_PATHS:
+            await self.app(scope, receive, send)
+            return
+        reason = self.shedder.overload_reason()
+        if reason is not None:
+            REQUESTS_SHED.labels(reason).inc()
+            response = JSONResponse(
+                {"detail": "Service is overloaded, retry shortly"}, status_code=503,
+                headers={"Retry-After": str(self.shedder.retry_after)},
+            )
+            await response(scope, receive, send)
+            return
+        await self.app(scope, receive, send)
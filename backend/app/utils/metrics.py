@@ -0,0 +1,300 @@
+import hashlib
+import json
+import logging
+import os
+import re
+import time
+from collections import deque
+from contextvars import ContextVar
+from typing import Callable, Dict, Iterable, Optional, Sequence, Tuple
+from fastapi import Depends
+from prometheus_client import CONTENT_TYPE_LATEST, REGISTRY, CollectorRegistry, Counter, Gauge, Histogram, generate_latest, multiprocess
+from prometheus_client.core import CounterMetricFamily, GaugeMetricFamily
+from prometheus_client.registry import Collector
+from sqlalchemy import event
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+from starlette.routing import Match
+from ..config import settings
+
+logger = logging.getLogger(__name__)
+
+REQUEST_DURATION = Histogram(
+    "http_request_duration_seconds", "HTTP request latency", ["method", "route", "status"],
+)
+REQUESTS_IN_FLIGHT = Gauge(
+    "http_requests_in_flight", "HTTP requests being handled", ["method", "route"], multiprocess_mode="livesum",
+)
+REQUEST_QUERIES = Histogram(
+    "http_request_db_queries", "Database queries issued per HTTP request", ["method", "route"],
+    buckets=(0, 1, 2, 3, 5, 8, 13, 21, 34, 55, 100),
+)
+REQUEST_DB_SECONDS = Histogram(
+    "http_request_db_seconds", "Time spent in database queries per HTTP request", ["method", "route"],
+)
+QUERY_DURATION = Histogram("db_query_duration_seconds", "Database query latency", ["engine"])
+POOL_CHECKOUT_WAIT = Histogram(
+    "db_pool_checkout_wait_seconds", "Time spent waiting for a pooled connection (including opening one)", ["engine"],
+)
+POOL_CHECKOUTS = Counter("db_pool_checkouts_total", "Connections checked out of the pool", ["engine"])
+SLOW_QUERIES = Counter("db_slow_queries_total", "Queries slower than SLOW_QUERY_SECONDS", ["engine"])
+QUERY_BUDGET_EXCEEDED = Counter(
+    "http_request_query_budget_exceeded_total", "Requests that issued more queries than their budget", ["method", "route"],
+)
+REQUESTS_RATE_LIMITED = Counter("http_requests_rate_limited_total", "Requests rejected with 429 by the rate limiter", ["kind"])
+REQUESTS_SHED = Counter("http_requests_shed_total", "Requests rejected with 503 while overloaded", ["reason"])
+
+# Collectors reading live in-process state (pools, queues, caches). Under a multi-worker server each
+# worker reports its own, labelled with its pid; see render_metrics.
+PROCESS_REGISTRY = CollectorRegistry()
+
+def multiprocess_enabled() -> bool:
+    # Set by app.serve before the app is imported when it runs more than one worker.
+    return "PROMETHEUS_MULTIPROC_DIR" in os.environ
+
+def process_labels() -> Dict[str, str]:
+    return {"worker": str(os.getpid())} if multiprocess_enabled() else {}
+
+# Requests to paths that match no route share one label, so scanners cannot blow up cardinality.
+UNMATCHED_ROUTE = "unmatched"
+
+class QueryBudgetExceeded(Exception):
+    pass
+
+class RequestStats:
+    def __init__(self, method: str, route: str):
+        self.method = method
+        self.route = route
+        self.queries = 0
+        self.db_time = 0.0
+        # Declared by the route through query_budget(); QUERY_BUDGET_DEFAULT otherwise.
+        self.budget: Optional[int] = settings.QUERY_BUDGET_DEFAULT
+        # SQLAlchemy reuses the compiled string for a cached statement, so counting by string is cheap
+        # and an N+1 shows up as one statement with a high count.
+        self.statements: Dict[str, int] = {}
+
+# Set for the duration of each HTTP request; engine event hooks add to it. SQLAlchemy's asyncio
+# greenlets run in the calling task's context, so queries are attributed to the right request.
+current_request: ContextVar[Optional[RequestStats]] = ContextVar("current_request", default=None)
+
+def query_budget(limit: Optional[int]):
+    # Route dependency declaring how many queries one request may issue, e.g.
+    # @router.get(..., dependencies=[query_budget(3)]). None exempts routes whose query count
+    # grows with the input by design (streaming imports).
+    async def declare_query_budget():
+        stats = current_request.get()
+        if stats is not None:
+            stats.budget = limit
+    return Depends(declare_query_budget)
+
+PLACEHOLDER = re.compile(r"'(?:[^']|'')*'|(?<![\w.])\d+(?:\.\d+)?\b|\$\d+|%\(\w+\)s|(?<!:):\w+|\?")
+VALUE_LIST = re.compile(r"\(\s*\?(?:\s*,\s*\?)*\s*\)")
+
+def fingerprint(statement: str) -> Tuple[str, str]:
+    # Literals and bind parameters (any paramstyle) become ?, and IN lists of any length one (?+),
+    # so the same query shape always gets the same id.
+    normalized = PLACEHOLDER.sub("?", " ".join(statement.split()))
+    normalized = VALUE_LIST.sub("(?+)", normalized)
+    return hashlib.sha1(normalized.encode()).hexdigest()[:12], normalized
+
+def log_slow_query(engine: str, statement: str, elapsed: float) -> None:
+    stats = current_request.get()
+    digest, normalized = fingerprint(statement)
+    logger.warning("slow_query %s", json.dumps({
+        "engine": engine,
+        "route": stats.route if stats else None,
+        "method": stats.method if stats else None,
+        "duration_ms": round(elapsed * 1000, 2),
+        "fingerprint": digest,
+        "statement": normalized[:1000],
+    }))
+
+def check_query_budget(stats: RequestStats) -> None:
+    budget = stats.budget
+    if budget is None or stats.queries <= budget:
+        return
+    QUERY_BUDGET_EXCEEDED.labels(stats.method, stats.route).inc()
+    top = sorted(stats.statements.items(), key=lambda item: item[1], reverse=True)[:3]
+    record = {
+        "route": stats.route,
+        "method": stats.method,
+        "queries": stats.queries,
+        "budget": budget,
+        "db_ms": round(stats.db_time * 1000, 2),
+        "top_statements": [
+            {"fingerprint": digest, "count": count, "statement": normalized[:500]}
+            for (digest, normalized), count in ((fingerprint(statement), count) for statement, count in top)
+        ],
+    }
+    logger.warning("query_budget_exceeded %s", json.dumps(record))
+    if settings.QUERY_BUDGET_STRICT:
+        raise QueryBudgetExceeded(f"{stats.method} {stats.route} issued {stats.queries} queries (budget {budget}): {json.dumps(record['top_statements'])}")
+
+def route_template(scope: dict) -> str:
+    for route in scope["app"].router.routes:
+        match, _ = route.matches(scope)
+        if match != Match.NONE:
+            return route.path
+    return UNMATCHED_ROUTE
+
+class MetricsMiddleware:
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        method = scope["method"]
+        route = route_template(scope)
+        stats = RequestStats(method, route)
+        token = current_request.set(stats)
+        status_code = 500
+
+        async def send_with_status(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        in_flight = REQUESTS_IN_FLIGHT.labels(method, route)
+        in_flight.inc()
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            in_flight.dec()
+            REQUEST_DURATION.labels(method, route, str(status_code)).observe(time.perf_counter() - started)
+            REQUEST_QUERIES.labels(method, route).observe(stats.queries)
+            REQUEST_DB_SECONDS.labels(method, route).observe(stats.db_time)
+            current_request.reset(token)
+        # After the response: strict mode (for tests) surfaces an over-budget endpoint as a server error.
+        check_query_budget(stats)
+
+class RecentAverage:
+    # Mean of the samples added in the last `window` seconds. With no recent samples it reads 0, so a
+    # signal that stops being fed (say, because requests are being shed) recovers on its own.
+    def __init__(self, window: float, max_samples: int = 10000):
+        self.window = window
+        self.max_samples = max_samples
+        self.samples: deque = deque()
+        self.total = 0.0
+
+    def add(self, value: float, now: Optional[float] = None) -> None:
+        self.samples.append((time.monotonic() if now is None else now, value))
+        self.total += value
+        if len(self.samples) > self.max_samples:
+            self.total -= self.samples.popleft()[1]
+
+    def value(self, now: Optional[float] = None) -> float:
+        cutoff = (time.monotonic() if now is None else now) - self.window
+        while self.samples and self.samples[0][0] < cutoff:
+            self.total -= self.samples.popleft()[1]
+        return self.total / len(self.samples) if self.samples else 0.0
+
+# Read by the load shedder.
+recent_pool_wait = RecentAverage(settings.LOAD_SHED_WINDOW_SECONDS)
+
+class InstrumentedAsyncPool(AsyncAdaptedQueuePool):
+    # QueuePool has no event for the wait before a checkout, so time _do_get itself.
+    metrics_engine_name = "primary"
+
+    def _do_get(self):
+        started = time.perf_counter()
+        try:
+            return super()._do_get()
+        finally:
+            elapsed = time.perf_counter() - started
+            POOL_CHECKOUT_WAIT.labels(self.metrics_engine_name).observe(elapsed)
+            recent_pool_wait.add(elapsed)
+
+def instrument_engine(engine, name: str) -> None:
+    # engine is a sync Engine (for an AsyncEngine, pass .sync_engine).
+    if isinstance(engine.pool, InstrumentedAsyncPool):
+        engine.pool.metrics_engine_name = name
+    query_duration = QUERY_DURATION.labels(name)
+    checkouts = POOL_CHECKOUTS.labels(name)
+    slow_queries = SLOW_QUERIES.labels(name)
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("query_started", []).append(time.perf_counter())
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        elapsed = time.perf_counter() - conn.info["query_started"].pop()
+        query_duration.observe(elapsed)
+        stats = current_request.get()
+        if stats is not None:
+            stats.queries += 1
+            stats.db_time += elapsed
+            stats.statements[statement] = stats.statements.get(statement, 0) + 1
+        if elapsed >= settings.SLOW_QUERY_SECONDS:
+            slow_queries.inc()
+            log_slow_query(name, statement, elapsed)
+
+    @event.listens_for(engine, "handle_error")
+    def handle_error(context):
+        started = context.connection.info.get("query_started") if context.connection is not None else None
+        if started:
+            started.pop()
+
+    @event.listens_for(engine.pool, "checkout")
+    def checkout(dbapi_connection, connection_record, connection_proxy):
+        checkouts.inc()
+
+    PROCESS_REGISTRY.register(PoolCollector(name, engine))
+
+class PoolCollector(Collector):
+    def __init__(self, name: str, engine):
+        self.name = name
+        self.engine = engine
+
+    def collect(self) -> Iterable[GaugeMetricFamily]:
+        pool = self.engine.pool
+        # Only queue pools track size and overflow; SQLite's default pools do not.
+        if not hasattr(pool, "overflow"):
+            return
+        labels = process_labels()
+        for metric, help_text, value in (
+            ("db_pool_size", "Configured pool size", pool.size()),
+            ("db_pool_checked_out", "Connections currently checked out", pool.checkedout()),
+            ("db_pool_checked_in", "Idle connections in the pool", pool.checkedin()),
+            ("db_pool_overflow", "Connections open beyond pool_size (negative while below it)", pool.overflow()),
+        ):
+            family = GaugeMetricFamily(metric, help_text, labels=["engine", *labels])
+            family.add_metric([self.name, *labels.values()], value)
+            yield family
+
+class SnapshotCollector(Collector):
+    # Exposes the numeric fields of an in-process component's snapshot() as <prefix>_<field>. Fields
+    # listed in `counters` only ever grow and are exported as counters (<prefix>_<field>_total), so
+    # rate() and increase() handle worker restarts; everything else is a gauge.
+    def __init__(self, prefix: str, snapshot: Callable[[], Dict[str, object]], description: str, counters: Sequence[str] = ()):
+        self.prefix = prefix
+        self.snapshot = snapshot
+        self.description = description
+        self.counters = frozenset(counters)
+
+    def collect(self) -> Iterable[GaugeMetricFamily]:
+        labels = process_labels()
+        for field, value in self.snapshot().items():
+            if isinstance(value, (int, float)) and not isinstance(value, bool):
+                family_class = CounterMetricFamily if field in self.counters else GaugeMetricFamily
+                family = family_class(f"{self.prefix}_{field}", f"{self.description}: {field}", labels=list(labels))
+                family.add_metric(list(labels.values()), value)
+                yield family
+
+def register_snapshot(prefix: str, snapshot: Callable[[], Dict[str, object]], description: str, counters: Sequence[str] = ()) -> None:
+    PROCESS_REGISTRY.register(SnapshotCollector(prefix, snapshot, description, counters))
+
+def render_metrics() -> bytes:
+    # With several workers a scrape lands on any one of them, so counters and histograms are read
+    # from every worker's files (prometheus_client multiprocess mode) and summed; the live
+    # collectors can only report the worker serving the scrape.
+    if multiprocess_enabled():
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        return generate_latest(registry) + generate_latest(PROCESS_REGISTRY)
+    return generate_latest(REGISTRY) + generate_latest(PROCESS_REGISTRY)
+
+METRICS_CONTENT_TYPE = CONTENT_TYPE_LATEST
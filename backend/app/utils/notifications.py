@@ -1,58 +1,391 @@
-import { BackgroundTasks } from 'fastapi_utils.tasks';
-import { Redis } from 'redis';
-import { createClient } from 'redis';
-import { Notification } from '../models/notification';
-import { sendNotification } from '../services/notificationService';
-
-const redisClient = createClient({
-  url: process.env.REDIS_URL || 'redis://localhost:6379'
-});
-
-redisClient.on('error', (err) => {
-  console.error('Redis Client Error', err);
-});
-
-redisClient.connect();
-
-interface NotificationPayload {
-  userId: string;
-  message: string;
-  type: string;
-}
-
-async function processNotificationJob(payload: NotificationPayload): Promise<void> {
-  try {
-    const notification = new Notification({
-      userId: payload.userId,
-      message: payload.message,
-      type: payload.type,
-      status: 'pending',
-      createdAt: new Date()
-    });
-
-    await notification.save();
-
-    const result = await sendNotification(payload.userId, payload.message, payload.type);
-
-    notification.status = result.success ? 'sent' : 'failed';
-    notification.sentAt = result.success ? new Date() : null;
-    await notification.save();
-
-    if (!result.success) {
-      throw new Error('Failed to send notification');
-    }
-  } catch (error) {
-    console.error('Error processing notification job:', error);
-    throw error;
-  }
-}
-
-const backgroundTasks = new BackgroundTasks();
-
-backgroundTasks.add_task(processNotificationJob, {
-  userId: '12345',
-  message: 'Your task is due soon!',
-  type: 'reminder'
-});
-
-export { processNotificationJob, backgroundTasks };
\ No newline at end of file
+import asyncio
+import json
+import logging
+import os
+import random
+import socket
+import time
+from datetime import datetime
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
+from redis.exceptions import RedisError, ResponseError
+from ..config import settings
+from ..crud import create_notifications, save_notification_statuses
+from ..database import AsyncSessionLocal
+from ..websockets import manager
+from .redis_client import get_redis
+
+logger = logging.getLogger(__name__)
+
+# A job is a plain dict: {"id", "user_id", "type", "message", "attempts", "enqueued_at"}.
+# Queues hand jobs out as (receipt, job) pairs; the receipt is what ack/retry/dead_letter take back.
+Delivery = Tuple[str, dict]
+Sender = Callable[[dict], Awaitable[None]]
+StatusWriter = Callable[[List[dict]], Awaitable[None]]
+
+class NotificationQueue:
+    async def put(self, jobs: List[dict]) -> None:
+        raise NotImplementedError
+
+    async def get(self, count: int, timeout: float) -> List[Delivery]:
+        raise NotImplementedError
+
+    async def ack(self, receipts: List[str]) -> None:
+        raise NotImplementedError
+
+    async def retry(self, receipt: str, job: dict, delay: float) -> None:
+        raise NotImplementedError
+
+    async def dead_letter(self, receipt: str, job: dict) -> None:
+        raise NotImplementedError
+
+    async def depth(self) -> int:
+        raise NotImplementedError
+
+    async def close(self) -> None:
+        pass
+
+# Single-process queue for tests and single-node runs; jobs are lost on restart.
+class InMemoryNotificationQueue(NotificationQueue):
+    def __init__(self):
+        self.queue: asyncio.Queue = asyncio.Queue()
+        self.dead: List[dict] = []
+        self.delayed: Dict[object, asyncio.TimerHandle] = {}
+        self.counter = 0
+
+    async def put(self, jobs: List[dict]) -> None:
+        for job in jobs:
+            self.counter += 1
+            self.queue.put_nowait((str(self.counter), job))
+
+    async def get(self, count: int, timeout: float) -> List[Delivery]:
+        try:
+            deliveries = [await asyncio.wait_for(self.queue.get(), timeout)]
+        except asyncio.TimeoutError:
+            return []
+        while len(deliveries) < count and not self.queue.empty():
+            deliveries.append(self.queue.get_nowait())
+        return deliveries
+
+    async def ack(self, receipts: List[str]) -> None:
+        pass
+
+    async def retry(self, receipt: str, job: dict, delay: float) -> None:
+        token = object()
+        self.delayed[token] = asyncio.get_running_loop().call_later(delay, self.release, token, receipt, job)
+
+    def release(self, token: object, receipt: str, job: dict) -> None:
+        del self.delayed[token]
+        self.queue.put_nowait((receipt, job))
+
+    async def dead_letter(self, receipt: str, job: dict) -> None:
+        self.dead.append(job)
+
+    async def depth(self) -> int:
+        return self.queue.qsize() + len(self.delayed)
+
+    async def close(self) -> None:
+        for handle in self.delayed.values():
+            handle.cancel()
+        self.delayed.clear()
+
+# Jobs live in a Redis stream read through a consumer group, so several worker processes share the load
+# and a crashed worker's unacknowledged jobs are reclaimed by the others. Retries wait in a sorted set
+# scored by due time and are moved back onto the stream when due; dead jobs go to a separate stream.
+class RedisStreamNotificationQueue(NotificationQueue):
+    def __init__(self, stream: str, group: str, consumer: str, claim_idle_seconds: float):
+        self.stream = stream
+        self.group = group
+        self.consumer_name = consumer
+        self.delayed_key = f"{stream}:delayed"
+        self.dead_key = f"{stream}:dead"
+        self.claim_idle_ms = int(claim_idle_seconds * 1000)
+        self.group_ready = False
+
+    @property
+    def consumer(self) -> str:
+        # Resolved on use rather than at import, so workers forked from a preloading master each get their own.
+        return self.consumer_name or f"{socket.gethostname()}-{os.getpid()}"
+
+    async def ensure_group(self) -> None:
+        if self.group_ready:
+            return
+        try:
+            await get_redis().xgroup_create(self.stream, self.group, id="0", mkstream=True)
+        except ResponseError as exc:
+            if "BUSYGROUP" not in str(exc):
+                raise
+        self.group_ready = True
+
+    async def put(self, jobs: List[dict]) -> None:
+        async with get_redis().pipeline(transaction=False) as pipe:
+            for job in jobs:
+                pipe.xadd(self.stream, {"job": json.dumps(job)})
+            await pipe.execute()
+
+    async def promote_due(self) -> None:
+        redis = get_redis()
+        due = await redis.zrangebyscore(self.delayed_key, 0, time.time(), start=0, num=100)
+        for payload in due:
+            # ZREM is the claim: only the worker that removes the entry re-adds it.
+            if await redis.zrem(self.delayed_key, payload):
+                await redis.xadd(self.stream, {"job": payload})
+
+    async def get(self, count: int, timeout: float) -> List[Delivery]:
+        await self.ensure_group()
+        await self.promote_due()
+        redis = get_redis()
+        _, claimed, *_ = await redis.xautoclaim(
+            self.stream, self.group, self.consumer, min_idle_time=self.claim_idle_ms, start_id="0-0", count=count,
+        )
+        entries = [entry for entry in claimed if entry[1]]
+        if not entries:
+            response = await redis.xreadgroup(
+                self.group, self.consumer, {self.stream: ">"}, count=count, block=int(timeout * 1000),
+            )
+            entries = [entry for _, stream_entries in response for entry in stream_entries]
+        return [(receipt.decode(), json.loads(fields[b"job"])) for receipt, fields in entries]
+
+    async def ack(self, receipts: List[str]) -> None:
+        if receipts:
+            async with get_redis().pipeline(transaction=True) as pipe:
+                pipe.xack(self.stream, self.group, *receipts)
+                pipe.xdel(self.stream, *receipts)
+                await pipe.execute()
+
+    async def retry(self, receipt: str, job: dict, delay: float) -> None:
+        async with get_redis().pipeline(transaction=True) as pipe:
+            pipe.zadd(self.delayed_key, {json.dumps(job): time.time() + delay})
+            pipe.xack(self.stream, self.group, receipt)
+            pipe.xdel(self.stream, receipt)
+            await pipe.execute()
+
+    async def dead_letter(self, receipt: str, job: dict) -> None:
+        async with get_redis().pipeline(transaction=True) as pipe:
+            pipe.xadd(self.dead_key, {"job": json.dumps(job)})
+            pipe.xack(self.stream, self.group, receipt)
+            pipe.xdel(self.stream, receipt)
+            await pipe.execute()
+
+    async def depth(self) -> int:
+        redis = get_redis()
+        return await redis.xlen(self.stream) + await redis.zcard(self.delayed_key)
+
+def create_notification_queue() -> NotificationQueue:
+    if settings.NOTIFICATION_BACKEND == "redis":
+        return RedisStreamNotificationQueue(
+            settings.NOTIFICATION_STREAM, settings.NOTIFICATION_GROUP,
+            settings.NOTIFICATION_CONSUMER,
+            settings.NOTIFICATION_CLAIM_IDLE_SECONDS,
+        )
+    return InMemoryNotificationQueue()
+
+async def deliver_notification(job: dict) -> None:
+    await manager.broadcast(job["user_id"], {
+        "type": "notification",
+        "notification": {"id": job["id"], "type": job["type"], "message": job["message"]},
+    })
+
+async def write_notification_statuses(statuses: List[dict]) -> None:
+    async with AsyncSessionLocal() as db:
+        await save_notification_statuses(db, statuses)
+
+class NotificationWorker:
+    def __init__(
+        self, queue: NotificationQueue, sender: Sender, status_writer: StatusWriter, concurrency: int,
+        batch_size: int, flush_interval: float, max_attempts: int, backoff_base: float, backoff_max: float,
+        send_timeout: float,
+    ):
+        self.queue = queue
+        self.sender = sender
+        self.status_writer = status_writer
+        self.concurrency = concurrency
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_attempts = max_attempts
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.send_timeout = send_timeout
+        self.slots = asyncio.Semaphore(concurrency)
+        self.running: set = set()
+        # Status rows and receipts wait here until the next flush; a job is acked only once its
+        # status is committed, so a crash redelivers it instead of losing it.
+        self.statuses: Dict[int, dict] = {}
+        self.receipts: List[str] = []
+        self.flush_lock = asyncio.Lock()
+        self.fetcher: Optional[asyncio.Task] = None
+        self.flusher: Optional[asyncio.Task] = None
+        self.started_at = time.monotonic()
+        self.sent = 0
+        self.failed = 0
+        self.retried = 0
+        self.dead_lettered = 0
+        self.flushes = 0
+        self.lag_last = 0.0
+        self.lag_max = 0.0
+        # Sampled by the flush loop, so the synchronous metrics collector can report it.
+        self.queue_depth: Optional[int] = None
+
+    async def enqueue(self, notifications: List[dict]) -> List[dict]:
+        # Persists the rows as pending, then queues one job per row; returns the jobs.
+        async with AsyncSessionLocal() as db:
+            created = await create_notifications(db, notifications)
+        now = time.time()
+        jobs = [
+            {"id": row.id, "user_id": row.user_id, "type": row.type, "message": row.message, "attempts": 0, "enqueued_at": now}
+            for row in created
+        ]
+        await self.queue.put(jobs)
+        return jobs
+
+    async def start(self) -> None:
+        self.started_at = time.monotonic()
+        self.fetcher = asyncio.create_task(self.fetch_loop())
+        self.flusher = asyncio.create_task(self.flush_loop())
+
+    async def stop(self) -> None:
+        for task in (self.fetcher, self.flusher):
+            if task is not None:
+                task.cancel()
+                try:
+                    await task
+                except asyncio.CancelledError:
+                    pass
+        self.fetcher = self.flusher = None
+        if self.running:
+            await asyncio.wait(self.running, timeout=self.send_timeout)
+        await self.flush()
+        await self.queue.close()
+
+    async def fetch_loop(self) -> None:
+        while True:
+            try:
+                # Only pull as many jobs as there are free slots: a burst stays in the queue, not in memory.
+                await self.slots.acquire()
+                free = 1
+                while free < self.concurrency and not self.slots.locked():
+                    await self.slots.acquire()
+                    free += 1
+                try:
+                    deliveries = await self.queue.get(free, timeout=1.0)
+                except RedisError:
+                    logger.warning("Notification queue unavailable, retrying", exc_info=True)
+                    deliveries = []
+                    await asyncio.sleep(1)
+                for _ in range(free - len(deliveries)):
+                    self.slots.release()
+                for receipt, job in deliveries:
+                    task = asyncio.create_task(self.process(receipt, job))
+                    self.running.add(task)
+                    task.add_done_callback(self.running.discard)
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.exception("Notification fetch loop failed")
+                await asyncio.sleep(1)
+
+    async def flush_loop(self) -> None:
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            try:
+                await self.flush()
+            except Exception:
+                logger.exception("Failed to write notification statuses")
+            await self.sample_depth()
+
+    async def sample_depth(self) -> Optional[int]:
+        try:
+            self.queue_depth = await self.queue.depth()
+        except RedisError:
+            logger.warning("Could not read notification queue depth", exc_info=True)
+            self.queue_depth = None
+        return self.queue_depth
+
+    async def process(self, receipt: str, job: dict) -> None:
+        try:
+            lag = max(time.time() - job["enqueued_at"], 0.0)
+            self.lag_last = lag
+            self.lag_max = max(self.lag_max, lag)
+            try:
+                await asyncio.wait_for(self.sender(job), self.send_timeout)
+            except Exception as exc:
+                await self.handle_failure(receipt, job, exc)
+            else:
+                self.sent += 1
+                await self.record(receipt, job, "sent", None, datetime.utcnow())
+        finally:
+            self.slots.release()
+
+    async def handle_failure(self, receipt: str, job: dict, exc: Exception) -> None:
+        self.failed += 1
+        job = dict(job, attempts=job["attempts"] + 1)
+        error = repr(exc)[:500]
+        if job["attempts"] >= self.max_attempts:
+            logger.warning("Dead-lettering notification %s after %d attempts: %s", job["id"], job["attempts"], error)
+            self.dead_lettered += 1
+            await self.queue.dead_letter(receipt, job)
+            await self.record(None, job, "dead", error, None)
+            return
+        # Full jitter keeps a burst of failures from retrying in lockstep. Lag is measured from when
+        # a job becomes due, so a retry's backoff does not count against the queue.
+        delay = random.uniform(0, min(self.backoff_base * 2 ** (job["attempts"] - 1), self.backoff_max))
+        job["enqueued_at"] = time.time() + delay
+        self.retried += 1
+        await self.queue.retry(receipt, job, delay)
+        await self.record(None, job, "pending", error, None)
+
+    async def record(self, receipt: Optional[str], job: dict, status: str, error: Optional[str], sent_at: Optional[datetime]) -> None:
+        self.statuses[job["id"]] = {"id": job["id"], "status": status, "attempts": job["attempts"], "error": error, "sent_at": sent_at}
+        if receipt is not None:
+            self.receipts.append(receipt)
+        if len(self.statuses) >= self.batch_size:
+            try:
+                await self.flush()
+            except Exception:
+                # flush() kept the statuses; the flush loop retries them on its next tick.
+                logger.exception("Failed to write notification statuses, retrying on the next flush")
+
+    async def flush(self) -> None:
+        async with self.flush_lock:
+            if not self.statuses:
+                return
+            statuses, receipts = list(self.statuses.values()), self.receipts
+            self.statuses, self.receipts = {}, []
+            try:
+                await self.status_writer(statuses)
+            except Exception:
+                # Put them back (newer entries win) so the next flush retries the write.
+                self.statuses = {**{row["id"]: row for row in statuses}, **self.statuses}
+                self.receipts = receipts + self.receipts
+                raise
+            self.flushes += 1
+            await self.queue.ack(receipts)
+
+    def stats(self) -> dict:
+        uptime = max(time.monotonic() - self.started_at, 1e-9)
+        return {
+            "concurrency": self.concurrency,
+            "in_flight": len(self.running),
+            "pending_status_writes": len(self.statuses),
+            "sent": self.sent,
+            "failed": self.failed,
+            "retried": self.retried,
+            "dead_lettered": self.dead_lettered,
+            "flushes": self.flushes,
+            "sent_per_second": self.sent / uptime,
+            "lag_seconds_last": self.lag_last,
+            "lag_seconds_max": self.lag_max,
+            "queue_depth": self.queue_depth,
+        }
+
+notification_worker = NotificationWorker(
+    create_notification_queue(),
+    deliver_notification,
+    write_notification_statuses,
+    concurrency=settings.NOTIFICATION_CONCURRENCY,
+    batch_size=settings.NOTIFICATION_BATCH_SIZE,
+    flush_interval=settings.NOTIFICATION_FLUSH_INTERVAL_SECONDS,
+    max_attempts=settings.NOTIFICATION_MAX_ATTEMPTS,
+    backoff_base=settings.NOTIFICATION_BACKOFF_BASE_SECONDS,
+    backoff_max=settings.NOTIFICATION_BACKOFF_MAX_SECONDS,
+    send_timeout=settings.NOTIFICATION_SEND_TIMEOUT_SECONDS,
+)
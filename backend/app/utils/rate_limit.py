@@ -0,0 +1,136 @@
+import logging
+import math
+import time
+from collections import OrderedDict
+from typing import Optional, Tuple
+from jose import JWTError, jwt
+from redis.exceptions import RedisError
+from starlette.responses import JSONResponse
+from ..config import settings
+from .metrics import REQUESTS_RATE_LIMITED
+from .redis_client import get_redis
+
+logger = logging.getLogger(__name__)
+
+# Scraping must keep working while a client is being throttled.
+EXEMPT_PATHS = {"/metrics"}
+
+# Limiters return 0 when the request may proceed, else the seconds until a token is available.
+class RateLimiter:
+    async def acquire(self, key: str, cost: float = 1.0) -> float:
+        raise NotImplementedError
+
+class InMemoryRateLimiter(RateLimiter):
+    # Buckets are kept in LRU order; evicting the least recently seen one only hands that client a
+    # full bucket again.
+    def __init__(self, rate: float, burst: float, max_keys: int):
+        self.rate = rate
+        self.burst = burst
+        self.max_keys = max_keys
+        self.buckets: OrderedDict = OrderedDict()
+
+    async def acquire(self, key: str, cost: float = 1.0) -> float:
+        now = time.monotonic()
+        tokens, updated = self.buckets.pop(key, (self.burst, now))
+        tokens = min(self.burst, tokens + (now - updated) * self.rate)
+        wait = 0.0
+        if tokens >= cost:
+            tokens -= cost
+        else:
+            wait = (cost - tokens) / self.rate
+        self.buckets[key] = (tokens, now)
+        while len(self.buckets) > self.max_keys:
+            self.buckets.popitem(last=False)
+        return wait
+
+# Refill and take in one step so concurrent requests on different pods cannot both spend the last
+# token. Redis' clock is used so pods with skewed clocks agree. Returns the wait as a string because
+# Lua numbers come back truncated to integers.
+TOKEN_BUCKET = """
+local clock = redis.call('TIME')
+local now = tonumber(clock[1]) + tonumber(clock[2]) / 1000000
+local rate = tonumber(ARGV[1])
+local burst = tonumber(ARGV[2])
+local cost = tonumber(ARGV[3])
+local state = redis.call('HMGET', KEYS[1], 'tokens', 'ts')
+local tokens = tonumber(state[1]) or burst
+local updated = tonumber(state[2]) or now
+tokens = math.min(burst, tokens + math.max(0, now - updated) * rate)
+local wait = 0
+if tokens >= cost then
+    tokens = tokens - cost
+else
+    wait = (cost - tokens) / rate
+end
+redis.call('HSET', KEYS[1], 'tokens', tokens, 'ts', now)
+redis.call('EXPIRE', KEYS[1], ARGV[4])
+return tostring(wait)
+"""
+
+class RedisRateLimiter(RateLimiter):
+    # Shared across pods and workers. If Redis is unavailable each process falls back to limiting
+    # on its own rather than letting every request through.
+    def __init__(self, rate: float, burst: float, max_keys: int, prefix: str = "ratelimit:"):
+        self.rate = rate
+        self.burst = burst
+        self.prefix = prefix
+        # A full bucket refills within this, after which the key carries no information.
+        self.ttl = math.ceil(burst / rate) + 1
+        self.script = None
+        self.fallback = InMemoryRateLimiter(rate, burst, max_keys)
+
+    async def acquire(self, key: str, cost: float = 1.0) -> float:
+        try:
+            if self.script is None:
+                self.script = get_redis().register_script(TOKEN_BUCKET)
+            wait = await self.script(keys=[self.prefix + key], args=[self.rate, self.burst, cost, self.ttl])
+        except RedisError as exc:
+            logger.warning("Rate limiter falling back to per-process buckets: %r", exc)
+            return await self.fallback.acquire(key, cost)
+        return float(wait)
+
+def create_rate_limiter() -> RateLimiter:
+    if settings.RATE_LIMIT_BACKEND == "redis":
+        return RedisRateLimiter(settings.RATE_LIMIT_PER_SECOND, settings.RATE_LIMIT_BURST, settings.RATE_LIMIT_MAX_KEYS)
+    return InMemoryRateLimiter(settings.RATE_LIMIT_PER_SECOND, settings.RATE_LIMIT_BURST, settings.RATE_LIMIT_MAX_KEYS)
+
+rate_limiter = create_rate_limiter()
+
+def rate_limit_key(scope: dict) -> Tuple[str, str]:
+    # Authenticated requests are limited per user, so users behind one NAT do not share a bucket;
+    # anything else (login, registration, bad tokens) per client address.
+    headers = dict(scope["headers"])
+    authorization = headers.get(b"authorization", b"").decode("latin-1")
+    scheme, _, token = authorization.partition(" ")
+    if scheme.lower() == "bearer" and token:
+        try:
+            subject = jwt.decode(token, settings.SECRET_KEY, algorithms=[settings.JWT_ALGORITHM]).get("sub")
+        except JWTError:
+            subject = None
+        if subject:
+            return "user", f"user:{subject}"
+    client = scope.get("client")
+    address: Optional[str] = client[0] if client else None
+    if settings.RATE_LIMIT_TRUST_FORWARDED_FOR and b"x-forwarded-for" in headers:
+        address = headers[b"x-forwarded-for"].decode("latin-1").split(",")[0].strip()
+    return "ip", f"ip:{address or 'unknown'}"
+
+class RateLimitMiddleware:
+    def __init__(self, app, limiter: Optional[RateLimiter] = None):
+        self.app = app
+        self.limiter = limiter or rate_limiter
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["path"] in EXEMPT_PATHS:
+            await self.app(scope, receive, send)
+            return
+        kind, key = rate_limit_key(scope)
+        wait = await self.limiter.acquire(key)
+        if wait > 0:
+            REQUESTS_RATE_LIMITED.labels(kind).inc()
+            response = JSONResponse(
+                {"detail": "Too many requests"}, status_code=429, headers={"Retry-After": str(math.ceil(wait))},
+            )
+            await response(scope, receive, send)
+            return
+        await self.app(scope, receive, send)
@@ -0,0 +1,16 @@
+import redis.asyncio as aioredis
+from ..config import settings
+
+redis_client = None
+
+def get_redis() -> aioredis.Redis:
+    global redis_client
+    if redis_client is None:
+        redis_client = aioredis.from_url(settings.REDIS_URL)
+    return redis_client
+
+async def close_redis() -> None:
+    global redis_client
+    if redis_client is not None:
+        await redis_client.close()
+        redis_client = None
@@ -0,0 +1,193 @@
+import asyncio
+import heapq
+import logging
+import time
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Tuple
+from ..config import settings
+from ..crud import claim_reminders, stream_pending_reminders
+from ..database import AsyncSessionLocal
+from ..websockets import manager
+from .notifications import notification_worker
+
+logger = logging.getLogger(__name__)
+
+def parse_due_at(value) -> Optional[datetime]:
+    # Broker messages carry tasks as JSON, so due_at arrives as an ISO string.
+    if value is None or isinstance(value, datetime):
+        return value
+    return datetime.fromisoformat(value)
+
+# Only reminders due before `horizon` are held in memory, in a min-heap keyed by due time. The horizon
+# is pushed forward by loading the next slice through the due_at index, so memory tracks the window,
+# not the table. Changes arrive as task events (local and from other replicas via the broker); a
+# rescheduled task gets a new heap entry and its old one is skipped when popped.
+class ReminderScheduler:
+    def __init__(self, window: float, refill_interval: float, grace: float, batch_size: int):
+        self.window = timedelta(seconds=window)
+        self.refill_interval = refill_interval
+        self.grace = timedelta(seconds=grace)
+        self.batch_size = batch_size
+        self.heap: List[Tuple[datetime, int]] = []
+        self.entries: Dict[int, Tuple[datetime, int, str]] = {}
+        self.horizon: Optional[datetime] = None
+        self.wakeup = asyncio.Event()
+        self.runner: Optional[asyncio.Task] = None
+        self.reloads: set = set()
+        self.fired = 0
+        self.claimed = 0
+        self.late_max = 0.0
+
+    def schedule(self, task_id: int, user_id: int, title: str, due_at: datetime) -> None:
+        current = self.entries.get(task_id)
+        self.entries[task_id] = (due_at, user_id, title)
+        if current is not None and current[0] == due_at:
+            return
+        heapq.heappush(self.heap, (due_at, task_id))
+        if self.heap[0] == (due_at, task_id):
+            self.wakeup.set()
+        # Stale entries are dropped lazily; rebuild if they start to dominate the heap.
+        if len(self.heap) > 2 * len(self.entries) + 1024:
+            self.heap = [(entry[0], key) for key, entry in self.entries.items()]
+            heapq.heapify(self.heap)
+
+    def cancel(self, task_id: int) -> None:
+        self.entries.pop(task_id, None)
+
+    def on_task(self, task: dict) -> None:
+        due_at = parse_due_at(task.get("due_at"))
+        if due_at is None or task.get("completed") or task.get("reminded_at") is not None:
+            self.cancel(task["id"])
+        elif self.horizon is not None and due_at < self.horizon:
+            self.schedule(task["id"], task["user_id"], task["title"], due_at)
+        else:
+            # Beyond the horizon: the refill that reaches it will load it from the index.
+            self.cancel(task["id"])
+
+    def on_event(self, user_id: int, message: dict) -> None:
+        event = message.get("event")
+        if event in ("task_created", "task_updated"):
+            self.on_task(dict(message["task"], user_id=user_id))
+        elif event in ("tasks_created", "tasks_updated"):
+            for task in message["tasks"]:
+                self.on_task(dict(task, user_id=user_id))
+        elif event == "task_deleted":
+            self.cancel(message["task_id"])
+        elif event == "tasks_deleted":
+            for task_id in message["task_ids"]:
+                self.cancel(task_id)
+        elif event == "resync" and self.horizon is not None:
+            # Bulk imports are not broadcast row by row; reload that user's part of the window.
+            reload = asyncio.create_task(self.load(datetime.utcnow() - self.grace, self.horizon, user_id=user_id))
+            self.reloads.add(reload)
+            reload.add_done_callback(self.reloads.discard)
+
+    async def load(self, start: datetime, end: datetime, user_id: Optional[int] = None) -> int:
+        loaded = 0
+        async with AsyncSessionLocal() as db:
+            async for rows in stream_pending_reminders(db, start, end, user_id=user_id):
+                for row in rows:
+                    # An event may already have scheduled a newer version of the task.
+                    if row.id not in self.entries:
+                        self.schedule(row.id, row.user_id, row.title, row.due_at)
+                        loaded += 1
+        return loaded
+
+    async def refill(self) -> None:
+        now = datetime.utcnow()
+        start = now - self.grace if self.horizon is None else self.horizon
+        end = now + self.window
+        if end > start:
+            loaded = await self.load(start, end)
+            self.horizon = end
+            logger.info("Loaded %d reminders due before %s", loaded, end.isoformat())
+
+    def pop_due(self, now: datetime) -> Dict[int, Tuple[datetime, int, str]]:
+        due = {}
+        while self.heap and self.heap[0][0] <= now and len(due) < self.batch_size:
+            due_at, task_id = heapq.heappop(self.heap)
+            entry = self.entries.get(task_id)
+            if entry is not None and entry[0] == due_at:
+                due[task_id] = self.entries.pop(task_id)
+        return due
+
+    async def fire(self, due: Dict[int, Tuple[datetime, int, str]], now: datetime) -> None:
+        try:
+            async with AsyncSessionLocal() as db:
+                claimed = await claim_reminders(db, list(due), now)
+        except Exception:
+            # Nothing was claimed; put them back so the next iteration retries.
+            for task_id, (due_at, user_id, title) in due.items():
+                if task_id not in self.entries:
+                    self.schedule(task_id, user_id, title, due_at)
+            raise
+        self.fired += len(due)
+        self.claimed += len(claimed)
+        if claimed:
+            self.late_max = max(self.late_max, max((now - row.due_at).total_seconds() for row in claimed))
+            await notification_worker.enqueue([
+                {"user_id": row.user_id, "type": "reminder", "message": f"Task due: {row.title}"}
+                for row in claimed
+            ])
+
+    async def run(self) -> None:
+        next_refill = 0.0
+        while True:
+            try:
+                if time.monotonic() >= next_refill:
+                    await self.refill()
+                    next_refill = time.monotonic() + self.refill_interval
+                now = datetime.utcnow()
+                due = self.pop_due(now)
+                if due:
+                    await self.fire(due, now)
+                    continue
+                delay = next_refill - time.monotonic()
+                if self.heap:
+                    delay = min(delay, (self.heap[0][0] - now).total_seconds())
+                self.wakeup.clear()
+                try:
+                    await asyncio.wait_for(self.wakeup.wait(), max(delay, 0))
+                except asyncio.TimeoutError:
+                    pass
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.exception("Reminder scheduler iteration failed")
+                await asyncio.sleep(1)
+
+    async def start(self) -> None:
+        self.runner = asyncio.create_task(self.run())
+
+    async def stop(self) -> None:
+        for task in [self.runner, *self.reloads]:
+            if task is not None:
+                task.cancel()
+                try:
+                    await task
+                except asyncio.CancelledError:
+                    pass
+        self.runner = None
+        self.horizon = None
+        self.heap.clear()
+        self.entries.clear()
+
+    def snapshot(self) -> dict:
+        return {
+            "scheduled": len(self.entries),
+            "heap_size": len(self.heap),
+            "horizon": self.horizon.isoformat() if self.horizon else None,
+            "next_due": self.heap[0][0].isoformat() if self.heap else None,
+            "fired": self.fired,
+            "claimed": self.claimed,
+            "late_seconds_max": self.late_max,
+        }
+
+reminder_scheduler = ReminderScheduler(
+    window=settings.REMINDER_WINDOW_SECONDS,
+    refill_interval=settings.REMINDER_REFILL_SECONDS,
+    grace=settings.REMINDER_GRACE_SECONDS,
+    batch_size=settings.REMINDER_BATCH_SIZE,
+)
+# Events from every replica keep the window current; before start() there is nothing to update.
+manager.add_listener(reminder_scheduler.on_event)
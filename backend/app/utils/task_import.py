@@ -0,0 +1,80 @@
+import csv
+import json
+from typing import AsyncIterator, List, Tuple, Union
+
+Record = Tuple[int, Union[dict, ValueError]]
+
+async def iter_lines(chunks: AsyncIterator[bytes]) -> AsyncIterator[bytes]:
+    # Only each new chunk is split; the unfinished line is kept as parts and joined once it ends,
+    # so a line spread over many chunks costs time linear in its length.
+    pending: List[bytes] = []
+    async for chunk in chunks:
+        *lines, rest = chunk.split(b"\n")
+        if lines:
+            pending.append(lines[0])
+            lines[0] = b"".join(pending)
+            pending = []
+            for line in lines:
+                yield line.rstrip(b"\r")
+        if rest:
+            pending.append(rest)
+    tail = b"".join(pending)
+    if tail.strip():
+        yield tail.rstrip(b"\r")
+
+def decode(line: bytes, first: bool) -> str:
+    return line.decode("utf-8-sig" if first else "utf-8")
+
+async def iter_ndjson(chunks: AsyncIterator[bytes]) -> AsyncIterator[Record]:
+    line_no = 0
+    async for line in iter_lines(chunks):
+        line_no += 1
+        if not line.strip():
+            continue
+        try:
+            record = json.loads(decode(line, line_no == 1))
+        except ValueError as e:
+            yield line_no, ValueError(f"Invalid JSON: {e}")
+            continue
+        if not isinstance(record, dict):
+            yield line_no, ValueError("Each line must be a JSON object")
+            continue
+        yield line_no, record
+
+async def iter_csv(chunks: AsyncIterator[bytes]) -> AsyncIterator[Record]:
+    # Physical lines are joined until quotes balance, so quoted fields may contain newlines
+    # without buffering more than a single record.
+    header = None
+    pending = ""
+    start = line_no = 0
+    async for line in iter_lines(chunks):
+        line_no += 1
+        try:
+            text = decode(line, line_no == 1)
+        except UnicodeDecodeError as e:
+            yield line_no, ValueError(f"Invalid UTF-8: {e}")
+            pending = ""
+            continue
+        if not pending:
+            start = line_no
+            if not text.strip():
+                continue
+        pending = f"{pending}\n{text}" if pending else text
+        if pending.count('"') % 2:
+            continue
+        values = next(csv.reader([pending]))
+        pending = ""
+        if header is None:
+            header = [name.strip() for name in values]
+            continue
+        if len(values) != len(header):
+            yield start, ValueError(f"Expected {len(header)} columns, got {len(values)}")
+            continue
+        yield start, {name: value for name, value in zip(header, values) if value != ""}
+    if pending:
+        yield start, ValueError("Unterminated quoted field")
+
+IMPORT_PARSERS = {
+    "ndjson": iter_ndjson,
+    "csv": iter_csv,
+}
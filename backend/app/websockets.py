@@ -0,0 +1,121 @@
+import asyncio
+import logging
+from typing import Callable, Dict, List, Set, Union
+from fastapi import WebSocket, status
+from fastapi.encoders import jsonable_encoder
+from .config import settings
+from .utils.broker import Broker, create_broker
+
+logger = logging.getLogger(__name__)
+
+RESYNC_MESSAGE = {"event": "resync"}
+
+class Connection:
+    def __init__(self, websocket: WebSocket, user_id: int, queue_size: int):
+        self.websocket = websocket
+        self.user_id = user_id
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=queue_size)
+        self.resync_pending = False
+        self.writer: asyncio.Task | None = None
+
+    def offer(self, message: Union[dict, str]) -> bool:
+        try:
+            self.queue.put_nowait(message)
+            return True
+        except asyncio.QueueFull:
+            pass
+        # The client fell behind: discard the backlog and tell it to refetch. If it is still
+        # behind when the next overflow happens, it gets disconnected instead.
+        if self.resync_pending:
+            return False
+        while not self.queue.empty():
+            self.queue.get_nowait()
+        self.queue.put_nowait(RESYNC_MESSAGE)
+        self.resync_pending = True
+        return True
+
+class ConnectionManager:
+    def __init__(self, broker: Broker):
+        self.broker = broker
+        self.connections: Dict[int, Set[Connection]] = {}
+        self.listeners: List[Callable[[int, dict], None]] = []
+
+    def add_listener(self, listener: Callable[[int, dict], None]):
+        # Called with the user id and message of every event this replica receives, including ones published elsewhere.
+        self.listeners.append(listener)
+
+    async def start(self):
+        await self.broker.start(self.deliver)
+
+    async def stop(self):
+        await self.broker.stop()
+        for connections in list(self.connections.values()):
+            for connection in list(connections):
+                self.drop(connection, code=status.WS_1001_GOING_AWAY)
+
+    async def connect(self, websocket: WebSocket, user_id: int) -> Connection:
+        await websocket.accept()
+        connection = Connection(websocket, user_id, settings.WS_SEND_QUEUE_SIZE)
+        connection.writer = asyncio.create_task(self.write(connection))
+        self.connections.setdefault(user_id, set()).add(connection)
+        return connection
+
+    def disconnect(self, connection: Connection):
+        if connection.writer is not None:
+            connection.writer.cancel()
+        connections = self.connections.get(connection.user_id)
+        if connections is None:
+            return
+        connections.discard(connection)
+        if not connections:
+            del self.connections[connection.user_id]
+
+    def drop(self, connection: Connection, code: int = status.WS_1013_TRY_AGAIN_LATER):
+        self.disconnect(connection)
+        asyncio.create_task(self.close(connection.websocket, code))
+
+    async def close(self, websocket: WebSocket, code: int):
+        try:
+            await websocket.close(code=code)
+        except Exception:
+            pass
+
+    async def write(self, connection: Connection):
+        try:
+            while True:
+                message = await connection.queue.get()
+                if message is RESYNC_MESSAGE:
+                    connection.resync_pending = False
+                if isinstance(message, str):
+                    send = connection.websocket.send_text(message)
+                else:
+                    send = connection.websocket.send_json(message)
+                await asyncio.wait_for(send, timeout=settings.WS_SEND_TIMEOUT_SECONDS)
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            logger.info("Dropping unresponsive WebSocket connection for user %s", connection.user_id)
+            self.drop(connection)
+
+    async def send_personal_message(self, message: Union[dict, str], connection: Connection):
+        if not connection.offer(message):
+            self.drop(connection)
+
+    async def broadcast(self, user_id: int, message: dict):
+        await self.broker.publish({"user_id": user_id, "message": jsonable_encoder(message)})
+
+    async def notify(self, user_id: int, message: dict):
+        # Reaches the listeners on every replica but none of the user's sockets.
+        await self.broker.publish({"user_id": user_id, "message": jsonable_encoder(message), "internal": True})
+
+    async def deliver(self, envelope: dict):
+        for listener in self.listeners:
+            listener(envelope["user_id"], envelope["message"])
+        if envelope.get("internal"):
+            return
+        # Never awaits a socket: messages are queued and each connection's writer task sends them.
+        for connection in list(self.connections.get(envelope["user_id"], ())):
+            if not connection.offer(envelope["message"]):
+                self.drop(connection)
+
+manager = ConnectionManager(create_broker())
@@ -0,0 +1,117 @@
+"""Micro-benchmark: one page of tasks serialized the default way vs. the row-tuple fast path.
+
+    python -m benchmarks.serialization [--page-size 100] [--iterations 500] [--json]
+
+"default" is what GET /tasks/ does with FAST_JSON_RESPONSES off: ORM objects, response_model
+validation through pydantic orm_mode, jsonable_encoder and the stdlib encoder. "fast" reads
+TaskResponse's columns as row tuples, builds dicts with task_row_snapshot and renders them with
+FastJSONResponse (orjson when installed). Both timings include the query.
+"""
+import os
+import tempfile
+
+DB_PATH = os.path.join(tempfile.mkdtemp(prefix="bench-serialization-"), "bench.db")
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{DB_PATH}")
+
+import argparse
+import asyncio
+import json
+import time
+from datetime import datetime, timedelta
+from typing import List
+
+from fastapi.responses import JSONResponse
+from fastapi.routing import serialize_response
+from fastapi.utils import create_response_field
+from sqlalchemy import insert
+
+from app.crud import get_tasks_after, task_row_snapshot
+from app.database import AsyncSessionLocal, Base, async_engine, engine
+from app.models import Task, User
+from app.schemas import TaskResponse
+from app.utils.serialization import FastJSONResponse, orjson
+
+RESPONSE_FIELD = create_response_field(name="response", type_=List[TaskResponse])
+
+
+def seed(count: int) -> int:
+    Base.metadata.create_all(bind=engine)
+    now = datetime(2024, 1, 1)
+    with engine.begin() as connection:
+        user_id = connection.execute(insert(User).values(email="bench@example.com", hashed_password="x")).inserted_primary_key[0]
+        connection.execute(insert(Task), [
+            {
+                "user_id": user_id,
+                "title": f"Task {i}",
+                "description": "Pick up groceries, call the bank and book the dentist" if i % 3 else None,
+                "completed": i % 4 == 0,
+                "due_at": now + timedelta(days=i % 30) if i % 2 else None,
+                "created_at": now + timedelta(minutes=i),
+                "updated_at": now + timedelta(minutes=i),
+            }
+            for i in range(count)
+        ])
+    return user_id
+
+
+async def default_path(user_id: int, limit: int) -> bytes:
+    async with AsyncSessionLocal() as db:
+        tasks = await get_tasks_after(db, user_id=user_id, limit=limit)
+    content = await serialize_response(field=RESPONSE_FIELD, response_content=tasks)
+    return JSONResponse(content).body
+
+
+async def fast_path(user_id: int, limit: int) -> bytes:
+    async with AsyncSessionLocal() as db:
+        rows = await get_tasks_after(db, user_id=user_id, limit=limit, rows=True)
+    return FastJSONResponse([task_row_snapshot(row) for row in rows]).body
+
+
+async def measure(path, user_id: int, limit: int, iterations: int) -> List[float]:
+    for _ in range(min(iterations, 20)):
+        await path(user_id, limit)
+    samples = []
+    for _ in range(iterations):
+        started = time.perf_counter()
+        await path(user_id, limit)
+        samples.append(time.perf_counter() - started)
+    return sorted(samples)
+
+
+def summarize(samples: List[float]) -> dict:
+    return {
+        "mean_us": sum(samples) / len(samples) * 1e6,
+        "p50_us": samples[len(samples) // 2] * 1e6,
+        "p99_us": samples[min(int(len(samples) * 0.99), len(samples) - 1)] * 1e6,
+    }
+
+
+async def main(page_size: int, iterations: int, as_json: bool):
+    user_id = seed(page_size)
+    default_body, fast_body = await default_path(user_id, page_size), await fast_path(user_id, page_size)
+    assert json.loads(default_body) == json.loads(fast_body), "fast path output differs from the default path"
+    results = {
+        "page_size": page_size,
+        "iterations": iterations,
+        "orjson": orjson is not None,
+        "default": summarize(await measure(default_path, user_id, page_size, iterations)),
+        "fast": summarize(await measure(fast_path, user_id, page_size, iterations)),
+    }
+    results["speedup"] = results["default"]["mean_us"] / results["fast"]["mean_us"]
+    await async_engine.dispose()
+    if as_json:
+        print(json.dumps(results, indent=2))
+        return
+    for name in ("default", "fast"):
+        stats = results[name]
+        print(f"{name:>8}: mean {stats['mean_us']:8.0f}us  p50 {stats['p50_us']:8.0f}us  p99 {stats['p99_us']:8.0f}us")
+    print(f"speedup: {results['speedup']:.2f}x ({page_size} tasks per page, orjson={'yes' if results['orjson'] else 'no'})")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare task list serialization paths")
+    parser.add_argument("--page-size", type=int, default=100)
+    parser.add_argument("--iterations", type=int, default=500)
+    parser.add_argument("--json", action="store_true", help="print results as JSON")
+    args = parser.parse_args()
+    asyncio.run(main(args.page_size, args.iterations, args.json))
@@ -0,0 +1,122 @@
+"""Cold-start report: how long a fresh worker takes to import the app, run its startup hooks and
+serve its first request.
+
+    python -m benchmarks.startup [--runs 5] [--database-url URL] [--output startup.json] [--thresholds benchmarks/thresholds.json]
+
+The database is migrated and seeded once; then every run starts a new interpreter, so nothing is
+already imported or connected. Medians and maxima across runs are reported as the "cold_start"
+scenario, which the shared thresholds file can bound (e.g. "cold_start.ready_ms": {"max": 3000}).
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+from typing import Dict, List
+
+METRICS = ("process_ms", "import_ms", "startup_ms", "first_request_ms", "warm_request_ms", "ready_ms")
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Measure API cold start")
+    parser.add_argument("--database-url", default=os.environ.get("BENCH_DATABASE_URL"),
+                        help="SQLite (default: a temporary file) or a local Postgres URL")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--output", help="write results JSON here instead of stdout")
+    parser.add_argument("--thresholds", help="JSON file of limits, shared with benchmarks.suite")
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    return parser.parse_args(argv)
+
+
+def child() -> None:
+    # Runs in the fresh interpreter. Only the standard library is imported before the clock starts.
+    started = time.perf_counter()
+    from app.main import app
+    imported = time.perf_counter()
+    from fastapi.testclient import TestClient
+    client = TestClient(app)
+    startup_began = time.perf_counter()
+    client.__enter__()
+    ready = time.perf_counter()
+    headers = {"Authorization": f"Bearer {os.environ['BENCH_TOKEN']}"}
+    try:
+        timings = []
+        for _ in range(2):
+            request_started = time.perf_counter()
+            response = client.get("/tasks/", params={"limit": 50}, headers=headers)
+            response.raise_for_status()
+            timings.append(time.perf_counter() - request_started)
+    finally:
+        client.__exit__(None, None, None)
+    print(json.dumps({
+        "import_ms": (imported - started) * 1000,
+        "startup_ms": (ready - startup_began) * 1000,
+        "first_request_ms": timings[0] * 1000,
+        "warm_request_ms": timings[1] * 1000,
+        "ready_ms": (imported - started + ready - startup_began + timings[0]) * 1000,
+    }))
+
+
+def measure(env: Dict[str, str]) -> dict:
+    started = time.perf_counter()
+    completed = subprocess.run(
+        [sys.executable, "-m", "benchmarks.startup", "--child"],
+        env=env, capture_output=True, text=True, check=True,
+    )
+    sample = json.loads(completed.stdout.strip().splitlines()[-1])
+    # Interpreter start to exit, including shutdown hooks.
+    sample["process_ms"] = (time.perf_counter() - started) * 1000
+    return sample
+
+
+def summarize(samples: List[dict]) -> dict:
+    result = {"runs": len(samples)}
+    for metric in METRICS:
+        values = [sample[metric] for sample in samples]
+        result[metric] = statistics.median(values)
+        result[f"{metric.rsplit('_', 1)[0]}_max_ms"] = max(values)
+    return result
+
+
+def main(argv=None) -> int:
+    args = parse_args(argv)
+    if args.child:
+        child()
+        return 0
+    os.environ["DATABASE_URL"] = args.database_url or "sqlite:///" + os.path.join(tempfile.mkdtemp(prefix="startup-"), "startup.db")
+    from app.database import engine, upgrade_database
+    from benchmarks.suite import check_thresholds, seed
+
+    upgrade_database()
+    account = seed(1, 200)[0]
+    env = dict(os.environ, BENCH_TOKEN=account["token"])
+    samples = [measure(env) for _ in range(args.runs)]
+    report = {
+        "meta": {
+            "timestamp": datetime.utcnow().isoformat(),
+            "python": sys.version.split()[0],
+            "database": engine.dialect.name,
+        },
+        "results": {"cold_start": summarize(samples)},
+        "samples": samples,
+    }
+    if args.thresholds:
+        with open(args.thresholds) as f:
+            report["violations"] = check_thresholds(report["results"], json.load(f))
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output + "\n")
+    else:
+        print(output)
+    for violation in report.get("violations", []):
+        print(f"REGRESSION: {violation}", file=sys.stderr)
+    return 1 if report.get("violations") else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,295 @@
+"""Load and latency benchmarks for the API, run in-process.
+
+    python -m benchmarks.suite [--database-url URL] [--output results.json] [--thresholds benchmarks/thresholds.json]
+
+Boots the FastAPI app with its startup hooks, seeds users and tasks, then drives each scenario
+through the ASGI test client from --concurrency threads. Every scenario reports p50/p90/p99/max
+latency in milliseconds and throughput in requests per second. Results are written as JSON; with
+--thresholds the run exits non-zero if any limit is broken, so it can gate CI.
+"""
+import argparse
+import json
+import os
+import platform
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from typing import Callable, Dict, List
+
+PASSWORD = "benchmark-password"
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the API in-process")
+    parser.add_argument("--database-url", default=os.environ.get("BENCH_DATABASE_URL"),
+                        help="SQLite (default: a temporary file) or a local Postgres URL")
+    parser.add_argument("--users", type=int, default=20)
+    parser.add_argument("--tasks-per-user", type=int, default=500)
+    parser.add_argument("--requests", type=int, default=500, help="requests per scenario")
+    parser.add_argument("--login-requests", type=int, default=50, help="requests for the (bcrypt-bound) login scenario")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--page-size", type=int, default=50)
+    parser.add_argument("--ws-clients", type=int, default=50, help="WebSocket connections receiving each broadcast")
+    parser.add_argument("--ws-events", type=int, default=100)
+    parser.add_argument("--scenarios", help="comma-separated subset of scenarios to run")
+    parser.add_argument("--output", help="write results JSON here instead of stdout")
+    parser.add_argument("--thresholds", help="JSON file of limits, e.g. {\"list_tasks.p99_ms\": {\"max\": 50}}")
+    return parser.parse_args(argv)
+
+
+def percentile(samples: List[float], fraction: float) -> float:
+    return samples[min(int(len(samples) * fraction), len(samples) - 1)]
+
+
+def summarize(samples: List[float], elapsed: float, errors: int) -> dict:
+    samples = sorted(samples)
+    return {
+        "requests": len(samples),
+        "errors": errors,
+        "p50_ms": percentile(samples, 0.50) * 1000,
+        "p90_ms": percentile(samples, 0.90) * 1000,
+        "p99_ms": percentile(samples, 0.99) * 1000,
+        "max_ms": samples[-1] * 1000,
+        "mean_ms": sum(samples) / len(samples) * 1000,
+        "throughput_rps": len(samples) / elapsed,
+    }
+
+
+def run_load(operation: Callable[[int], bool], count: int, concurrency: int) -> dict:
+    # operation(i) performs one request and returns whether it succeeded; its wall time is the sample.
+    samples: List[float] = []
+    errors = 0
+    lock = threading.Lock()
+
+    def timed(i: int):
+        nonlocal errors
+        started = time.perf_counter()
+        ok = operation(i)
+        elapsed = time.perf_counter() - started
+        with lock:
+            samples.append(elapsed)
+            errors += 0 if ok else 1
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(timed, range(count)))
+    return summarize(samples, time.perf_counter() - started, errors)
+
+
+def seed(users: int, tasks_per_user: int) -> List[dict]:
+    # Inserted directly, not through the API: seeding is not what is being measured.
+    from sqlalchemy import insert
+    from app.api.auth import create_access_token
+    from app.database import engine
+    from app.models import Task, User
+    from app.utils.hashing import hash_password
+
+    run_id = int(time.time() * 1000)
+    hashed = hash_password(PASSWORD)
+    now = datetime.utcnow()
+    accounts = []
+    with engine.begin() as connection:
+        for n in range(users):
+            email = f"bench-{run_id}-{n}@example.com"
+            user_id = connection.execute(
+                insert(User).values(email=email, hashed_password=hashed, is_active=True)
+            ).inserted_primary_key[0]
+            connection.execute(insert(Task), [
+                {
+                    "user_id": user_id,
+                    "title": f"Task {i} for user {n}",
+                    "description": "Pick up groceries, call the bank and book the dentist" if i % 3 else None,
+                    "completed": i % 4 == 0,
+                    "due_at": now + timedelta(days=30 + i % 60) if i % 2 else None,
+                    "created_at": now - timedelta(minutes=tasks_per_user - i),
+                    "updated_at": now - timedelta(minutes=tasks_per_user - i),
+                }
+                for i in range(tasks_per_user)
+            ])
+            accounts.append({"id": user_id, "email": email, "token": create_access_token({"sub": email})})
+    return accounts
+
+
+def auth(account: dict) -> Dict[str, str]:
+    return {"Authorization": f"Bearer {account['token']}"}
+
+
+def scenario_login(client, accounts: List[dict], args) -> dict:
+    def login(i: int) -> bool:
+        account = accounts[i % len(accounts)]
+        response = client.post("/token", data={"username": account["email"], "password": PASSWORD})
+        return response.status_code == 200
+    return run_load(login, args.login_requests, args.concurrency)
+
+
+def scenario_task_crud(client, accounts: List[dict], args) -> Dict[str, dict]:
+    created: Dict[int, List[int]] = {}
+    lock = threading.Lock()
+
+    def create(i: int) -> bool:
+        account = accounts[i % len(accounts)]
+        response = client.post("/tasks/", json={"title": f"Benchmark task {i}", "description": "created by the benchmark"}, headers=auth(account))
+        if response.status_code != 201:
+            return False
+        with lock:
+            created.setdefault(i % len(accounts), []).append(response.json()["id"])
+        return True
+
+    results = {"create_task": run_load(create, args.requests, args.concurrency)}
+    # Operate on the tasks just created so every request hits an existing row exactly once.
+    targets = [(owner, task_id) for owner, ids in sorted(created.items()) for task_id in ids]
+    count = len(targets)
+
+    def read(i: int) -> bool:
+        owner, task_id = targets[i]
+        return client.get(f"/tasks/{task_id}", headers=auth(accounts[owner])).status_code == 200
+
+    def update(i: int) -> bool:
+        owner, task_id = targets[i]
+        response = client.put(f"/tasks/{task_id}", json={"completed": True, "title": f"Updated {task_id}"}, headers=auth(accounts[owner]))
+        return response.status_code == 200
+
+    def delete(i: int) -> bool:
+        owner, task_id = targets[i]
+        return client.delete(f"/tasks/{task_id}", headers=auth(accounts[owner])).status_code == 204
+
+    results["read_task"] = run_load(read, count, args.concurrency)
+    results["update_task"] = run_load(update, count, args.concurrency)
+    results["delete_task"] = run_load(delete, count, args.concurrency)
+    return results
+
+
+def scenario_list_tasks(client, accounts: List[dict], args) -> dict:
+    # Each user walks its task list page by page through X-Next-Cursor, starting over at the end,
+    # so reads spread over the whole table instead of one hot (cached) first page.
+    cursors: Dict[int, str] = {}
+    lock = threading.Lock()
+
+    def list_page(i: int) -> bool:
+        owner = i % len(accounts)
+        with lock:
+            cursor = cursors.pop(owner, None)
+        params = {"limit": args.page_size, "sort": "-updated_at"}
+        if cursor:
+            params["cursor"] = cursor
+        response = client.get("/tasks/", params=params, headers=auth(accounts[owner]))
+        next_cursor = response.headers.get("X-Next-Cursor")
+        if next_cursor:
+            with lock:
+                cursors[owner] = next_cursor
+        return response.status_code == 200
+    return run_load(list_page, args.requests, args.concurrency)
+
+
+def scenario_ws_fanout(client, accounts: List[dict], args) -> dict:
+    # ws_clients sockets subscribe as one user; a sample is the time from issuing a task write until
+    # the last socket has received the resulting event.
+    account = accounts[0]
+    sockets = []
+    samples: List[float] = []
+    errors = 0
+    try:
+        for _ in range(args.ws_clients):
+            websocket = client.websocket_connect(f"/ws/tasks?token={account['token']}")
+            sockets.append(websocket.__enter__())
+        started_all = time.perf_counter()
+        for i in range(args.ws_events):
+            started = time.perf_counter()
+            response = client.post("/tasks/", json={"title": f"Fan-out {i}"}, headers=auth(account))
+            if response.status_code != 201:
+                errors += 1
+                continue
+            task_id = response.json()["id"]
+            for websocket in sockets:
+                while True:
+                    message = websocket.receive_json()
+                    if message.get("event") == "task_created" and message["task"]["id"] == task_id:
+                        break
+            samples.append(time.perf_counter() - started)
+        result = summarize(samples, time.perf_counter() - started_all, errors)
+    finally:
+        for websocket in sockets:
+            websocket.__exit__(None, None, None)
+    result["clients"] = args.ws_clients
+    result["deliveries_per_second"] = result["throughput_rps"] * args.ws_clients
+    return result
+
+
+SCENARIOS = {
+    "login": scenario_login,
+    "task_crud": scenario_task_crud,
+    "list_tasks": scenario_list_tasks,
+    "ws_fanout": scenario_ws_fanout,
+}
+
+
+def check_thresholds(results: Dict[str, dict], thresholds: Dict[str, dict]) -> List[str]:
+    # Keys are "<scenario>.<metric>"; values are {"max": x} and/or {"min": y}. Missing scenarios are skipped.
+    violations = []
+    for key, limits in sorted(thresholds.items()):
+        scenario, metric = key.rsplit(".", 1)
+        if scenario not in results:
+            continue
+        value = results[scenario][metric]
+        if "max" in limits and value > limits["max"]:
+            violations.append(f"{key} = {value:.2f} exceeds max {limits['max']}")
+        if "min" in limits and value < limits["min"]:
+            violations.append(f"{key} = {value:.2f} is below min {limits['min']}")
+    return violations
+
+
+def main(argv=None) -> int:
+    args = parse_args(argv)
+    # Settings are read when the app is imported, so the database has to be chosen first.
+    os.environ["DATABASE_URL"] = args.database_url or "sqlite:///" + os.path.join(tempfile.mkdtemp(prefix="bench-"), "bench.db")
+    # Measure the API itself: one benchmark user sends far more than a client's rate limit, and load
+    # shedding would turn the latency being measured into 503s.
+    os.environ.setdefault("RATE_LIMIT_ENABLED", "false")
+    os.environ.setdefault("LOAD_SHED_ENABLED", "false")
+    from fastapi.testclient import TestClient
+    from app.database import engine, upgrade_database
+    from app.main import app
+
+    selected = args.scenarios.split(",") if args.scenarios else list(SCENARIOS)
+    unknown = set(selected) - set(SCENARIOS)
+    if unknown:
+        raise SystemExit(f"unknown scenarios: {', '.join(sorted(unknown))}")
+    upgrade_database()
+    accounts = seed(args.users, args.tasks_per_user)
+    results: Dict[str, dict] = {}
+    with TestClient(app) as client:
+        for name in selected:
+            outcome = SCENARIOS[name](client, accounts, args)
+            # task_crud reports one entry per endpoint.
+            results.update(outcome if name == "task_crud" else {name: outcome})
+    report = {
+        "meta": {
+            "timestamp": datetime.utcnow().isoformat(),
+            "python": platform.python_version(),
+            "database": engine.dialect.name,
+            "users": args.users,
+            "tasks_per_user": args.tasks_per_user,
+            "concurrency": args.concurrency,
+            "page_size": args.page_size,
+        },
+        "results": results,
+    }
+    if args.thresholds:
+        with open(args.thresholds) as f:
+            report["violations"] = check_thresholds(results, json.load(f))
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output + "\n")
+    else:
+        print(output)
+    for violation in report.get("violations", []):
+        print(f"REGRESSION: {violation}", file=sys.stderr)
+    return 1 if report.get("violations") else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,32 @@
+import os
+import tempfile
+
+import pytest
+from fastapi.testclient import TestClient
+
+# Modules that boot the app need a database every connection can see; an in-memory SQLite URL
+# would give each connection its own empty database.
+os.environ.setdefault("DATABASE_URL", "sqlite:///" + os.path.join(tempfile.mkdtemp(prefix="tests-"), "app.db"))
+
+# The app does not create its schema; migrate the test database the way a deploy does.
+from app.database import upgrade_database  # noqa: E402
+
+upgrade_database()
+
+from app.main import app  # noqa: E402
+
+
+def access_token(client, email):
+    # Registering an existing email fails harmlessly, so tests can log the same user in again.
+    client.post("/register", json={"email": email, "password": "secret123"})
+    return client.post("/token", data={"username": email, "password": "secret123"}).json()["access_token"]
+
+
+def login(client, email):
+    return {"Authorization": f"Bearer {access_token(client, email)}"}
+
+
+@pytest.fixture(scope="module")
+def client():
+    with TestClient(app) as client:
+        yield client
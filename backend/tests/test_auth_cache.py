@@ -0,0 +1,62 @@
+import pytest
+
+from app.api.auth import principal_cache
+from app.crud import get_user_by_email
+from app.database import AsyncSessionLocal
+from app.websockets import manager
+
+from .conftest import login
+
+EMAIL = "principal@example.com"
+
+
+@pytest.fixture(scope="module")
+def client(client):
+    client.headers.update(login(client, EMAIL))
+    return client
+
+
+def set_active(active, commit=True):
+    # Runs the update in the app's event loop, like an admin endpoint or another request would.
+    async def update():
+        async with AsyncSessionLocal() as db:
+            user = await get_user_by_email(db, email=EMAIL)
+            user.is_active = active
+            await db.flush()
+            if commit:
+                await db.commit()
+            else:
+                await db.rollback()
+
+    return update
+
+
+def run_in_app(client, coroutine_function):
+    client.portal.call(coroutine_function)
+
+
+def test_rolled_back_update_keeps_the_cached_principal(client):
+    assert client.get("/users/me").status_code == 200
+    assert principal_cache.get(EMAIL) is not None
+    run_in_app(client, set_active(False, commit=False))
+    assert principal_cache.get(EMAIL) is not None
+    assert client.get("/users/me").status_code == 200
+
+
+def test_deactivated_user_is_rejected_on_the_next_request(client):
+    assert client.get("/users/me").status_code == 200
+    assert principal_cache.get(EMAIL) is not None
+    run_in_app(client, set_active(False))
+    assert principal_cache.get(EMAIL) is None
+    assert client.get("/users/me").status_code == 401
+    run_in_app(client, set_active(True))
+    assert client.get("/users/me").status_code == 200
+
+
+def test_evictions_from_other_processes_arrive_through_the_broker(client):
+    assert client.get("/users/me").status_code == 200
+    assert principal_cache.get(EMAIL) is not None
+    # What another process publishes after committing a change to this user.
+    envelope = {"user_id": None, "message": {"event": "principal_invalidated", "email": EMAIL}, "internal": True}
+    run_in_app(client, lambda: manager.deliver(envelope))
+    assert principal_cache.get(EMAIL) is None
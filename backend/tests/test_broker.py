@@ -0,0 +1,82 @@
+import asyncio
+import json
+
+import pytest
+
+from app.utils.broker import RedisBroker
+from app.websockets import manager
+
+from .conftest import login
+
+
+class FailingBroker:
+    async def publish(self, message):
+        raise ConnectionError("broker unavailable")
+
+
+@pytest.fixture(scope="module")
+def client(client):
+    client.headers.update(login(client, "broker@example.com"))
+    return client
+
+
+def test_publish_failure_does_not_fail_a_committed_write(client, monkeypatch):
+    monkeypatch.setattr(manager, "broker", FailingBroker())
+    response = client.post("/tasks/", json={"title": "saved anyway"})
+    assert response.status_code == 201
+    task_id = response.json()["id"]
+    assert client.put(f"/tasks/{task_id}", json={"completed": True}).status_code == 200
+    assert client.post("/tasks/batch", json={"tasks": [{"title": "batch"}]}).status_code == 201
+    monkeypatch.undo()
+    titles = [task["title"] for task in client.get("/tasks/", params={"limit": 100}).json()]
+    assert titles.count("saved anyway") == 1
+
+
+class FakePubSub:
+    def __init__(self, subscriptions):
+        self.subscriptions = subscriptions
+        self.closed = False
+
+    async def subscribe(self, channel):
+        self.messages = self.subscriptions.pop(0)
+
+    async def listen(self):
+        for message in self.messages:
+            if isinstance(message, Exception):
+                raise message
+            yield {"data": message}
+        await asyncio.Event().wait()
+
+    async def close(self):
+        self.closed = True
+
+
+def test_redis_subscriber_survives_bad_messages_and_errors(monkeypatch):
+    # The first subscription dies with a non-Redis error; the second carries a malformed message
+    # and one whose handler fails between two good ones.
+    subscriptions = [[RuntimeError("protocol error")], [json.dumps({"n": 1}), b"not json", json.dumps({"n": 2}), json.dumps({"n": 3})]]
+    pubsubs = []
+
+    class FakeRedis:
+        def pubsub(self, ignore_subscribe_messages):
+            pubsubs.append(FakePubSub(subscriptions))
+            return pubsubs[-1]
+
+    monkeypatch.setattr("app.utils.broker.get_redis", FakeRedis)
+    received = []
+
+    async def handler(message):
+        if message["n"] == 2:
+            raise ValueError("handler failed")
+        received.append(message["n"])
+
+    async def scenario():
+        broker = RedisBroker("test", retry_delay=0)
+        await broker.start(handler)
+        while len(received) < 2:
+            await asyncio.sleep(0.01)
+        await broker.stop()
+
+    asyncio.run(asyncio.wait_for(scenario(), timeout=5))
+    assert received == [1, 3]
+    assert len(pubsubs) == 2 and all(pubsub.closed for pubsub in pubsubs)
@@ -0,0 +1,27 @@
+import asyncio
+
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import create_async_engine
+
+from app.database import keep_connect_lock_async
+
+
+def test_concurrent_first_connections_after_dispose_do_not_deadlock():
+    async def scenario():
+        engine = create_async_engine("sqlite+aiosqlite://")
+        keep_connect_lock_async(engine.sync_engine)
+
+        async def query():
+            async with engine.connect() as connection:
+                return (await connection.execute(text("SELECT 1"))).scalar()
+
+        await query()
+        # What the lifespan shutdown and gunicorn's post_fork hook do.
+        await engine.dispose()
+        engine.sync_engine.dispose(close=False)
+        # A deadlock blocks the loop itself, so wait_for could not fire; the test would hang instead.
+        results = await asyncio.wait_for(asyncio.gather(*(query() for _ in range(5))), 5)
+        await engine.dispose()
+        return results
+
+    assert asyncio.run(scenario()) == [1] * 5
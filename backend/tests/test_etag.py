@@ -0,0 +1,58 @@
+import pytest
+
+from app.utils.etag import etag_matches
+
+from .conftest import login
+
+
+@pytest.fixture(scope="module")
+def client(client):
+    client.headers.update(login(client, "etag@example.com"))
+    return client
+
+
+def test_etag_matches():
+    assert etag_matches('"a", "b"', '"b"')
+    assert etag_matches('W/"a"', '"a"')
+    assert not etag_matches('W/"a"', '"a"', weak=False)
+    assert etag_matches("*", '"a"', weak=False)
+    assert not etag_matches(None, '"a"')
+
+
+def test_task_read_is_not_modified_until_the_task_changes(client):
+    task_id = client.post("/tasks/", json={"title": "cached"}).json()["id"]
+    first = client.get(f"/tasks/{task_id}")
+    etag = first.headers["ETag"]
+    not_modified = client.get(f"/tasks/{task_id}", headers={"If-None-Match": etag})
+    assert not_modified.status_code == 304
+    assert not_modified.headers["ETag"] == etag
+    assert not_modified.content == b""
+
+    updated = client.put(f"/tasks/{task_id}", json={"title": "changed"})
+    assert updated.headers["ETag"] != etag
+    modified = client.get(f"/tasks/{task_id}", headers={"If-None-Match": etag})
+    assert modified.status_code == 200
+    assert modified.json()["title"] == "changed"
+    assert modified.headers["ETag"] == updated.headers["ETag"]
+
+
+def test_update_with_a_stale_if_match_fails(client):
+    task_id = client.post("/tasks/", json={"title": "contended"}).json()["id"]
+    etag = client.get(f"/tasks/{task_id}").headers["ETag"]
+    first = client.put(f"/tasks/{task_id}", json={"title": "first writer"}, headers={"If-Match": etag})
+    assert first.status_code == 200
+    second = client.put(f"/tasks/{task_id}", json={"title": "second writer"}, headers={"If-Match": etag})
+    assert second.status_code == 412
+    assert client.get(f"/tasks/{task_id}").json()["title"] == "first writer"
+    # Weak validators never satisfy If-Match.
+    weak = client.put(f"/tasks/{task_id}", json={"title": "weak"}, headers={"If-Match": "W/" + first.headers["ETag"]})
+    assert weak.status_code == 412
+
+
+def test_task_list_etag_changes_on_any_write(client):
+    etag = client.get("/tasks/").headers["ETag"]
+    assert client.get("/tasks/", headers={"If-None-Match": etag}).status_code == 304
+    # Different query parameters are a different representation.
+    assert client.get("/tasks/", params={"limit": 5}, headers={"If-None-Match": etag}).status_code == 200
+    client.post("/tasks/", json={"title": "new"})
+    assert client.get("/tasks/", headers={"If-None-Match": etag}).status_code == 200
@@ -0,0 +1,28 @@
+import threading
+import time
+
+from app.utils.hashing import hash_pool
+
+from .conftest import login
+
+
+def test_logins_beyond_the_queue_limit_get_503_with_retry_after(client):
+    login(client, "hashing@example.com")
+    release = threading.Event()
+    # Stand-ins for slow hashes: occupy every worker and every queue slot from the app's loop.
+    slow = [client.portal.start_task_soon(hash_pool.run, release.wait, 10) for _ in range(hash_pool.max_pending)]
+    try:
+        deadline = time.monotonic() + 5
+        while hash_pool.pending < hash_pool.max_pending and time.monotonic() < deadline:
+            time.sleep(0.01)
+        assert hash_pool.queue_depth == hash_pool.max_pending - hash_pool.workers
+        rejected = hash_pool.rejected
+        response = client.post("/token", data={"username": "hashing@example.com", "password": "secret123"})
+        assert response.status_code == 503
+        assert response.headers["Retry-After"] == "1"
+        assert hash_pool.rejected == rejected + 1
+    finally:
+        release.set()
+        for future in slow:
+            future.result(timeout=10)
+    assert client.post("/token", data={"username": "hashing@example.com", "password": "secret123"}).status_code == 200
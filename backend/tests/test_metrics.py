@@ -0,0 +1,26 @@
+from fastapi.testclient import TestClient
+from prometheus_client import CollectorRegistry, generate_latest
+
+from app.main import app
+from app.utils.metrics import SnapshotCollector
+
+
+def test_snapshot_counters_and_gauges():
+    registry = CollectorRegistry()
+    snapshot = {"sent": 3, "latency_seconds_total": 1.5, "queue_depth": 2, "horizon": None, "healthy": True}
+    registry.register(SnapshotCollector("worker", lambda: snapshot, "Worker", counters=("sent", "latency_seconds_total")))
+    text = generate_latest(registry).decode()
+    assert "# TYPE worker_sent_total counter" in text
+    assert "worker_sent_total 3.0" in text
+    assert "# TYPE worker_latency_seconds_total counter" in text
+    assert "# TYPE worker_queue_depth gauge" in text
+    assert "horizon" not in text and "healthy" not in text
+
+
+def test_metrics_endpoint_types_component_totals_as_counters():
+    with TestClient(app) as client:
+        text = client.get("/metrics").text
+    for counter in ("notification_worker_sent", "notification_worker_dead_lettered", "task_list_cache_hits", "hash_pool_completed", "replicas_primary_reads"):
+        assert f"# TYPE {counter}_total counter" in text
+    for gauge in ("notification_worker_lag_seconds_max", "task_list_cache_size", "hash_pool_in_flight"):
+        assert f"# TYPE {gauge} gauge" in text
@@ -0,0 +1,55 @@
+import os
+import tempfile
+
+import pytest
+
+from alembic.autogenerate import compare_metadata
+from alembic.migration import MigrationContext
+from sqlalchemy import create_engine, inspect, text
+
+from app.database import BASELINE_REVISION, Base, SchemaMismatchError, upgrade_database
+from app.models.task import is_search_object
+
+
+def include_object(obj, name, type_, reflected, compare_to):
+    return not (reflected and compare_to is None and is_search_object(name))
+
+
+def temp_url(name):
+    return "sqlite:///" + os.path.join(tempfile.mkdtemp(prefix="migrations-"), name)
+
+
+def test_migrations_match_the_models():
+    # A model change without a migration shows up here as a non-empty diff.
+    url = temp_url("migrated.db")
+    upgrade_database(url)
+    engine = create_engine(url)
+    with engine.connect() as connection:
+        context = MigrationContext.configure(connection, opts={"include_object": include_object})
+        assert compare_metadata(context, Base.metadata) == []
+        assert "tasks_fts" in inspect(connection).get_table_names()
+    engine.dispose()
+
+
+def test_databases_created_by_create_all_are_stamped_not_recreated():
+    url = temp_url("legacy.db")
+    engine = create_engine(url)
+    Base.metadata.create_all(engine)
+    with engine.begin() as connection:
+        connection.execute(text("INSERT INTO users (email, hashed_password) VALUES ('legacy@example.com', 'x')"))
+    upgrade_database(url)
+    with engine.connect() as connection:
+        assert connection.execute(text("SELECT version_num FROM alembic_version")).scalar() == BASELINE_REVISION
+        assert connection.execute(text("SELECT count(*) FROM users")).scalar() == 1
+    engine.dispose()
+
+
+def test_partial_legacy_databases_are_not_stamped():
+    url = temp_url("partial.db")
+    engine = create_engine(url)
+    Base.metadata.create_all(engine, tables=[Base.metadata.tables["users"], Base.metadata.tables["tasks"]])
+    with pytest.raises(SchemaMismatchError, match="refusing to stamp.*add_table task_stats"):
+        upgrade_database(url)
+    with engine.connect() as connection:
+        assert "alembic_version" not in inspect(connection).get_table_names()
+    engine.dispose()
@@ -0,0 +1,133 @@
+import asyncio
+import time
+
+from app.utils.notifications import InMemoryNotificationQueue, NotificationWorker
+
+
+def make_job(job_id):
+    return {"id": job_id, "user_id": 1, "type": "reminder", "message": f"job {job_id}", "attempts": 0, "enqueued_at": time.time()}
+
+
+def make_worker(queue, sender, writes, **options):
+    async def status_writer(statuses):
+        writes.append(statuses)
+
+    defaults = dict(
+        concurrency=4, batch_size=10, flush_interval=0.05, max_attempts=3,
+        backoff_base=0.01, backoff_max=0.02, send_timeout=1.0,
+    )
+    defaults.update(options)
+    return NotificationWorker(queue, sender, status_writer, **defaults)
+
+
+async def run_until(worker, condition, timeout=5.0):
+    await worker.start()
+    deadline = time.monotonic() + timeout
+    while not condition() and time.monotonic() < deadline:
+        await asyncio.sleep(0.01)
+    await worker.stop()
+
+
+def final_statuses(writes):
+    return {row["id"]: row for batch in writes for row in batch}
+
+
+def test_sends_with_bounded_concurrency_and_batched_writes():
+    active = 0
+    peak = 0
+
+    async def sender(job):
+        nonlocal active, peak
+        active += 1
+        peak = max(peak, active)
+        await asyncio.sleep(0.01)
+        active -= 1
+
+    async def scenario():
+        queue = InMemoryNotificationQueue()
+        writes = []
+        worker = make_worker(queue, sender, writes)
+        await queue.put([make_job(i) for i in range(50)])
+        await run_until(worker, lambda: worker.sent == 50)
+        return worker, writes
+
+    worker, writes = asyncio.run(scenario())
+    assert worker.sent == 50
+    assert peak <= 4
+    assert len(writes) < 50
+    assert {row["status"] for row in final_statuses(writes).values()} == {"sent"}
+
+
+def test_retries_then_dead_letters():
+    calls = {}
+
+    async def sender(job):
+        calls[job["id"]] = calls.get(job["id"], 0) + 1
+        if job["id"] == 2 or calls[job["id"]] == 1:
+            raise RuntimeError("provider unavailable")
+
+    async def scenario():
+        queue = InMemoryNotificationQueue()
+        writes = []
+        worker = make_worker(queue, sender, writes)
+        await queue.put([make_job(1), make_job(2)])
+        await run_until(worker, lambda: worker.sent == 1 and worker.dead_lettered == 1)
+        return worker, queue, writes
+
+    worker, queue, writes = asyncio.run(scenario())
+    statuses = final_statuses(writes)
+    assert statuses[1]["status"] == "sent" and statuses[1]["attempts"] == 1
+    assert statuses[2]["status"] == "dead" and statuses[2]["attempts"] == 3
+    assert calls == {1: 2, 2: 3}
+    assert [job["id"] for job in queue.dead] == [2]
+    assert worker.retried == 3
+
+
+def test_failed_status_write_is_retried_without_losing_the_job():
+    attempts = 0
+
+    async def sender(job):
+        pass
+
+    async def flaky_writer(statuses):
+        nonlocal attempts
+        attempts += 1
+        if attempts == 1:
+            raise RuntimeError("database unavailable")
+        writes.append(statuses)
+
+    async def scenario():
+        worker = NotificationWorker(
+            InMemoryNotificationQueue(), sender, flaky_writer, concurrency=2, batch_size=1, flush_interval=0.05,
+            max_attempts=3, backoff_base=0.01, backoff_max=0.02, send_timeout=1.0,
+        )
+        await worker.slots.acquire()
+        # The batch-size flush inside record() fails; process() must still finish cleanly.
+        await worker.process("receipt-1", make_job(1))
+        assert writes == [] and 1 in worker.statuses
+        await worker.flush()
+        return worker
+
+    writes = []
+    worker = asyncio.run(scenario())
+    assert worker.sent == 1
+    assert attempts == 2
+    assert final_statuses(writes)[1]["status"] == "sent"
+    assert worker.statuses == {} and worker.receipts == []
+
+
+def test_queue_depth_is_sampled_for_the_metrics_collector():
+    async def sender(job):
+        await asyncio.sleep(10)
+
+    async def scenario():
+        queue = InMemoryNotificationQueue()
+        worker = make_worker(queue, sender, [], concurrency=1)
+        await queue.put([make_job(i) for i in range(5)])
+        await run_until(worker, lambda: worker.queue_depth == 4)
+        return worker
+
+    worker = asyncio.run(scenario())
+    stats = worker.stats()
+    assert stats["queue_depth"] == 4
+    assert "lag_seconds_max" in stats
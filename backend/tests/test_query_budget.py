@@ -0,0 +1,72 @@
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from sqlalchemy import select
+
+from app.config import settings
+from app.database import AsyncSessionLocal
+from app.main import app
+from app.models import Task
+from app.schemas import MAX_BATCH_SIZE
+from app.utils.metrics import MetricsMiddleware, QueryBudgetExceeded, fingerprint, query_budget
+
+from .conftest import login
+
+
+@pytest.fixture(scope="module")
+def client():
+    strict = settings.QUERY_BUDGET_STRICT
+    settings.QUERY_BUDGET_STRICT = True
+    with TestClient(app) as client:
+        yield client
+    settings.QUERY_BUDGET_STRICT = strict
+
+
+@pytest.fixture(scope="module")
+def headers(client):
+    return login(client, "budget@example.com")
+
+
+def test_task_endpoints_stay_within_their_budgets(client, headers):
+    # Strict mode turns any over-budget request into an exception raised out of the test client.
+    created = client.post("/tasks/", json={"title": "first"}, headers=headers).json()
+    client.post("/tasks/batch", json={"tasks": [{"title": f"batch {i}"} for i in range(20)]}, headers=headers)
+    assert client.get("/tasks/", params={"limit": 100}, headers=headers).status_code == 200
+    assert client.get("/tasks/", params={"limit": 10, "completed": False, "sort": "-updated_at"}, headers=headers).status_code == 200
+    assert client.get(f"/tasks/{created['id']}", headers=headers).status_code == 200
+    assert client.put(f"/tasks/{created['id']}", json={"completed": True}, headers=headers).status_code == 200
+    # Worst case for a batch update: every item a different change set, so one UPDATE (and a count
+    # of completion flips) per item.
+    batch = client.post("/tasks/batch", json={"tasks": [{"title": f"mixed {i}"} for i in range(MAX_BATCH_SIZE)]}, headers=headers).json()
+    mixed = [{"id": task["id"], "title": f"renamed {i}", "completed": i % 2 == 0} for i, task in enumerate(batch)]
+    assert client.patch("/tasks/batch", json={"tasks": mixed}, headers=headers).status_code == 200
+    assert client.get("/tasks/stats", headers=headers).status_code == 200
+    assert client.get("/tasks/search", params={"q": "batch"}, headers=headers).status_code == 200
+    assert client.get("/tasks/export", headers=headers).status_code == 200
+    assert client.delete(f"/tasks/{created['id']}", headers=headers).status_code == 204
+    assert client.get("/users/me", headers=headers).status_code == 200
+
+
+def test_over_budget_request_fails_in_strict_mode(client):
+    # A separate app, so the deliberately bad route never joins the real one.
+    n_plus_one = FastAPI()
+    n_plus_one.add_middleware(MetricsMiddleware)
+
+    @n_plus_one.get("/test/n-plus-one", dependencies=[query_budget(2)])
+    async def one_query_per_task():
+        async with AsyncSessionLocal() as db:
+            ids = (await db.execute(select(Task.id).limit(5))).scalars().all()
+            for task_id in ids:
+                await db.get(Task, task_id)
+        return {"loaded": len(ids)}
+
+    with pytest.raises(QueryBudgetExceeded, match="/test/n-plus-one issued 6 queries"):
+        TestClient(n_plus_one).get("/test/n-plus-one")
+
+
+def test_fingerprint_ignores_literals_and_in_list_length():
+    short = fingerprint("SELECT * FROM tasks WHERE user_id = $1 AND id IN ($2, $3)")
+    long = fingerprint("SELECT * FROM tasks WHERE user_id = $1 AND id IN ($2, $3, $4, $5)")
+    literal = fingerprint("SELECT * FROM tasks WHERE user_id = 42 AND id IN (7)")
+    assert short == long == literal
+    assert short[1] == "SELECT * FROM tasks WHERE user_id = ? AND id IN (?+)"
@@ -0,0 +1,102 @@
+import asyncio
+import time
+
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from app.api.auth import create_access_token
+from app.utils.load_shedding import LoadShedder, LoadSheddingMiddleware
+from app.utils.metrics import RecentAverage, recent_pool_wait
+from app.utils.rate_limit import InMemoryRateLimiter, RateLimitMiddleware, RedisRateLimiter
+
+
+def make_app():
+    app = FastAPI()
+
+    @app.get("/ping")
+    async def ping():
+        return {"ok": True}
+
+    @app.get("/metrics")
+    async def metrics():
+        return {}
+
+    return app
+
+
+def test_token_bucket_allows_a_burst_then_refills():
+    limiter = InMemoryRateLimiter(rate=10, burst=2, max_keys=100)
+
+    async def scenario():
+        assert await limiter.acquire("a") == 0
+        assert await limiter.acquire("a") == 0
+        wait = await limiter.acquire("a")
+        assert 0 < wait <= 0.1
+        # Other keys have their own bucket.
+        assert await limiter.acquire("b") == 0
+        await asyncio.sleep(0.15)
+        assert await limiter.acquire("a") == 0
+
+    asyncio.run(scenario())
+
+
+def test_least_recently_used_buckets_are_evicted():
+    limiter = InMemoryRateLimiter(rate=1, burst=1, max_keys=2)
+
+    async def scenario():
+        for key in ("a", "b", "c"):
+            await limiter.acquire(key)
+
+    asyncio.run(scenario())
+    assert list(limiter.buckets) == ["b", "c"]
+
+
+def test_redis_limiter_falls_back_to_local_buckets_when_redis_is_down(monkeypatch):
+    monkeypatch.setattr("app.utils.redis_client.settings.REDIS_URL", "redis://127.0.0.1:1/0")
+    monkeypatch.setattr("app.utils.redis_client.redis_client", None)
+    limiter = RedisRateLimiter(rate=1, burst=1, max_keys=100)
+
+    async def scenario():
+        return [await limiter.acquire("a"), await limiter.acquire("a")]
+
+    first, second = asyncio.run(scenario())
+    assert first == 0 and second > 0
+
+
+def test_middleware_limits_each_user_separately():
+    limiter = InMemoryRateLimiter(rate=0.01, burst=2, max_keys=100)
+    client = TestClient(RateLimitMiddleware(make_app(), limiter=limiter))
+    alice = {"Authorization": f"Bearer {create_access_token({'sub': 'alice@example.com'})}"}
+    bob = {"Authorization": f"Bearer {create_access_token({'sub': 'bob@example.com'})}"}
+    assert [client.get("/ping", headers=alice).status_code for _ in range(3)] == [200, 200, 429]
+    limited = client.get("/ping", headers=alice)
+    assert limited.status_code == 429 and int(limited.headers["Retry-After"]) > 0
+    assert client.get("/ping", headers=bob).status_code == 200
+    # Unauthenticated requests share the client address's bucket; metrics scrapes are never limited.
+    assert [client.get("/ping").status_code for _ in range(3)] == [200, 200, 429]
+    assert client.get("/metrics").status_code == 200
+
+
+def test_recent_average_forgets_old_samples():
+    average = RecentAverage(window=2)
+    average.add(1.0, now=10)
+    average.add(3.0, now=11)
+    assert average.value(now=11) == 2.0
+    assert average.value(now=12.5) == 3.0
+    assert average.value(now=20) == 0.0
+
+
+def test_requests_are_shed_while_pool_waits_are_high():
+    shedder = LoadShedder(pool_wait_limit=0.5, loop_lag_limit=10, retry_after=3)
+    client = TestClient(LoadSheddingMiddleware(make_app(), shedder=shedder))
+    assert client.get("/ping").status_code == 200
+    recent_pool_wait.add(2.0, now=time.monotonic())
+    try:
+        shed = client.get("/ping")
+        assert shed.status_code == 503
+        assert shed.headers["Retry-After"] == "3"
+        assert client.get("/metrics").status_code == 200
+    finally:
+        recent_pool_wait.samples.clear()
+        recent_pool_wait.total = 0.0
+    assert client.get("/ping").status_code == 200
@@ -0,0 +1,63 @@
+from datetime import datetime, timedelta
+
+from sqlalchemy import create_engine, select, text
+
+from app.database import Base
+from app.models import Task
+from app.models.task import REMINDER_PENDING
+from app.utils.reminders import ReminderScheduler
+
+NOW = datetime(2024, 1, 1, 12, 0)
+
+
+def make_scheduler():
+    scheduler = ReminderScheduler(window=3600, refill_interval=300, grace=86400, batch_size=100)
+    scheduler.horizon = NOW + timedelta(hours=1)
+    return scheduler
+
+
+def task_event(task_id, due_at, **fields):
+    task = {"id": task_id, "title": f"task {task_id}", "completed": False, "reminded_at": None,
+            "due_at": due_at.isoformat() if due_at else None}
+    task.update(fields)
+    return {"event": "task_updated", "task": task}
+
+
+def test_pops_due_reminders_in_order():
+    scheduler = make_scheduler()
+    scheduler.on_event(1, task_event(1, NOW + timedelta(minutes=5)))
+    scheduler.on_event(1, task_event(2, NOW - timedelta(minutes=5)))
+    scheduler.on_event(1, task_event(3, NOW + timedelta(minutes=30)))
+    assert list(scheduler.pop_due(NOW)) == [2]
+    assert list(scheduler.pop_due(NOW + timedelta(minutes=10))) == [1]
+    assert scheduler.pop_due(NOW + timedelta(minutes=10)) == {}
+
+
+def test_rescheduled_and_cancelled_tasks_do_not_fire_stale_entries():
+    scheduler = make_scheduler()
+    scheduler.on_event(1, task_event(1, NOW + timedelta(minutes=5)))
+    scheduler.on_event(1, task_event(2, NOW + timedelta(minutes=5)))
+    scheduler.on_event(1, task_event(3, NOW + timedelta(minutes=5)))
+    scheduler.on_event(1, task_event(1, NOW + timedelta(minutes=20)))
+    scheduler.on_event(1, task_event(2, NOW + timedelta(minutes=5), completed=True))
+    scheduler.on_event(1, {"event": "tasks_deleted", "task_ids": [3]})
+    assert scheduler.pop_due(NOW + timedelta(minutes=10)) == {}
+    assert list(scheduler.pop_due(NOW + timedelta(minutes=30))) == [1]
+
+
+def test_tasks_beyond_the_horizon_are_left_to_the_next_refill():
+    scheduler = make_scheduler()
+    scheduler.on_event(1, task_event(1, NOW + timedelta(minutes=5)))
+    scheduler.on_event(1, task_event(1, NOW + timedelta(hours=3)))
+    assert scheduler.entries == {}
+
+
+def test_window_query_uses_the_partial_due_at_index():
+    engine = create_engine("sqlite://")
+    Base.metadata.create_all(engine)
+    query = select(Task.id).where(REMINDER_PENDING, Task.due_at >= NOW, Task.due_at < NOW + timedelta(hours=1))
+    compiled = query.compile(dialect=engine.dialect, compile_kwargs={"literal_binds": True})
+    with engine.connect() as connection:
+        plan = " ".join(row[-1] for row in connection.execute(text(f"EXPLAIN QUERY PLAN {compiled}")))
+    engine.dispose()
+    assert "ix_tasks_due_at_pending" in plan
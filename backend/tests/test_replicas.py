@@ -0,0 +1,92 @@
+import os
+import tempfile
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine
+
+from app.api.tasks import task_list_cache
+from app.database import Base
+from app.main import app
+from app.replicas import ConsistencyMiddleware, Replica, parse_token, replica_router
+
+from .conftest import login
+
+
+@pytest.fixture(scope="module")
+def replica():
+    # A second SQLite database with the schema but none of the primary's rows stands in for a
+    # replica that has not caught up, so which database served a read is visible in the response.
+    url = "sqlite:///" + os.path.join(tempfile.mkdtemp(prefix="replica-"), "replica.db")
+    engine = create_engine(url)
+    Base.metadata.create_all(engine)
+    engine.dispose()
+    replica = Replica("replica-test", url)
+    replicas, max_lag = replica_router.replicas, replica_router.max_lag
+    replica_router.replicas, replica_router.max_lag = [replica], 60
+    yield replica
+    replica_router.replicas, replica_router.max_lag = replicas, max_lag
+
+
+@pytest.fixture(scope="module")
+def client(replica):
+    with TestClient(ConsistencyMiddleware(app)) as client:
+        client.headers.update(login(client, "replica@example.com"))
+        yield client
+
+
+def test_parse_token():
+    assert parse_token("lsn:16/B374D848") == ("lsn", (0x16 << 32) + 0xB374D848)
+    assert parse_token("ts:1700000000.5") == ("ts", 1700000000.5)
+    assert parse_token("lsn:zz") is None
+    assert parse_token("garbage") is None
+    assert parse_token(None) is None
+
+
+def test_lsn_token_waits_for_replay(replica):
+    replica.replay_lsn = 100
+    assert replica_router.caught_up(replica, ("lsn", 100))
+    assert not replica_router.caught_up(replica, ("lsn", 101))
+    assert replica_router.caught_up(replica, None)
+
+
+def test_reads_after_a_write_go_to_the_primary(client, replica):
+    assert replica.healthy
+    response = client.post("/tasks/", json={"title": "fresh"})
+    assert response.status_code == 201
+    token = response.headers["X-Read-After"]
+    assert client.cookies["read_after"] == token
+    task_id = response.json()["id"]
+    # The cookie pins this client's reads to the primary...
+    assert client.get(f"/tasks/{task_id}").status_code == 200
+    # ...while a client without it reads from the replica, which does not have the row.
+    client.cookies.clear()
+    assert client.get(f"/tasks/{task_id}").status_code == 404
+    # The header works for clients that do not keep cookies.
+    assert client.get(f"/tasks/{task_id}", headers={"X-Read-After": token}).status_code == 200
+
+
+def test_unhealthy_replica_falls_back_to_the_primary(client, replica):
+    task_id = client.post("/tasks/", json={"title": "fallback"}).json()["id"]
+    client.cookies.clear()
+    replica.healthy = False
+    try:
+        assert client.get(f"/tasks/{task_id}").status_code == 200
+    finally:
+        replica.healthy = True
+    assert client.get(f"/tasks/{task_id}").status_code == 404
+
+
+def test_list_cache_never_serves_a_replica_page_to_a_writer(client, replica):
+    response = client.post("/tasks/", json={"title": "listed"})
+    token = response.headers["X-Read-After"]
+    client.cookies.clear()
+    cached = len(task_list_cache.local)
+    # Another device reads the lagging replica right after the write; that page must not be cached...
+    assert client.get("/tasks/").json() == []
+    assert len(task_list_cache.local) == cached
+    # ...and the writer, carrying its token, reads the primary without going through the cache at all.
+    listed = client.get("/tasks/", headers={"X-Read-After": token})
+    assert "listed" in [task["title"] for task in listed.json()]
+    assert len(task_list_cache.local) == cached
+    assert client.get("/tasks/", headers={"X-Read-After": token, "If-None-Match": listed.headers["ETag"]}).status_code == 304
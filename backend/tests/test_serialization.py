@@ -0,0 +1,43 @@
+import pytest
+
+from app.config import settings
+from app.utils import serialization
+
+from .conftest import login
+
+DUE_AT = {"plain": None, "ünïcode ✓": "2024-05-01T08:30:00.123456", "on the hour": "2024-05-01T07:00:00"}
+
+
+@pytest.fixture(scope="module")
+def client(client):
+    client.headers.update(login(client, "serialization@example.com"))
+    client.post("/tasks/batch", json={"tasks": [
+        {"title": "plain"},
+        {"title": "ünïcode ✓", "description": "quotes \" and\nnewlines", "completed": True, "due_at": "2024-05-01T08:30:00.123456Z"},
+        {"title": "on the hour", "due_at": "2024-05-01T09:00:00+02:00"},
+    ]})
+    return client
+
+
+@pytest.fixture(params=["orjson", "stdlib"])
+def encoder(request, monkeypatch):
+    if request.param == "stdlib":
+        monkeypatch.setattr(serialization, "orjson", None)
+    elif serialization.orjson is None:
+        pytest.skip("orjson is not installed")
+
+
+@pytest.mark.parametrize("path, params", [("/tasks/", {}), ("/tasks/", {"sort": "-created_at"}), ("/tasks/search", {"q": "quotes"})])
+def test_fast_responses_match_the_default_body(client, monkeypatch, encoder, path, params):
+    default = client.get(path, params=params)
+    monkeypatch.setattr(settings, "FAST_JSON_RESPONSES", True)
+    fast = client.get(path, params=params)
+    assert fast.status_code == default.status_code == 200
+    assert fast.json() == default.json() != []
+    assert fast.content == default.content
+    assert fast.headers["content-type"] == default.headers["content-type"]
+    if path == "/tasks/":
+        assert fast.headers["ETag"] == default.headers["ETag"]
+    # Naive UTC in ISO 8601, microseconds only when there are any, exactly as pydantic renders them.
+    for task in fast.json():
+        assert task["due_at"] == DUE_AT[task["title"]]
@@ -0,0 +1,50 @@
+from app.serve import available_cpus, cgroup_cpu_limit, gunicorn_options, prepare_metrics_dir
+
+
+def write(path, content):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(content)
+
+
+def test_cgroup_v2_quota(tmp_path):
+    write(tmp_path / "cpu.max", "150000 100000\n")
+    assert cgroup_cpu_limit(str(tmp_path)) == 1.5
+    write(tmp_path / "cpu.max", "max 100000\n")
+    assert cgroup_cpu_limit(str(tmp_path)) is None
+
+
+def test_cgroup_v1_quota(tmp_path):
+    write(tmp_path / "cpu" / "cpu.cfs_quota_us", "200000\n")
+    write(tmp_path / "cpu" / "cpu.cfs_period_us", "100000\n")
+    assert cgroup_cpu_limit(str(tmp_path)) == 2
+    write(tmp_path / "cpu" / "cpu.cfs_quota_us", "-1\n")
+    assert cgroup_cpu_limit(str(tmp_path)) is None
+
+
+def test_workers_never_exceed_the_quota(tmp_path):
+    assert cgroup_cpu_limit(str(tmp_path)) is None
+    write(tmp_path / "cpu.max", "50000 100000\n")
+    assert available_cpus(str(tmp_path)) == 1
+
+
+def test_gunicorn_options():
+    options = gunicorn_options(4)
+    assert options["workers"] == 4
+    assert options["worker_class"] == "uvicorn.workers.UvicornWorker"
+    assert options["preload_app"] is True
+
+
+def test_metrics_dir_cleanup_only_removes_metric_files_on_a_cold_start(tmp_path, monkeypatch):
+    monkeypatch.setenv("PROMETHEUS_MULTIPROC_DIR", str(tmp_path))
+    write(tmp_path / "counter_123.db", "")
+    write(tmp_path / "keep.txt", "operator data")
+    write(tmp_path / "nested" / "gauge_all_1.db", "")
+    # A USR2 re-exec inherits the listening socket through GUNICORN_FD; the old workers' files stay.
+    monkeypatch.setenv("GUNICORN_FD", "3")
+    prepare_metrics_dir(4)
+    assert (tmp_path / "counter_123.db").exists()
+    monkeypatch.delenv("GUNICORN_FD")
+    prepare_metrics_dir(4)
+    assert not (tmp_path / "counter_123.db").exists()
+    assert (tmp_path / "keep.txt").read_text() == "operator data"
+    assert (tmp_path / "nested" / "gauge_all_1.db").exists()
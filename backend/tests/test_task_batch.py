@@ -0,0 +1,96 @@
+import asyncio
+
+import pytest
+
+from app.crud import create_tasks, delete_tasks, supports_returning, update_tasks
+from app.database import AsyncSessionLocal
+from app.schemas import TaskBatchUpdateItem, TaskCreate
+
+from .conftest import login
+
+
+@pytest.fixture(scope="module")
+def headers(client):
+    return login(client, "batch@example.com")
+
+
+@pytest.fixture(scope="module")
+def other_headers(client):
+    return login(client, "batch-other@example.com")
+
+
+def test_batch_create_returns_rows_in_request_order(client, headers):
+    response = client.post("/tasks/batch", json={"tasks": [{"title": f"batch {i}", "completed": i == 1} for i in range(3)]}, headers=headers)
+    assert response.status_code == 201
+    created = response.json()
+    assert [task["title"] for task in created] == ["batch 0", "batch 1", "batch 2"]
+    assert [task["completed"] for task in created] == [False, True, False]
+    assert len({task["id"] for task in created}) == 3
+    for task in created:
+        assert client.get(f"/tasks/{task['id']}", headers=headers).json()["title"] == task["title"]
+
+
+def test_invalid_item_rejects_the_whole_create_batch(client, headers):
+    before = client.get("/tasks/stats", headers=headers).json()["total"]
+    response = client.post("/tasks/batch", json={"tasks": [{"title": "valid"}, {"title": "   "}]}, headers=headers)
+    assert response.status_code == 422
+    assert client.get("/tasks/stats", headers=headers).json()["total"] == before
+
+
+def test_batch_update_skips_missing_and_foreign_ids(client, headers, other_headers):
+    mine = client.post("/tasks/batch", json={"tasks": [{"title": "a"}, {"title": "b"}, {"title": "c"}]}, headers=headers).json()
+    foreign = client.post("/tasks/", json={"title": "not yours"}, headers=other_headers).json()
+    response = client.patch("/tasks/batch", headers=headers, json={"tasks": [
+        {"id": mine[0]["id"], "completed": True},
+        {"id": foreign["id"], "completed": True},
+        {"id": mine[1]["id"], "completed": True},
+        {"id": 999999, "completed": True},
+        {"id": mine[2]["id"], "title": "renamed"},
+    ]})
+    assert response.status_code == 200
+    updated = response.json()
+    assert [task["id"] for task in updated] == [mine[0]["id"], mine[1]["id"], mine[2]["id"]]
+    assert [task["completed"] for task in updated] == [True, True, False]
+    assert updated[2]["title"] == "renamed"
+    assert client.get(f"/tasks/{foreign['id']}", headers=other_headers).json()["completed"] is False
+
+
+def test_batch_update_merges_items_with_the_same_id(client, headers):
+    task = client.post("/tasks/", json={"title": "twice"}, headers=headers).json()
+    response = client.patch("/tasks/batch", headers=headers, json={"tasks": [
+        {"id": task["id"], "completed": True, "title": "first"},
+        {"id": task["id"], "title": "second"},
+    ]})
+    assert response.status_code == 200
+    assert [(row["id"], row["title"], row["completed"]) for row in response.json()] == [(task["id"], "second", True)]
+    stored = client.get(f"/tasks/{task['id']}", headers=headers).json()
+    assert (stored["title"], stored["completed"]) == ("second", True)
+
+
+def test_batch_delete_reports_only_deleted_ids(client, headers, other_headers):
+    mine = client.post("/tasks/batch", json={"tasks": [{"title": "x"}, {"title": "y"}]}, headers=headers).json()
+    foreign = client.post("/tasks/", json={"title": "keep"}, headers=other_headers).json()
+    ids = [mine[0]["id"], foreign["id"], 999999, mine[1]["id"]]
+    response = client.request("DELETE", "/tasks/batch", json={"ids": ids}, headers=headers)
+    assert response.status_code == 200
+    assert sorted(response.json()["deleted"]) == sorted([mine[0]["id"], mine[1]["id"]])
+    assert client.get(f"/tasks/{mine[0]['id']}", headers=headers).status_code == 404
+    assert client.get(f"/tasks/{foreign['id']}", headers=other_headers).status_code == 200
+
+
+def test_batch_writes_without_returning():
+    # SQLite has no UPDATE/DELETE/multi-row INSERT ... RETURNING in SQLAlchemy 1.4, so every batch
+    # write here goes through the follow-up SELECT path and must still report the affected rows.
+    async def scenario(user_id):
+        async with AsyncSessionLocal() as db:
+            assert not await supports_returning(db)
+            created = await create_tasks(db, [TaskCreate(title="one"), TaskCreate(title="two", completed=True)], user_id=user_id)
+            ids = [row.id for row in created]
+            updated = await update_tasks(db, [TaskBatchUpdateItem(id=ids[0], completed=True)], user_id=user_id)
+            deleted = await delete_tasks(db, ids + [999999], user_id=user_id)
+        return created, updated, deleted, ids
+
+    created, updated, deleted, ids = asyncio.run(scenario(user_id=424242))
+    assert [(row.title, row.completed) for row in created] == [("one", False), ("two", True)]
+    assert [(row.id, row.completed) for row in updated] == [(ids[0], True)]
+    assert sorted(deleted) == sorted(ids)
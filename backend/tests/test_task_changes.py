@@ -0,0 +1,79 @@
+import asyncio
+from datetime import timedelta
+
+import pytest
+
+from app.config import settings
+from app.crud import allocate_change_seqs, compact_task_changes
+from app.database import AsyncSessionLocal
+
+from .conftest import access_token
+
+
+@pytest.fixture
+def token(client, request):
+    # A fresh user per test, so each one starts its change sequence at zero.
+    return access_token(client, f"{request.node.name}@example.com")
+
+
+def replay(client, token, since):
+    with client.websocket_connect(f"/ws/tasks?token={token}&since={since}") as websocket:
+        return websocket.receive_json()
+
+
+def test_seqs_are_allocated_per_user_without_gaps():
+    async def scenario():
+        async with AsyncSessionLocal() as db:
+            seqs = [await allocate_change_seqs(db, 9001, 1), await allocate_change_seqs(db, 9001, 3),
+                    await allocate_change_seqs(db, 9002, 2), await allocate_change_seqs(db, 9001, 1)]
+            await db.commit()
+        return seqs
+
+    assert asyncio.run(scenario()) == [1, 2, 1, 5]
+
+
+def test_reconnect_replays_missed_changes_in_order(client, token):
+    headers = {"Authorization": f"Bearer {token}"}
+    created = client.post("/tasks/", json={"title": "first"}, headers=headers).json()
+    client.put(f"/tasks/{created['id']}", json={"completed": True}, headers=headers)
+    batch = client.post("/tasks/batch", json={"tasks": [{"title": "a"}, {"title": "b"}]}, headers=headers).json()
+    client.delete(f"/tasks/{created['id']}", headers=headers)
+
+    message = replay(client, token, since=0)
+    assert message["event"] == "changes"
+    assert [(c["seq"], c["op"], c["task_id"]) for c in message["changes"]] == [
+        (1, "created", created["id"]),
+        (2, "updated", created["id"]),
+        (3, "created", batch[0]["id"]),
+        (4, "created", batch[1]["id"]),
+        (5, "deleted", created["id"]),
+    ]
+    assert message["changes"][1]["task"]["completed"] is True
+    assert message["changes"][4]["task"] is None
+    assert message["seq"] == 5
+
+    partial = replay(client, token, since=3)
+    assert [c["seq"] for c in partial["changes"]] == [4, 5]
+    assert replay(client, token, since=5) == {"event": "changes", "seq": 5, "changes": []}
+
+
+def test_too_many_missed_changes_ask_for_a_resync(client, token, monkeypatch):
+    headers = {"Authorization": f"Bearer {token}"}
+    client.post("/tasks/batch", json={"tasks": [{"title": f"task {i}"} for i in range(4)]}, headers=headers)
+    monkeypatch.setattr(settings, "TASK_CHANGE_REPLAY_LIMIT", 3)
+    assert replay(client, token, since=0) == {"event": "resync", "seq": 4}
+    assert [c["seq"] for c in replay(client, token, since=1)["changes"]] == [2, 3, 4]
+
+
+def test_compacted_changes_ask_for_a_resync(client, token):
+    headers = {"Authorization": f"Bearer {token}"}
+    client.post("/tasks/", json={"title": "old"}, headers=headers)
+    client.post("/tasks/", json={"title": "older"}, headers=headers)
+
+    async def compact():
+        async with AsyncSessionLocal() as db:
+            return await compact_task_changes(db, retention=timedelta(seconds=-1))
+
+    assert asyncio.run(compact()) >= 2
+    assert replay(client, token, since=0) == {"event": "resync", "seq": 2}
+    assert replay(client, token, since=2) == {"event": "changes", "seq": 2, "changes": []}
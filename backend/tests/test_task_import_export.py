@@ -0,0 +1,138 @@
+import asyncio
+import csv
+import io
+import json
+
+import pytest
+
+from app.api import tasks as tasks_api
+from app.crud import EXPORT_COLUMNS
+from app.utils.task_import import iter_lines
+
+from .conftest import login
+
+
+@pytest.fixture
+def headers(client, request):
+    return login(client, f"{request.node.name}@example.com")
+
+
+def test_ndjson_import_reports_each_bad_line(client, headers):
+    body = b"\n".join([
+        json.dumps({"title": "first", "completed": True}).encode(),
+        b"{not json",
+        b"",
+        b"[1, 2]",
+        json.dumps({"title": "   "}).encode(),
+        json.dumps({"title": "second", "due_at": "2024-01-01T09:00:00+02:00"}).encode(),
+    ])
+    response = client.post("/tasks/import", params={"format": "ndjson"}, content=body, headers=headers)
+    assert response.status_code == 200
+    report = response.json()
+    assert (report["processed"], report["inserted"], report["failed"]) == (5, 2, 3)
+    assert [error["line"] for error in report["errors"]] == [2, 4, 5]
+    assert report["errors"][0]["errors"][0]["msg"].startswith("Invalid JSON")
+    assert report["errors"][2]["errors"][0]["loc"] == ["title"]
+    assert report["errors_truncated"] is False
+    tasks = client.get("/tasks/", headers=headers).json()
+    assert [(task["title"], task["completed"], task["due_at"]) for task in tasks] == [
+        ("first", True, None), ("second", False, "2024-01-01T07:00:00"),
+    ]
+
+
+def test_csv_import_handles_quoted_newlines_and_bad_rows(client, headers):
+    body = (
+        "﻿title,description,completed\r\n"
+        'plain,,false\r\n'
+        '"multi","line one\nline two",true\r\n'
+        "too,many,columns,here\r\n"
+        ",missing title,false\r\n"
+    ).encode()
+    report = client.post("/tasks/import", params={"format": "csv"}, content=body, headers=headers).json()
+    assert (report["processed"], report["inserted"], report["failed"]) == (4, 2, 2)
+    assert [error["line"] for error in report["errors"]] == [5, 6]
+    tasks = client.get("/tasks/", headers=headers).json()
+    assert [(task["title"], task["description"], task["completed"]) for task in tasks] == [
+        ("plain", None, False), ("multi", "line one\nline two", True),
+    ]
+
+
+def test_error_report_is_truncated(client, headers, monkeypatch):
+    monkeypatch.setattr("app.api.tasks.settings.IMPORT_MAX_REPORTED_ERRORS", 2)
+    body = b"\n".join([b"bad"] * 5)
+    report = client.post("/tasks/import", content=body, headers=headers).json()
+    assert report["failed"] == 5
+    assert len(report["errors"]) == 2
+    assert report["errors_truncated"] is True
+
+
+def test_ndjson_export_streams_every_task(client, headers):
+    client.post("/tasks/batch", json={"tasks": [{"title": f"task {i}", "completed": i % 2 == 0} for i in range(3)]}, headers=headers)
+    response = client.get("/tasks/export", params={"format": "ndjson"}, headers=headers)
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("application/x-ndjson")
+    rows = [json.loads(line) for line in response.text.splitlines()]
+    assert [row["title"] for row in rows] == ["task 0", "task 1", "task 2"]
+    assert [row["completed"] for row in rows] == [True, False, True]
+    assert set(rows[0]) == set(EXPORT_COLUMNS)
+
+
+def test_csv_export_round_trips_through_import(client, headers):
+    client.post("/tasks/", json={"title": "quoted, \"title\"", "description": "two\nlines"}, headers=headers)
+    exported = client.get("/tasks/export", params={"format": "csv"}, headers=headers)
+    assert exported.headers["content-type"].startswith("text/csv")
+    assert 'filename="tasks.csv"' in exported.headers["content-disposition"]
+    rows = list(csv.reader(io.StringIO(exported.text)))
+    assert rows[0] == list(EXPORT_COLUMNS)
+    assert rows[1][1:3] == ['quoted, "title"', "two\nlines"]
+
+    other = login(client, "csv-round-trip@example.com")
+    report = client.post("/tasks/import", params={"format": "csv"}, content=exported.content, headers=other).json()
+    assert (report["inserted"], report["failed"]) == (1, 0)
+    imported = client.get("/tasks/", headers=other).json()[0]
+    assert (imported["title"], imported["description"]) == ('quoted, "title"', "two\nlines")
+
+
+def test_csv_and_ndjson_exports_format_timestamps_alike(client, headers):
+    client.post("/tasks/", json={"title": "dated", "due_at": "2024-03-01T09:30:00"}, headers=headers)
+    ndjson = json.loads(client.get("/tasks/export", params={"format": "ndjson"}, headers=headers).text.splitlines()[0])
+    header, row = list(csv.reader(io.StringIO(client.get("/tasks/export", params={"format": "csv"}, headers=headers).text)))
+    exported = dict(zip(header, row))
+    assert exported["due_at"] == "2024-03-01T09:30:00"
+    for column in ("due_at", "created_at", "updated_at"):
+        assert exported[column] == ndjson[column]
+
+
+def test_iter_lines_joins_lines_split_across_chunks():
+    async def chunks(data, size):
+        for start in range(0, len(data), size):
+            yield data[start:start + size]
+
+    async def collect(data, size):
+        return [line async for line in iter_lines(chunks(data, size))]
+
+    data = b"one\r\n" + b"x" * 1000 + b"\n\nlast"
+    expected = [b"one", b"x" * 1000, b"", b"last"]
+    for size in (1, 2, 7, 4096):
+        assert asyncio.run(collect(data, size)) == expected
+
+
+def test_failed_chunk_leaves_no_rows_behind(client, headers, monkeypatch):
+    monkeypatch.setattr("app.api.tasks.settings.IMPORT_CHUNK_SIZE", 2)
+    mark_bulk_change = tasks_api.mark_bulk_change
+    calls = 0
+
+    async def fail_second_chunk(db, user_id):
+        nonlocal calls
+        calls += 1
+        if calls == 2:
+            raise RuntimeError("chunk failed")
+        await mark_bulk_change(db, user_id)
+
+    monkeypatch.setattr(tasks_api, "mark_bulk_change", fail_second_chunk)
+    body = b"\n".join(json.dumps({"title": f"row {i}"}).encode() for i in range(5))
+    with pytest.raises(RuntimeError, match="chunk failed"):
+        client.post("/tasks/import", content=body, headers=headers)
+    # The first chunk committed; the second was inserted and then rolled back with its transaction.
+    assert [task["title"] for task in client.get("/tasks/", headers=headers).json()] == ["row 0", "row 1"]
+    assert client.get("/tasks/stats", headers=headers).json()["total"] == 2
@@ -0,0 +1,79 @@
+from datetime import datetime
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine
+
+from app.crud import build_task_list_query
+from app.database import Base
+from app.main import app
+from app.schemas import TaskFilter
+
+from .conftest import login
+
+SINCE = datetime(2024, 1, 1)
+UNTIL = datetime(2024, 2, 1)
+
+# Every filter/sort combination the list endpoint supports.
+FILTER_COMBINATIONS = [
+    {},
+    {"sort": "-id"},
+    {"completed": False},
+    {"completed": True, "sort": "-updated_at"},
+    {"completed": False, "updated_after": SINCE, "sort": "-updated_at"},
+    {"completed": False, "created_after": SINCE, "created_before": UNTIL, "sort": "created_at"},
+    {"updated_after": SINCE, "updated_before": UNTIL},
+    {"updated_after": SINCE, "sort": "updated_at"},
+    {"created_after": SINCE, "sort": "-created_at"},
+]
+
+
+@pytest.fixture(scope="module")
+def engine():
+    engine = create_engine("sqlite://")
+    Base.metadata.create_all(engine)
+    yield engine
+    engine.dispose()
+
+
+def explain(engine, query):
+    compiled = query.compile(dialect=engine.dialect)
+    params = compiled.construct_params()
+    values = [params[name] for name in compiled.positiontup]
+    values = [value.isoformat(" ") if isinstance(value, datetime) else value for value in values]
+    with engine.connect() as connection:
+        rows = connection.exec_driver_sql(f"EXPLAIN QUERY PLAN {compiled}", tuple(values))
+        return [row[-1] for row in rows]
+
+
+@pytest.mark.parametrize("filters", FILTER_COMBINATIONS, ids=repr)
+def test_task_list_query_uses_an_index(engine, filters):
+    plan = explain(engine, build_task_list_query(1, TaskFilter(**filters)).limit(10))
+    assert any(step.startswith("SEARCH tasks USING") and "INDEX" in step for step in plan), plan
+    assert not any(step.startswith("SCAN tasks") for step in plan), plan
+
+
+def test_keyset_page_uses_an_index(engine):
+    query = build_task_list_query(1, TaskFilter(sort="-updated_at"), after=(SINCE, 42)).limit(10)
+    plan = explain(engine, query)
+    assert any("INDEX ix_tasks_user_id_updated_at" in step for step in plan), plan
+
+
+def test_filter_timestamps_are_normalized_to_naive_utc():
+    # The columns are timestamp without time zone; asyncpg rejects comparing them with aware values.
+    filters = TaskFilter(updated_after="2024-01-01T00:00:00Z", created_before="2024-01-01T02:30:00+02:00")
+    assert filters.updated_after == datetime(2024, 1, 1)
+    assert filters.created_before == datetime(2024, 1, 1, 0, 30)
+    assert filters.updated_after.tzinfo is None and filters.created_before.tzinfo is None
+    assert TaskFilter(updated_before=UNTIL).updated_before == UNTIL
+
+
+def test_list_accepts_offset_timestamps_from_clients():
+    # What JavaScript's Date.prototype.toISOString() sends.
+    with TestClient(app) as client:
+        headers = login(client, "filters@example.com")
+        client.post("/tasks/", json={"title": "recent"}, headers=headers)
+        recent = client.get("/tasks/", params={"updated_after": "2000-01-01T00:00:00.000Z"}, headers=headers)
+        assert [task["title"] for task in recent.json()] == ["recent"]
+        future = client.get("/tasks/", params={"created_after": "2999-01-01T00:00:00+05:30"}, headers=headers)
+        assert future.json() == []
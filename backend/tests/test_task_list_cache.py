@@ -0,0 +1,66 @@
+import asyncio
+
+import pytest
+
+from app.api import tasks
+from app.utils.cache import ReadThroughCache
+
+from .conftest import login
+
+
+@pytest.fixture(scope="module")
+def client(client):
+    client.headers.update(login(client, "listcache@example.com"))
+    return client
+
+
+@pytest.fixture
+def page_loads(monkeypatch):
+    loads = []
+    get_tasks_after = tasks.get_tasks_after
+
+    async def counting(**kwargs):
+        loads.append(kwargs["limit"])
+        return await get_tasks_after(**kwargs)
+
+    monkeypatch.setattr(tasks, "get_tasks_after", counting)
+    return loads
+
+
+def test_pages_are_served_from_the_cache_until_a_write(client, page_loads):
+    client.post("/tasks/", json={"title": "one"})
+    first = client.get("/tasks/")
+    assert client.get("/tasks/").json() == first.json()
+    assert len(page_loads) == 1
+    client.post("/tasks/", json={"title": "two"})
+    assert [task["title"] for task in client.get("/tasks/").json()][-1] == "two"
+    assert len(page_loads) == 2
+
+
+def test_conditional_get_on_a_cold_cache_skips_the_page_query(client, page_loads):
+    etag = client.get("/tasks/").headers["ETag"]
+    page_loads.clear()
+    # A cold process, or the first request after the TTL, still answers 304 from the version alone.
+    tasks.task_list_cache.local.clear()
+    assert client.get("/tasks/", headers={"If-None-Match": etag}).status_code == 304
+    assert page_loads == []
+
+
+def test_generations_are_bounded_and_never_reused():
+    cache = ReadThroughCache("bounded", maxsize=2, ttl=60)
+
+    async def load(owner, value):
+        async def loader():
+            return value
+        return await cache.get_or_load(owner, "page", loader)
+
+    async def scenario():
+        await load("a", "old")
+        cache.invalidate_local("a")
+        # Evicting "a"'s generation must not bring back the page stored under its first one.
+        for owner in ("b", "c", "d"):
+            cache.invalidate_local(owner)
+        assert len(cache.generations) == 2
+        return await load("a", "new")
+
+    assert asyncio.run(scenario()) == "new"
@@ -0,0 +1,66 @@
+import base64
+import json
+from datetime import datetime
+
+import pytest
+
+from app.crud import decode_cursor
+
+from .conftest import login
+
+
+def cursor_for(position):
+    return base64.urlsafe_b64encode(json.dumps(position).encode()).decode().rstrip("=")
+
+
+@pytest.fixture(scope="module")
+def headers(client):
+    return login(client, "pagination@example.com")
+
+
+@pytest.mark.parametrize("position", [None, 1.5, {"id": 1}, "1", [], [1, 2], ["1"]], ids=repr)
+def test_malformed_id_cursors_are_rejected(position):
+    with pytest.raises(ValueError):
+        decode_cursor(cursor_for(position))
+
+
+@pytest.mark.parametrize("position", [None, 7, {"at": "2024-01-01T00:00:00"}, ["2024-01-01T00:00:00"], ["yesterday", 1], [1, 1]], ids=repr)
+def test_malformed_timestamp_cursors_are_rejected(position):
+    with pytest.raises(ValueError):
+        decode_cursor(cursor_for(position), "-created_at")
+
+
+@pytest.mark.parametrize("cursor", ["bnVsbA", cursor_for(1.5), cursor_for({"id": 1}), "!!!", "_w"])
+def test_list_answers_malformed_cursors_with_400(client, headers, cursor):
+    response = client.get("/tasks/", params={"cursor": cursor}, headers=headers)
+    assert response.status_code == 400
+    assert response.json() == {"detail": "Invalid cursor"}
+
+
+@pytest.mark.parametrize("sort", ["id", "-created_at", "updated_at"])
+def test_cursor_pages_have_no_duplicates_or_gaps_under_concurrent_inserts(client, sort):
+    headers = login(client, f"pages{sort}@example.com")
+    existing = client.post("/tasks/batch", json={"tasks": [{"title": f"task {i}"} for i in range(11)]}, headers=headers).json()
+    seen, cursor, pages = [], None, 0
+    while True:
+        params = {"limit": 3, "sort": sort, **({"cursor": cursor} if cursor else {})}
+        response = client.get("/tasks/", params=params, headers=headers)
+        assert response.status_code == 200
+        seen.extend(response.json())
+        pages += 1
+        if pages <= 3:
+            # Writes between pages land after the cursor (ascending) or before it (descending).
+            client.post("/tasks/", json={"title": f"inserted {pages}"}, headers=headers)
+        cursor = response.headers.get("X-Next-Cursor")
+        if cursor is None:
+            break
+    ids = [task["id"] for task in seen]
+    assert len(ids) == len(set(ids))
+    assert {task["id"] for task in existing} <= set(ids)
+    column = sort.lstrip("-")
+    keys = [(datetime.fromisoformat(task[column]), task["id"]) if column != "id" else task["id"] for task in seen]
+    assert keys == sorted(keys, reverse=sort.startswith("-"))
+    if sort.startswith("-"):
+        assert not any(task["title"].startswith("inserted") for task in seen)
+    else:
+        assert [task["title"] for task in seen if task["title"].startswith("inserted")] == ["inserted 1", "inserted 2", "inserted 3"]
@@ -0,0 +1,79 @@
+import asyncio
+import json
+
+from sqlalchemy import delete, select, update
+
+from app.crud import get_user_by_email, reconcile_task_stats
+from app.database import AsyncSessionLocal
+from app.models import TaskStats
+
+from .conftest import login
+
+
+def stats(client, headers):
+    return client.get("/tasks/stats", headers=headers).json()
+
+
+def run(statement_for_user, email):
+    async def scenario():
+        async with AsyncSessionLocal() as db:
+            user = await get_user_by_email(db, email=email)
+            await db.execute(statement_for_user(user.id))
+            await db.commit()
+
+    asyncio.run(scenario())
+
+
+def test_counters_follow_every_write_path(client):
+    headers = login(client, "stats@example.com")
+    assert stats(client, headers) == {"total": 0, "completed": 0, "open": 0}
+    task_id = client.post("/tasks/", json={"title": "one"}, headers=headers).json()["id"]
+    client.put(f"/tasks/{task_id}", json={"completed": True}, headers=headers)
+    # Setting the same value again must not count twice.
+    client.put(f"/tasks/{task_id}", json={"completed": True}, headers=headers)
+    assert stats(client, headers) == {"total": 1, "completed": 1, "open": 0}
+
+    batch = client.post("/tasks/batch", json={"tasks": [{"title": "a"}, {"title": "b", "completed": True}, {"title": "c"}]}, headers=headers).json()
+    client.patch("/tasks/batch", json={"tasks": [{"id": task["id"], "completed": True} for task in batch]}, headers=headers)
+    assert stats(client, headers) == {"total": 4, "completed": 4, "open": 0}
+    client.request("DELETE", "/tasks/batch", json={"ids": [batch[0]["id"], batch[1]["id"]]}, headers=headers)
+    client.delete(f"/tasks/{task_id}", headers=headers)
+    assert stats(client, headers) == {"total": 1, "completed": 1, "open": 0}
+
+    body = b"\n".join(json.dumps({"title": f"imported {i}", "completed": i == 0}).encode() for i in range(3))
+    client.post("/tasks/import", content=body, headers=headers)
+    assert stats(client, headers) == {"total": 4, "completed": 2, "open": 2}
+
+
+def test_missing_counters_are_computed_from_the_tasks(client):
+    email = "stats-missing@example.com"
+    headers = login(client, email)
+    client.post("/tasks/batch", json={"tasks": [{"title": "a", "completed": True}, {"title": "b"}]}, headers=headers)
+    # Users whose tasks predate the counters have no row until the first read or write.
+    run(lambda user_id: delete(TaskStats).where(TaskStats.user_id == user_id), email)
+    assert stats(client, headers) == {"total": 2, "completed": 1, "open": 1}
+    run(lambda user_id: delete(TaskStats).where(TaskStats.user_id == user_id), email)
+    client.post("/tasks/", json={"title": "c"}, headers=headers)
+    assert stats(client, headers) == {"total": 3, "completed": 1, "open": 2}
+
+
+def test_reconcile_corrects_drifted_and_missing_counters(client):
+    drifted, missing = "stats-drifted@example.com", "stats-absent@example.com"
+    for email in (drifted, missing):
+        client.post("/tasks/batch", json={"tasks": [{"title": "x", "completed": True}, {"title": "y"}]}, headers=login(client, email))
+    run(lambda user_id: update(TaskStats).where(TaskStats.user_id == user_id).values(total=10, completed=-3), drifted)
+    run(lambda user_id: delete(TaskStats).where(TaskStats.user_id == user_id), missing)
+
+    async def reconcile():
+        async with AsyncSessionLocal() as db:
+            corrected = await reconcile_task_stats(db)
+            again = await reconcile_task_stats(db)
+            rows = (await db.execute(select(TaskStats.total, TaskStats.completed))).all()
+        return corrected, again, rows
+
+    corrected, again, rows = asyncio.run(reconcile())
+    assert corrected >= 2
+    assert again == 0
+    assert all(0 <= completed <= total for total, completed in rows)
+    assert stats(client, login(client, drifted)) == {"total": 2, "completed": 1, "open": 1}
+    assert stats(client, login(client, missing)) == {"total": 2, "completed": 1, "open": 1}
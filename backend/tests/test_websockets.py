@@ -0,0 +1,56 @@
+import asyncio
+
+from fastapi import status
+
+from app.websockets import RESYNC_MESSAGE, Connection, ConnectionManager
+
+from .conftest import access_token
+
+
+def test_events_reach_only_their_owners_sockets(client):
+    alice, bob = access_token(client, "ws-alice@example.com"), access_token(client, "ws-bob@example.com")
+    with client.websocket_connect(f"/ws/tasks?token={alice}") as alice_ws, client.websocket_connect(f"/ws/tasks?token={bob}") as bob_ws:
+        task = client.post("/tasks/", json={"title": "alice's"}, headers={"Authorization": f"Bearer {alice}"}).json()
+        message = alice_ws.receive_json()
+        assert (message["event"], message["task"]["id"]) == ("task_created", task["id"])
+        # Events are delivered before the write returns and sent in queue order, so had alice's
+        # event been routed to bob it would arrive ahead of this echo.
+        bob_ws.send_text("ping")
+        assert bob_ws.receive_text() == "You wrote: ping"
+
+
+class FakeWebSocket:
+    def __init__(self):
+        self.closed_with = None
+
+    async def close(self, code):
+        self.closed_with = code
+
+
+def test_a_client_that_overflows_twice_gets_a_resync_then_is_closed():
+    async def scenario():
+        manager = ConnectionManager(broker=None)
+        websocket = FakeWebSocket()
+        # No writer task, so nothing drains the queue: the client is as slow as it gets.
+        connection = Connection(websocket, user_id=1, queue_size=2)
+        manager.connections[1] = {connection}
+
+        async def deliver(n):
+            await manager.deliver({"user_id": 1, "message": {"event": "task_updated", "n": n}})
+
+        await deliver(1)
+        await deliver(2)
+        # The first overflow replaces the backlog with a resync; the client stays connected.
+        await deliver(3)
+        assert connection.resync_pending and connection.queue.qsize() == 1
+        await deliver(4)
+        assert manager.connections == {1: {connection}}
+        # Overflowing again before the resync was sent drops the client.
+        await deliver(5)
+        await asyncio.sleep(0)
+        return manager, connection, websocket
+
+    manager, connection, websocket = asyncio.run(scenario())
+    assert [connection.queue.get_nowait() for _ in range(connection.queue.qsize())] == [RESYNC_MESSAGE, {"event": "task_updated", "n": 4}]
+    assert manager.connections == {}
+    assert websocket.closed_with == status.WS_1013_TRY_AGAIN_LATER
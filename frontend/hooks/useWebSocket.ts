@@ -1,4 +1,4 @@
-import { useState, useEffect, useCallback } from 'react';
+import { useState, useEffect, useCallback, useRef } from 'react';
 import axios from 'axios';
 
 const api = axios.create({
@@ -19,16 +19,27 @@ const useWebSocket = (url: string): WebSocketHook => {
   const [socket, setSocket] = useState<WebSocket | null>(null);
   const [isConnected, setIsConnected] = useState<boolean>(false);
   const [error, setError] = useState<string | null>(null);
+  // Last change sequence seen; sent as `since` on reconnect so the server replays only missed changes.
+  const lastSeq = useRef<number | null>(null);
 
   const connect = useCallback(() => {
     try {
-      const ws = new WebSocket(url);
+      const separator = url.includes('?') ? '&' : '?';
+      const ws = new WebSocket(lastSeq.current !== null ? `${url}${separator}since=${lastSeq.current}` : url);
       ws.onopen = () => {
         setIsConnected(true);
         setError(null);
       };
       ws.onmessage = (event) => {
         console.log('Message received:', event.data);
+        try {
+          const message = JSON.parse(event.data);
+          if (typeof message.seq === 'number' && (lastSeq.current === null || message.seq > lastSeq.current || message.event === 'resync')) {
+            lastSeq.current = message.seq;
+          }
+        } catch {
+          // Plain-text echo messages carry no sequence number.
+        }
       };
       ws.onerror = (err) => {
         setError('WebSocket error');